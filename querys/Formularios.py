@@ -2,33 +2,19 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime
+from mysql.connector import Error
+from conexao_pool import obter_conexao
+import catalogo_schema
+import paginacao
+import importacao
+import historico
 
 # ============ FUNÇÕES AUXILIARES DE CONEXÃO ============
 def listar_todos_bancos():
     """Lista TODOS os bancos disponíveis no MySQL (sem filtros de sistema)"""
     try:
-        # Cria conexão temporária sem banco específico
-        import mysql.connector
-        from mysql.connector import Error
-        
-        conexao_temp = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password=""
-        )
-        
-        cursor = conexao_temp.cursor()
-        cursor.execute("SHOW DATABASES")
-        todos_bancos = [db[0] for db in cursor.fetchall()]
-        cursor.close()
-        conexao_temp.close()
-        
-        # Filtra bancos de sistema (opcional, mas recomendado)
-        bancos_filtrados = [b for b in todos_bancos if b not in [
-            'information_schema', 'mysql', 'performance_schema', 'sys'
-        ]]
-        
-        return bancos_filtrados
+        # Catálogo em cache; filtra bancos de sistema (opcional, mas recomendado)
+        return catalogo_schema.listar_bancos()
         
     except Exception as e:
         st.error(f"❌ Erro ao listar bancos: {e}")
@@ -43,35 +29,17 @@ def pagina_formularios():
     # ========== SEÇÃO 1: STATUS DA CONEXÃO ==========
     st.markdown("### 🔌 Status da Conexão")
     
-    # Verificar se já está conectado via app.py
-    conexao = None
-    banco_atual_conexao = None
+    # A sessão guarda só o banco de trabalho; cada operação empresta uma conexão do pool
+    banco_atual_conexao = st.session_state.get("banco_atual")
     mensagem_status = ""
     
-    if "conexao_mysql" in st.session_state and st.session_state.conexao_mysql:
-        try:
-            conexao = st.session_state.conexao_mysql
-            if conexao.is_connected():
-                # Mostrar banco atual
-                cursor = conexao.cursor()
-                cursor.execute("SELECT DATABASE()")
-                banco_atual_conexao = cursor.fetchone()[0]
-                cursor.close()
-                
-                if banco_atual_conexao:
-                    mensagem_status = f"✅ Conectado ao banco: **{banco_atual_conexao}**"
-                    st.success(mensagem_status)
-                else:
-                    mensagem_status = "⚠️ Conectado mas sem banco selecionado"
-                    st.warning(mensagem_status)
-            else:
-                mensagem_status = "❌ Conexão perdida"
-                st.error(mensagem_status)
-                conexao = None
-        except Exception as e:
-            mensagem_status = f"❌ Erro na conexão: {str(e)[:50]}..."
-            st.error(mensagem_status)
-            conexao = None
+    if st.session_state.get("mysql_conectado"):
+        if banco_atual_conexao:
+            mensagem_status = f"✅ Conectado ao banco: **{banco_atual_conexao}**"
+            st.success(mensagem_status)
+        else:
+            mensagem_status = "⚠️ Conectado mas sem banco selecionado"
+            st.warning(mensagem_status)
     else:
         mensagem_status = "⚠️ Não conectado via Pagina Inicial"
         st.warning(mensagem_status)
@@ -116,37 +84,23 @@ def pagina_formularios():
     
     # Se o usuário selecionou banco diferente do banco atual da conexão
     if banco_atual_conexao and banco_selecionado != banco_atual_conexao:
-        st.info(f"ℹ️ Você selecionou **{banco_selecionado}**, mas a conexão do app.py está no **{banco_atual_conexao}**.")
+        st.info(f"ℹ️ Você selecionou **{banco_selecionado}**, mas o banco em uso é **{banco_atual_conexao}**.")
     
     # Botões para gerenciar banco
     col_btn1, col_btn2 = st.columns(2)
     
     with col_btn1:
         if st.button("✅ Usar Este Banco", type="primary", use_container_width=True):
-            # Se não tem conexão ou conexão está ruim, cria nova
-            if not conexao or not conexao.is_connected():
-                try:
-                    import mysql.connector
-                    conexao = mysql.connector.connect(
-                        host="localhost",
-                        user="root",
-                        password="",
-                        database=banco_selecionado
-                    )
-                    st.session_state.conexao_mysql = conexao
-                except Exception as e:
-                    st.error(f"❌ Erro ao conectar: {e}")
-                    return
-            else:
-                # Usa conexão existente, muda de banco
-                try:
-                    cursor = conexao.cursor()
-                    cursor.execute(f"USE {banco_selecionado}")
-                    cursor.close()
-                    conexao.database = banco_selecionado
-                except Exception as e:
-                    st.error(f"❌ Erro ao mudar de banco: {e}")
-                    return
+            # Confirma o acesso ao banco com uma conexão do pool
+            try:
+                with obter_conexao(banco_selecionado) as conexao:
+                    conexao.ping()
+            except Error as e:
+                st.error(f"❌ Erro ao conectar: {e}")
+                return
+            st.session_state.mysql_desconectado = False
+            st.session_state.mysql_conectado = True
+            st.session_state.banco_atual = banco_selecionado
             
             st.success(f"✅ Banco selecionado: **{banco_selecionado}**")
             st.rerun()
@@ -160,8 +114,8 @@ def pagina_formularios():
                         if criar_novo_banco(nome_novo_banco):
                             st.rerun()
     
-    # Se não temos uma conexão válida ainda, pedir para selecionar banco primeiro
-    if not conexao or not conexao.is_connected():
+    # Sem banco de trabalho ainda, pedir para selecionar banco primeiro
+    if not banco_atual_conexao:
         st.warning("⏳ Selecione um banco e clique em 'Usar Este Banco' para continuar.")
         st.markdown("---")
         if st.button("🏠 Voltar para Página Inicial", use_container_width=True):
@@ -169,22 +123,13 @@ def pagina_formularios():
             st.rerun()
         return
     
-    # Verificar se o banco selecionado está realmente sendo usado
-    try:
-        cursor = conexao.cursor()
-        cursor.execute("SELECT DATABASE()")
-        banco_em_uso = cursor.fetchone()[0]
-        cursor.close()
-        
-        if banco_em_uso != banco_selecionado:
-            st.warning(f"⚠️ A conexão ainda está no banco **{banco_em_uso}**. Clique em 'Usar Este Banco'.")
-            st.markdown("---")
-            if st.button("🏠 Voltar para Página Inicial", use_container_width=True, key="btn_voltar_2"):
-                st.session_state.pagina = "home"
-                st.rerun()
-            return
-    except:
-        st.error("❌ Não foi possível verificar o banco em uso, Clique novamente em 'Voltar' para sair.")
+    # Verificar se o banco selecionado é o que está em uso
+    if banco_atual_conexao != banco_selecionado:
+        st.warning(f"⚠️ O banco em uso ainda é **{banco_atual_conexao}**. Clique em 'Usar Este Banco'.")
+        st.markdown("---")
+        if st.button("🏠 Voltar para Página Inicial", use_container_width=True, key="btn_voltar_2"):
+            st.session_state.pagina = "home"
+            st.rerun()
         return
     
     # ========== INTERFACE PRINCIPAL ==========
@@ -192,24 +137,11 @@ def pagina_formularios():
     st.title("📝 Formulários MySQL")
     
     # Mostrar status atualizado
-    try:
-        if conexao.is_connected():
-            st.success(f"✅ Conectado ao banco: **{conexao.database}**")
-        else:
-            st.warning("⚠️ Conexão MySQL não está ativa")
-            if st.button("🔄 Atualizar Conexão"):
-                st.rerun()
-            return
-    except Exception as e:
-        st.error(f"❌ Erro na conexão: {e}")
-        return
+    st.success(f"✅ Conectado ao banco: **{banco_selecionado}**")
     
     # ========== OBTER TABELAS DO BANCO ==========
     try:
-        cursor = conexao.cursor()
-        cursor.execute("SHOW TABLES")
-        tabelas = [tabela[0] for tabela in cursor.fetchall()]
-        cursor.close()
+        tabelas = catalogo_schema.listar_tabelas(banco_selecionado)
         
         if not tabelas:
             st.warning("Nenhuma tabela encontrada neste banco!")
@@ -245,48 +177,51 @@ def pagina_formularios():
         st.subheader(f"📊 Visualização: `{tabela_selecionada}`")
         
         try:
-            cursor = conexao.cursor()
-            cursor.execute(f"SELECT * FROM {tabela_selecionada} LIMIT 20")
-            dados = cursor.fetchall()
-            
-            if dados:
-                colunas = [desc[0] for desc in cursor.description]
-                df = pd.DataFrame(dados, columns=colunas)
+            # Container dedicado
+            with st.container():
+                estrutura = catalogo_schema.obter_estrutura(banco_selecionado, tabela_selecionada)
+                chave_pk = paginacao.colunas_chave_primaria(banco_selecionado, tabela_selecionada)
                 
-                # Container dedicado
-                with st.container():
-                    # Opções de visualização
-                    col_view1, col_view2 = st.columns(2)
-                    with col_view1:
-                        altura = st.slider("Altura da tabela", 200, 800, 400, key="altura_tabela")
-                    with col_view2:
-                        num_registros = st.slider("Nº de registros", 5, 100, 20, key="num_registros")
-                    
-                    # Dataframe com altura ajustável
-                    st.dataframe(
-                        df.head(num_registros), 
-                        use_container_width=True,
-                        height=altura
+                # Opções de visualização
+                col_view1, col_view2, col_view3 = st.columns(3)
+                with col_view1:
+                    altura = st.slider("Altura da tabela", 200, 800, 400, key="altura_tabela")
+                with col_view2:
+                    num_registros = st.slider("Registros por página", 5, 100, 20, key="num_registros")
+                with col_view3:
+                    # Keyset exige ordenação sem NULLs; a PK desempata
+                    opcoes_ordem = ["(chave primária)"] + [c[0] for c in estrutura if c[2] == 'NO' and c[0] not in chave_pk]
+                    ordenar_por = st.selectbox("Ordenar por", opcoes_ordem, key="ordem_tabela",
+                                               disabled=not chave_pk)
+                    descendente = st.checkbox("Decrescente", key="ordem_desc", disabled=not chave_pk)
+                
+                if chave_pk:
+                    chave = chave_pk if ordenar_por == "(chave primária)" else [ordenar_por] + chave_pk
+                else:
+                    chave = None
+                    st.caption("Tabela sem chave primária: paginação por OFFSET")
+                
+                # Grade paginada no servidor
+                df = paginacao.exibir_paginado(
+                    "form_dados",
+                    banco_selecionado,
+                    paginacao.fonte_tabela(tabela_selecionada),
+                    chave=chave,
+                    descendente=descendente,
+                    tamanho=num_registros,
+                    altura=altura
+                )
+                
+                # Botão para exportar (página atual)
+                if not df.empty and st.button("📥 Exportar para CSV", key="btn_exportar"):
+                    csv = df.to_csv(index=False)
+                    st.download_button(
+                        label="💾 Baixar CSV",
+                        data=csv,
+                        file_name=f"{tabela_selecionada}.csv",
+                        mime="text/csv",
+                        key="btn_download_csv"
                     )
-                    
-                    # Informações
-                    st.info(f"**{len(df)}** registros totais | **{len(df.columns)}** colunas")
-                    
-                    # Botão para exportar
-                    if st.button("📥 Exportar para CSV", key="btn_exportar"):
-                        csv = df.to_csv(index=False)
-                        st.download_button(
-                            label="💾 Baixar CSV",
-                            data=csv,
-                            file_name=f"{tabela_selecionada}.csv",
-                            mime="text/csv",
-                            key="btn_download_csv"
-                        )
-                    
-            else:
-                st.info("📭 Tabela vazia - Nenhum registro encontrado")
-            
-            cursor.close()
             
             # Botão para fechar visualização
             if st.button("❌ Fechar Visualização", key="btn_fechar_visualizacao"):
@@ -307,10 +242,7 @@ def pagina_formularios():
             
             # ========== OBTER ESTRUTURA DA TABELA ==========
             try:
-                cursor = conexao.cursor()
-                cursor.execute(f"DESCRIBE {tabela_selecionada}")
-                colunas_info = cursor.fetchall()
-                cursor.close()
+                colunas_info = catalogo_schema.obter_estrutura(banco_selecionado, tabela_selecionada)
                 
             except Exception as e:
                 st.error(f"Erro ao obter estrutura: {e}")
@@ -318,110 +250,125 @@ def pagina_formularios():
             
             st.subheader(f"📝 Inserir em: `{tabela_selecionada}`")
             
-            # ========== CRIAR FORMULÁRIO DINÂMICO ==========
-            valores = {}
+            modo = st.radio("Modo de inserção", ["📝 Registro único", "📥 Importar arquivo (CSV/Excel)"],
+                            horizontal=True, key="modo_insercao")
+            if modo.startswith("📥"):
+                # Carga em massa: lotes com executemany ou LOAD DATA, um commit por lote
+                if importacao.exibir_importacao(banco_selecionado, tabela_selecionada, colunas_info):
+                    paginacao.limpar_paginacao("form_dados")
+            else:
+                # ========== CRIAR FORMULÁRIO DINÂMICO ==========
+                valores = {}
             
-            for coluna in colunas_info:
-                nome = coluna[0]
-                tipo = coluna[1].lower()
-                pode_ser_nulo = coluna[2] == 'YES'
-                auto_inc = 'auto_increment' in str(coluna[5]).lower()
-                
-                # Pular campos auto_increment
-                if auto_inc:
-                    continue
+                for coluna in colunas_info:
+                    nome = coluna[0]
+                    tipo = coluna[1].lower()
+                    pode_ser_nulo = coluna[2] == 'YES'
+                    auto_inc = 'auto_increment' in str(coluna[5]).lower()
                 
-                # Label formatado
-                label = f"**{nome}**"
-                if not pode_ser_nulo:
-                    label += " *"
+                    # Pular campos auto_increment
+                    if auto_inc:
+                        continue
                 
-                # Criar widget apropriado baseado no tipo
-                if 'int' in tipo or 'decimal' in tipo or 'float' in tipo or 'double' in tipo:
-                    # Campo numérico
-                    valores[nome] = st.number_input(
-                        label, 
-                        value=0,
-                        key=f"num_{nome}"
-                    )
+                    # Label formatado
+                    label = f"**{nome}**"
+                    if not pode_ser_nulo:
+                        label += " *"
                 
-                elif 'date' in tipo:
-                    # Campo de data
-                    valores[nome] = st.date_input(
-                        label,
-                        key=f"date_{nome}"
-                    )
+                    # Criar widget apropriado baseado no tipo
+                    if 'int' in tipo or 'decimal' in tipo or 'float' in tipo or 'double' in tipo:
+                        # Campo numérico
+                        valores[nome] = st.number_input(
+                            label, 
+                            value=0,
+                            key=f"num_{nome}"
+                        )
                 
-                elif 'datetime' in tipo or 'timestamp' in tipo:
-                    # Campo de data e hora
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        data = st.date_input(
-                            f"{nome} - Data",
-                            key=f"dt_date_{nome}"
+                    elif 'date' in tipo:
+                        # Campo de data
+                        valores[nome] = st.date_input(
+                            label,
+                            key=f"date_{nome}"
                         )
-                    with col2:
-                        hora = st.time_input(
-                            f"{nome} - Hora",
-                            key=f"dt_time_{nome}"
+                
+                    elif 'datetime' in tipo or 'timestamp' in tipo:
+                        # Campo de data e hora
+                        col1, col2 = st.columns(2)
+                        with col1:
+                            data = st.date_input(
+                                f"{nome} - Data",
+                                key=f"dt_date_{nome}"
+                            )
+                        with col2:
+                            hora = st.time_input(
+                                f"{nome} - Hora",
+                                key=f"dt_time_{nome}"
+                            )
+                        valores[nome] = datetime.combine(data, hora) if data and hora else None
+                
+                    elif 'time' in tipo:
+                        # Campo de hora
+                        valores[nome] = st.time_input(
+                            label,
+                            key=f"time_{nome}"
                         )
-                    valores[nome] = datetime.combine(data, hora) if data and hora else None
                 
-                elif 'time' in tipo:
-                    # Campo de hora
-                    valores[nome] = st.time_input(
-                        label,
-                        key=f"time_{nome}"
-                    )
+                    elif 'text' in tipo or 'varchar' in tipo or 'char' in tipo:
+                        # Campo de texto
+                        if 'text' in tipo or 'mediumtext' in tipo or 'longtext' in tipo:
+                            # Texto longo
+                            valores[nome] = st.text_area(
+                                label,
+                                height=100,
+                                key=f"area_{nome}"
+                            )
+                        else:
+                            # Texto curto
+                            valores[nome] = st.text_input(
+                                label,
+                                key=f"text_{nome}"
+                            )
                 
-                elif 'text' in tipo or 'varchar' in tipo or 'char' in tipo:
-                    # Campo de texto
-                    if 'text' in tipo or 'mediumtext' in tipo or 'longtext' in tipo:
-                        # Texto longo
-                        valores[nome] = st.text_area(
+                    elif 'enum' in tipo or 'set' in tipo:
+                        # Campo de seleção (ENUM)
+                        # Extrair opções do tipo ENUM('op1','op2')
+                        opcoes = tipo.split('(')[1].split(')')[0].replace("'", "").split(',')
+                        valores[nome] = st.selectbox(
                             label,
-                            height=100,
-                            key=f"area_{nome}"
+                            options=opcoes,
+                            key=f"enum_{nome}"
                         )
+                
                     else:
-                        # Texto curto
+                        # Campo genérico para outros tipos
                         valores[nome] = st.text_input(
                             label,
-                            key=f"text_{nome}"
+                            key=f"gen_{nome}"
                         )
-                
-                elif 'enum' in tipo or 'set' in tipo:
-                    # Campo de seleção (ENUM)
-                    # Extrair opções do tipo ENUM('op1','op2')
-                    opcoes = tipo.split('(')[1].split(')')[0].replace("'", "").split(',')
-                    valores[nome] = st.selectbox(
-                        label,
-                        options=opcoes,
-                        key=f"enum_{nome}"
-                    )
-                
-                else:
-                    # Campo genérico para outros tipos
-                    valores[nome] = st.text_input(
-                        label,
-                        key=f"gen_{nome}"
-                    )
             
-            # ========== BOTÕES DE AÇÃO ==========
-            st.markdown("---")
-            col_btn1, col_btn2, col_btn3 = st.columns(3)
+                # ========== BOTÕES DE AÇÃO ==========
+                st.markdown("---")
+                col_btn1, col_btn_fila, col_btn2, col_btn3 = st.columns(4)
+            
+                with col_btn1:
+                    if st.button("💾 Inserir Registro", type="primary", use_container_width=True, key="btn_inserir"):
+                        inserir_dados(banco_selecionado, tabela_selecionada, valores)
             
-            with col_btn1:
-                if st.button("💾 Inserir Registro", type="primary", use_container_width=True, key="btn_inserir"):
-                    inserir_dados(conexao, tabela_selecionada, valores)
+                with col_btn_fila:
+                    if st.button("➕ Adicionar à fila", use_container_width=True, key="btn_adicionar_fila"):
+                        adicionar_a_fila(banco_selecionado, tabela_selecionada, valores)
             
-            with col_btn2:
-                if st.button("🔄 Limpar Formulário", use_container_width=True, key="btn_limpar"):
-                    st.rerun()
+                with col_btn2:
+                    if st.button("🔄 Limpar Formulário", use_container_width=True, key="btn_limpar"):
+                        st.rerun()
             
-            with col_btn3:
-                if st.button("📋 Gerar SQL", use_container_width=True, key="btn_gerar_sql"):
-                    gerar_sql_insert(tabela_selecionada, valores)
+                with col_btn3:
+                    if st.button("📋 Gerar SQL", use_container_width=True, key="btn_gerar_sql"):
+                        gerar_sql_insert(tabela_selecionada, valores)
+                
+                # Vários registros gravados com um executemany numa única transação
+                st.markdown("---")
+                exibir_fila(banco_selecionado, tabela_selecionada)
     
     # ========== BOTÃO VOLTAR NO FINAL ==========
     st.markdown("---")
@@ -434,17 +381,22 @@ def pagina_formularios():
 
 # ... (as outras funções permanecem EXATAMENTE iguais - inserir_dados, gerar_sql_insert, criar_novo_banco, criar_banco_teste_direto)              
 
-def inserir_dados(conexao, tabela, dados):
-    """Insere dados na tabela MySQL"""
+def filtrar_dados_validos(dados):
+    """Remove campos vazios/nulos (a coluna fica com o DEFAULT da tabela)"""
+    dados_validos = {}
+    for chave, valor in dados.items():
+        if valor is None:
+            continue
+        if isinstance(valor, str) and valor.strip() == "":
+            continue
+        dados_validos[chave] = valor
+    return dados_validos
+
+def inserir_dados(banco, tabela, dados):
+    """Insere dados na tabela MySQL (conexão emprestada do pool)"""
     try:
         # Filtrar dados vazios/nulos
-        dados_validos = {}
-        for chave, valor in dados.items():
-            if valor is None:
-                continue
-            if isinstance(valor, str) and valor.strip() == "":
-                continue
-            dados_validos[chave] = valor
+        dados_validos = filtrar_dados_validos(dados)
         
         if not dados_validos:
             st.warning("⚠️ Nenhum dado para inserir!")
@@ -457,33 +409,167 @@ def inserir_dados(conexao, tabela, dados):
         query = f"INSERT INTO {tabela} ({colunas}) VALUES ({placeholders})"
         
         # Executar inserção
-        cursor = conexao.cursor()
-        cursor.execute(query, list(dados_validos.values()))
-        conexao.commit()
+        with obter_conexao(banco) as conexao, \
+                historico.medir("formularios", banco, query) as registro:
+            cursor = conexao.cursor()
+            cursor.execute(query, list(dados_validos.values()))
+            conexao.commit()
+            registro['linhas'] = cursor.rowcount
+            id_novo = cursor.lastrowid
+            cursor.close()
         
+        paginacao.limpar_paginacao("form_dados")
         st.success(f"✅ Registro inserido com sucesso em `{tabela}`!")
         st.balloons()
         
         # Mostrar ID do novo registro (se houver auto_increment)
-        if cursor.lastrowid:
-            st.info(f"📌 ID do novo registro: **{cursor.lastrowid}**")
-        
-        cursor.close()
+        if id_novo:
+            st.info(f"📌 ID do novo registro: **{id_novo}**")
         
     except Exception as e:
         st.error(f"❌ Erro ao inserir dados: {e}")
         st.info("Verifique os tipos de dados e restrições da tabela.")
 
+# ============ FILA DE REGISTROS ============
+def chave_fila(banco, tabela):
+    return f"fila_{banco}_{tabela}"
+
+def adicionar_a_fila(banco, tabela, dados):
+    """Guarda o registro na fila da sessão para gravar junto com os demais"""
+    dados_validos = filtrar_dados_validos(dados)
+    if not dados_validos:
+        st.warning("⚠️ Nenhum dado para adicionar!")
+        return
+    chave = chave_fila(banco, tabela)
+    st.session_state.setdefault(chave, []).append(dados_validos)
+    # Nova versão da grade: o data_editor não reaproveita edições da fila antiga
+    st.session_state[f"{chave}_versao"] = st.session_state.get(f"{chave}_versao", 0) + 1
+    st.toast(f"➕ Registro adicionado à fila ({len(st.session_state[chave])})")
+
+def _valor_python(valor):
+    """Converte valores vindos do data_editor (numpy/pandas) para tipos do conector"""
+    if valor is None or (pd.api.types.is_scalar(valor) and pd.isna(valor)):
+        # Célula apagada na grade: None, NaN, pd.NaT ou pd.NA
+        return None
+    if isinstance(valor, pd.Timestamp):
+        return valor.to_pydatetime()
+    if hasattr(valor, 'item'):
+        return valor.item()
+    return valor
+
+def gravar_fila(conexao, tabela, registros, tudo_ou_nada=False):
+    """Grava todos os registros da fila numa única transação
+
+    Registros com as mesmas colunas vão num só executemany; se um grupo falha,
+    ele é refeito linha a linha com SAVEPOINT para apontar os registros com erro
+    sem perder os demais. Retorna (índices gravados, {índice: erro}).
+    """
+    grupos = {}
+    for indice, registro in enumerate(registros):
+        grupos.setdefault(tuple(registro), []).append(indice)
+
+    gravados, falhas = [], {}
+    cursor = conexao.cursor()
+    try:
+        conexao.start_transaction()
+        for colunas, indices in grupos.items():
+            lista = ", ".join(f"`{c}`" for c in colunas)
+            query = f"INSERT INTO `{tabela}` ({lista}) VALUES ({', '.join(['%s'] * len(colunas))})"
+            linhas = [tuple(registros[i][c] for c in colunas) for i in indices]
+            cursor.execute("SAVEPOINT fila_grupo")
+            try:
+                with historico.medir("formularios", conexao.database, query) as registro:
+                    cursor.executemany(query, linhas)
+                    registro['linhas'] = len(linhas)
+                gravados.extend(indices)
+                continue
+            except Error:
+                cursor.execute("ROLLBACK TO SAVEPOINT fila_grupo")
+            # Grupo com erro: linha a linha para descobrir quais falham
+            for indice, linha in zip(indices, linhas):
+                cursor.execute("SAVEPOINT fila_linha")
+                try:
+                    cursor.execute(query, linha)
+                    gravados.append(indice)
+                except Error as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT fila_linha")
+                    falhas[indice] = str(e)
+
+        if falhas and tudo_ou_nada:
+            conexao.rollback()
+            return [], falhas
+        conexao.commit()
+        return sorted(gravados), falhas
+    except Error:
+        try:
+            conexao.rollback()
+        except Error:
+            pass
+        raise
+    finally:
+        cursor.close()
+
+def exibir_fila(banco, tabela):
+    """Grade editável com os registros na fila e gravação em uma transação"""
+    chave = chave_fila(banco, tabela)
+    fila = st.session_state.get(chave, [])
+    if not fila:
+        st.caption("🧾 Fila vazia: use **➕ Adicionar à fila** para juntar vários registros e gravá-los de uma vez.")
+        return
+
+    st.markdown(f"#### 🧾 Fila de registros ({len(fila)})")
+    versao = st.session_state.get(f"{chave}_versao", 0)
+    editado = st.data_editor(
+        pd.DataFrame(fila),
+        num_rows="dynamic",
+        use_container_width=True,
+        key=f"editor_{chave}_{versao}"
+    )
+    # Edições na grade valem para a gravação; células apagadas voltam ao DEFAULT
+    registros = [
+        filtrar_dados_validos({coluna: _valor_python(valor) for coluna, valor in linha.items()})
+        for linha in editado.astype(object).to_dict('records')
+    ]
+    registros = [r for r in registros if r]
+
+    tudo_ou_nada = st.checkbox("Tudo ou nada (desfaz a fila inteira se algum registro falhar)",
+                               key=f"{chave}_tudo_ou_nada")
+    col1, col2 = st.columns(2)
+    with col1:
+        gravar = st.button(f"🚀 Gravar {len(registros)} registro(s)", type="primary",
+                           use_container_width=True, key=f"{chave}_gravar")
+    with col2:
+        if st.button("🗑️ Esvaziar fila", use_container_width=True, key=f"{chave}_esvaziar"):
+            st.session_state[chave] = []
+            st.rerun()
+
+    if not gravar:
+        return
+    try:
+        with obter_conexao(banco) as conexao:
+            gravados, falhas = gravar_fila(conexao, tabela, registros, tudo_ou_nada)
+    except Error as e:
+        st.error(f"❌ Erro ao gravar a fila: {e}")
+        return
+
+    # Só os registros com erro continuam na fila, para corrigir e tentar de novo
+    st.session_state[chave] = [registros[i] for i in sorted(falhas)] if gravados else registros
+    st.session_state[f"{chave}_versao"] = versao + 1
+    if gravados:
+        paginacao.limpar_paginacao("form_dados")
+        st.success(f"✅ {len(gravados)} registro(s) gravado(s) em `{tabela}` numa única transação!")
+    if falhas:
+        if tudo_ou_nada:
+            st.error(f"↩️ {len(falhas)} registro(s) com erro: nada foi gravado.")
+        else:
+            st.error(f"❌ {len(falhas)} registro(s) com erro continuam na fila:")
+        st.dataframe(pd.DataFrame([{**registros[i], 'erro': erro} for i, erro in falhas.items()]),
+                     use_container_width=True, hide_index=True)
+
 def gerar_sql_insert(tabela, dados):
     """Gera e exibe o comando SQL INSERT"""
     # Filtrar dados vazios/nulos
-    dados_validos = {}
-    for chave, valor in dados.items():
-        if valor is None:
-            continue
-        if isinstance(valor, str) and valor.strip() == "":
-            continue
-        dados_validos[chave] = valor
+    dados_validos = filtrar_dados_validos(dados)
     
     if not dados_validos:
         st.warning("Nenhum dado para gerar SQL!")
@@ -521,20 +607,12 @@ def gerar_sql_insert(tabela, dados):
 def criar_novo_banco(nome_banco):
     """Cria um novo banco de dados"""
     try:
-        import mysql.connector
-        from mysql.connector import Error
-        
-        # Conectar sem banco específico
-        conexao_temp = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password=""
-        )
-        
-        cursor = conexao_temp.cursor()
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {nome_banco}")
-        cursor.close()
-        conexao_temp.close()
+        # Conexão do pool sem banco específico
+        with obter_conexao() as conexao_temp:
+            cursor = conexao_temp.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {nome_banco}")
+            cursor.close()
+        catalogo_schema.invalidar()
         
         st.success(f"✅ Banco '{nome_banco}' criado com sucesso!")
         return True
@@ -546,87 +624,75 @@ def criar_novo_banco(nome_banco):
 def criar_banco_teste_direto():
     """Cria um banco de dados de teste (sem depender da conexão do app.py)"""
     try:
-        import mysql.connector
-        from mysql.connector import Error
-        
-        # Conectar sem banco específico
-        conexao_temp = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password=""
-        )
-        
-        cursor = conexao_temp.cursor()
-        
-        # Cria banco
-        cursor.execute("CREATE DATABASE IF NOT EXISTS sistema_mysql")
-        cursor.execute("USE sistema_mysql")
-        
-        # Cria tabelas de exemplo
-        tabelas = [
-            """
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                nome VARCHAR(100) NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                idade INT,
-                cidade VARCHAR(50),
-                data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS produtos (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                nome VARCHAR(100) NOT NULL,
-                preco DECIMAL(10,2) NOT NULL,
-                quantidade INT DEFAULT 0,
-                categoria VARCHAR(50),
-                descricao TEXT
-            )
-            """,
-            """
-            CREATE TABLE IF NOT EXISTS pedidos (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                usuario_id INT,
-                produto_id INT,
-                quantidade INT NOT NULL,
-                data_pedido TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                status ENUM('pendente', 'processando', 'concluido') DEFAULT 'pendente',
-                FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
-                FOREIGN KEY (produto_id) REFERENCES produtos(id)
-            )
-            """
-        ]
-        
-        for tabela_sql in tabelas:
-            cursor.execute(tabela_sql)
-        
-        # Insere dados de exemplo
-        cursor.execute("""
-            INSERT IGNORE INTO usuarios (nome, email, idade, cidade) VALUES
-            ('Ana Silva', 'ana@email.com', 28, 'São Paulo'),
-            ('Carlos Santos', 'carlos@email.com', 35, 'Rio de Janeiro'),
-            ('Mariana Lima', 'mariana@email.com', 22, 'Belo Horizonte')
-        """)
-        
-        cursor.execute("""
-            INSERT IGNORE INTO produtos (nome, preco, quantidade, categoria) VALUES
-            ('Notebook Dell', 3500.00, 10, 'Eletrônicos'),
-            ('Mouse Wireless', 120.50, 50, 'Acessórios'),
-            ('Teclado Mecânico', 450.00, 25, 'Acessórios'),
-            ('Monitor 24"', 890.00, 15, 'Monitores')
-        """)
-        
-        conexao_temp.commit()
-        cursor.close()
-        conexao_temp.close()
+        # Conexão do pool sem banco específico
+        with obter_conexao() as conexao_temp:
+            cursor = conexao_temp.cursor()
+            
+            # Cria banco
+            cursor.execute("CREATE DATABASE IF NOT EXISTS sistema_mysql")
+            cursor.execute("USE sistema_mysql")
+        
+            # Cria tabelas de exemplo
+            tabelas = [
+                """
+                CREATE TABLE IF NOT EXISTS usuarios (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    nome VARCHAR(100) NOT NULL,
+                    email VARCHAR(100) UNIQUE NOT NULL,
+                    idade INT,
+                    cidade VARCHAR(50),
+                    data_cadastro TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """,
+                """
+                CREATE TABLE IF NOT EXISTS produtos (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    nome VARCHAR(100) NOT NULL,
+                    preco DECIMAL(10,2) NOT NULL,
+                    quantidade INT DEFAULT 0,
+                    categoria VARCHAR(50),
+                    descricao TEXT
+                )
+                """,
+                """
+                CREATE TABLE IF NOT EXISTS pedidos (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    usuario_id INT,
+                    produto_id INT,
+                    quantidade INT NOT NULL,
+                    data_pedido TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    status ENUM('pendente', 'processando', 'concluido') DEFAULT 'pendente',
+                    FOREIGN KEY (usuario_id) REFERENCES usuarios(id),
+                    FOREIGN KEY (produto_id) REFERENCES produtos(id)
+                )
+                """
+            ]
+        
+            for tabela_sql in tabelas:
+                cursor.execute(tabela_sql)
+        
+            # Insere dados de exemplo
+            cursor.execute("""
+                INSERT IGNORE INTO usuarios (nome, email, idade, cidade) VALUES
+                ('Ana Silva', 'ana@email.com', 28, 'São Paulo'),
+                ('Carlos Santos', 'carlos@email.com', 35, 'Rio de Janeiro'),
+                ('Mariana Lima', 'mariana@email.com', 22, 'Belo Horizonte')
+            """)
+        
+            cursor.execute("""
+                INSERT IGNORE INTO produtos (nome, preco, quantidade, categoria) VALUES
+                ('Notebook Dell', 3500.00, 10, 'Eletrônicos'),
+                ('Mouse Wireless', 120.50, 50, 'Acessórios'),
+                ('Teclado Mecânico', 450.00, 25, 'Acessórios'),
+                ('Monitor 24"', 890.00, 15, 'Monitores')
+            """)
+        
+            conexao_temp.commit()
+            cursor.close()
+        catalogo_schema.invalidar()
         
-        # Atualiza a conexão no session_state se existir
-        if "conexao_mysql" in st.session_state and st.session_state.conexao_mysql:
-            try:
-                st.session_state.conexao_mysql.database = "sistema_mysql"
-            except:
-                pass
+        # Passa a trabalhar no banco recém-criado
+        st.session_state.banco_atual = "sistema_mysql"
         
         st.success("✅ Banco 'sistema_mysql' criado com 3 tabelas de exemplo!")
         st.balloons()
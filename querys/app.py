@@ -6,6 +6,8 @@ import mysql.connector
 from mysql.connector import Error
 import io
 from io import BytesIO
+from conexao_pool import obter_conexao
+import catalogo_schema
 
 # ============ CONFIGURAÇÃO ============
 st.set_page_config(
@@ -15,43 +17,31 @@ st.set_page_config(
 )
 
 # ============ CONEXÃO MYSQL CENTRALIZADA ============
-def conectar_mysql():
-    """Função para conectar ao MySQL"""
+def conectar_mysql(avisar=True):
+    """Verifica o acesso ao MySQL com uma conexão emprestada do pool"""
     try:
-        # ALTERE ESTES VALORES PARA SUAS CREDENCIAIS
-        conexao = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="", 
-            database="" 
-        )
-        return conexao
+        # Credenciais centralizadas em conexao_pool.CONFIG_MYSQL
+        with obter_conexao() as conexao:
+            return conexao.is_connected()
     except Error as e:
-        st.error(f"Erro ao conectar: {e}")
-        return None
+        if avisar:
+            st.error(f"Erro ao conectar: {e}")
+        return False
 
-def get_conexao():
-    """Obtém ou cria conexão com MySQL"""
-    # Se não existe conexão ou está fechada, cria nova
-    if "conexao_mysql" not in st.session_state:
-        with st.spinner("Conectando ao MySQL..."):
-            st.session_state.conexao_mysql = conectar_mysql()
-    
-    # Verifica se a conexão existe e está ativa
-    if st.session_state.conexao_mysql:
-        try:
-            if st.session_state.conexao_mysql.is_connected():
-                return st.session_state.conexao_mysql
-            else:
-                # Reconectar se perdeu conexão
-                st.session_state.conexao_mysql = conectar_mysql()
-                return st.session_state.conexao_mysql
-        except:
-            # Se houver erro, tenta reconectar
-            st.session_state.conexao_mysql = conectar_mysql()
-            return st.session_state.conexao_mysql
-    
-    return None
+def esta_conectado():
+    """Indica se a sessão está conectada
+
+    A sessão não guarda conexão: cada operação empresta uma do pool.
+    Cada verificação faz um ping por ele, então a queda ou reinício do
+    servidor aparece sem precisar clicar em "Desconectar".
+    """
+    if st.session_state.get("mysql_desconectado"):
+        return False
+    primeira = "mysql_conectado" not in st.session_state
+    with st.spinner("Conectando ao MySQL..."):
+        # O erro detalhado só aparece na primeira tentativa da sessão
+        st.session_state.mysql_conectado = conectar_mysql(avisar=primeira)
+    return st.session_state.mysql_conectado
 
 # ============ ESTADO DA APLICAÇÃO ============
 if "pagina" not in st.session_state:
@@ -68,21 +58,15 @@ with st.sidebar:
     """, unsafe_allow_html=True)
     
     # Status da conexão compacto
-    conexao = get_conexao()
-    status_color = "🟢" if conexao and conexao.is_connected() else "🔴"
-    status_text = "Conectado" if conexao and conexao.is_connected() else "Desconectado"
+    conectado = esta_conectado()
+    status_color = "🟢" if conectado else "🔴"
+    status_text = "Conectado" if conectado else "Desconectado"
     
     st.markdown(f"### {status_color} **{status_text}**")
     
-    if conexao and conexao.is_connected():
-        try:
-            cursor = conexao.cursor()
-            cursor.execute("SELECT DATABASE()")
-            banco = cursor.fetchone()[0] or "Nenhum"
-            cursor.close()
-            st.caption(f"📁 Banco: **{banco}**")
-        except:
-            pass
+    if conectado:
+        # Banco escolhido em "Usar Este Banco" nos Formulários
+        st.caption(f"📁 Banco: **{st.session_state.get('banco_atual') or 'Nenhum'}**")
     
     st.markdown("---")
     
@@ -140,26 +124,24 @@ with st.sidebar:
     
     with col_con1:
         if st.button("Conectar", use_container_width=True,
-                    type="primary" if not conexao else "secondary"):
-            st.session_state.conexao_mysql = conectar_mysql()
+                    type="primary" if not conectado else "secondary"):
+            st.session_state.mysql_desconectado = False
+            st.session_state.mysql_conectado = conectar_mysql()
             st.rerun()
     
     with col_con2:
         if st.button("Desconectar", use_container_width=True, 
-                    disabled=not (conexao and conexao.is_connected())):
-            if "conexao_mysql" in st.session_state and st.session_state.conexao_mysql:
-                st.session_state.conexao_mysql.close()
-                st.session_state.conexao_mysql = None
+                    disabled=not conectado):
+            # As conexões são do pool do processo: só a sessão deixa de usá-las
+            st.session_state.mysql_desconectado = True
+            st.session_state.mysql_conectado = False
+            st.session_state.banco_atual = None
             st.rerun()
     
     # Botão para ver bancos (apenas se conectado)
-    if conexao and conexao.is_connected():
+    if conectado:
         if st.button("📊 Listar Bancos", use_container_width=True):
-            cursor = conexao.cursor()
-            cursor.execute("SHOW DATABASES")
-            bancos = [b[0] for b in cursor.fetchall() if b[0] not in 
-                     ['information_schema', 'mysql', 'performance_schema', 'sys']]
-            cursor.close()
+            bancos = catalogo_schema.listar_bancos()
             
             st.info(f"**{len(bancos)} bancos disponíveis:**")
             for banco in bancos:
@@ -228,15 +210,15 @@ def pagina_home():
             st.write("Inserir dados no MySQL")
             
             # Verificar conexão
-            conexao = get_conexao()
-            if conexao and conexao.is_connected():
+            if esta_conectado():
                 if st.button("Acessar", key="btn_form_home", type="primary"):
                     st.session_state.pagina = "Formularios"
                     st.rerun()
             else:
                 if st.button("Conectar e Acessar", key="btn_con_form_home"):
-                    st.session_state.conexao_mysql = conectar_mysql()
-                    if st.session_state.conexao_mysql:
+                    st.session_state.mysql_desconectado = False
+                    st.session_state.mysql_conectado = conectar_mysql()
+                    if st.session_state.mysql_conectado:
                         st.session_state.pagina = "Formularios"
                     st.rerun()
     
@@ -254,14 +236,9 @@ def pagina_home():
             st.write("🔌 Conexão do sistema")
             if st.button("Conexão MySQL", key="btn_config_home"):
                 # Mostrar informações de conexão
-                conexao = get_conexao()
-                if conexao:
-                    st.info(f"Conectado a: {conexao.database}")
-                    cursor = conexao.cursor()
-                    cursor.execute("SHOW DATABASES")
-                    bancos = cursor.fetchall()
-                    st.write(f"Bancos disponíveis: {len(bancos)}")
-                    cursor.close()
+                if esta_conectado():
+                    st.info(f"Conectado a: {st.session_state.get('banco_atual') or 'servidor (nenhum banco)'}")
+                    st.write(f"Bancos disponíveis: {len(catalogo_schema.listar_bancos())}")
                 else:
                     st.warning("Não conectado")
     
@@ -348,19 +325,11 @@ def main():
         
         # DEBUG: Mostrar status da conexão
         st.write("DEBUG - Status da conexão:")
-        if "conexao_mysql" in st.session_state:
-            st.write(f"- Existe no session_state: SIM")
-            if st.session_state.conexao_mysql:
-                try:
-                    status = "ATIVA" if st.session_state.conexao_mysql.is_connected() else "INATIVA"
-                    st.write(f"- Conexão: {status}")
-                    st.write(f"- Banco: {st.session_state.conexao_mysql.database}")
-                except:
-                    st.write("- Conexão: ERRO")
-            else:
-                st.write("- Conexão: None")
+        if "mysql_conectado" in st.session_state:
+            st.write(f"- Conexão: {'ATIVA' if st.session_state.mysql_conectado else 'INATIVA'} (pool)")
+            st.write(f"- Banco: {st.session_state.get('banco_atual')}")
         else:
-            st.write("- Existe no session_state: NÃO")
+            st.write("- Conexão: ainda não verificada")
         
         try:
             import Formularios
@@ -398,16 +367,11 @@ def main():
     st.markdown("---")
     
     # Status da conexão no rodapé
-    conexao = get_conexao()
-    if conexao and conexao.is_connected():
-        try:
-            cursor = conexao.cursor()
-            cursor.execute("SELECT DATABASE()")
-            banco_atual = cursor.fetchone()[0]
-            cursor.close()
-            
+    if esta_conectado():
+        banco_atual = st.session_state.get("banco_atual")
+        if banco_atual:
             st.caption(f"✨ Sistema MySQL | Banco: {banco_atual} | Desenvolvido com Streamlit")
-        except:
+        else:
             st.caption("✨ Sistema MySQL | ✅ Conectado | Desenvolvido com Streamlit")
     else:
         st.caption("✨ Sistema MySQL | 🔌 Não conectado | Desenvolvido com Streamlit")
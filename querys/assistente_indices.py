@@ -0,0 +1,313 @@
+# assistente_indices.py - Sugestão de índices a partir da consulta montada no construtor visual
+import streamlit as st
+from mysql.connector import Error
+
+from conexao_pool import obter_conexao, criar_conexao
+import catalogo_schema
+import plano_execucao
+
+# ============ CONFIGURAÇÃO ============
+MAX_COLUNAS_INDICE = 5        # índices compostos maiores raramente compensam
+PREFIXO_TEXTO = 191           # colunas TEXT/BLOB só entram com prefixo
+
+OPS_IGUALDADE = ("=", "IN", "IS NULL")
+OPS_INTERVALO = (">", "<", ">=", "<=")
+OPS_SEM_INDICE = ("!=", "NOT IN", "IS NOT NULL")
+
+
+# ============ ANÁLISE DA CONSULTA ============
+def _separar(campo, tabela_padrao):
+    """'tabela.coluna' -> (tabela, coluna)"""
+    if "." in campo:
+        tabela, coluna = campo.split(".", 1)
+    else:
+        tabela, coluna = tabela_padrao, campo
+    return tabela.strip("`"), coluna.strip("`")
+
+
+def colunas_por_papel(config):
+    """Colunas de cada tabela agrupadas pelo uso na consulta
+
+    Retorna (papeis, alertas, com_ou): papeis[tabela] tem as listas juncao, igualdade,
+    intervalo, ordenacao ([(coluna, desc)]) e agrupamento; alertas lista o que
+    impede o uso de índices.
+    """
+    tabelas = config.get('tabelas_selecionadas', [])
+    padrao = tabelas[0] if tabelas else None
+    papeis = {t: {'juncao': [], 'igualdade': [], 'intervalo': [], 'ordenacao': [], 'agrupamento': []}
+              for t in tabelas}
+    alertas = []
+
+    def adicionar(tabela, papel, valor):
+        if tabela in papeis and valor not in papeis[tabela][papel]:
+            papeis[tabela][papel].append(valor)
+
+    joins = config.get('joins', [])
+    for join in joins:
+        # O otimizador escolhe a ordem das tabelas: a coluna de ligação serve às duas pontas
+        adicionar(join['tabela1'], 'juncao', join['coluna1'])
+        adicionar(join['tabela2'], 'juncao', join['coluna2'])
+    if len(tabelas) > 1 and not joins:
+        alertas.append("🔴 Várias tabelas sem JOIN: a consulta vira um produto cartesiano e nenhum índice ajuda.")
+
+    criterios = config.get('criterios', [])
+    com_ou = any(c.get('logica') == 'OR' for c in criterios[1:])
+    if com_ou:
+        alertas.append("🟠 Critérios ligados por OR: um índice composto não serve; no máximo o MySQL "
+                       "combina índices separados de cada coluna (index merge).")
+    for criterio in criterios:
+        tabela, coluna = _separar(criterio['campo'], padrao)
+        operador = criterio.get('operador', '=')
+        if operador == "LIKE":
+            # O construtor sempre gera LIKE '%valor%'
+            alertas.append(f"🟠 `{tabela}.{coluna} LIKE '%...%'` começa com curinga e não usa índice.")
+        elif operador in OPS_SEM_INDICE:
+            alertas.append(f"🟡 `{tabela}.{coluna} {operador}` raramente usa índice.")
+        elif com_ou:
+            adicionar(tabela, 'igualdade' if operador in OPS_IGUALDADE else 'intervalo', coluna)
+        elif operador in OPS_IGUALDADE:
+            adicionar(tabela, 'igualdade', coluna)
+        elif operador in OPS_INTERVALO:
+            adicionar(tabela, 'intervalo', coluna)
+
+    ordenacao = config.get('ordenacao', [])
+    tabelas_ordem = {_separar(o['campo'], padrao)[0] for o in ordenacao}
+    if len(tabelas_ordem) > 1:
+        alertas.append("🟠 ORDER BY com colunas de tabelas diferentes sempre gera filesort.")
+    elif ordenacao:
+        for o in ordenacao:
+            tabela, coluna = _separar(o['campo'], padrao)
+            adicionar(tabela, 'ordenacao', (coluna, o.get('direcao', 'ASC') == 'DESC'))
+
+    agregacoes = config.get('agregacoes', [])
+    campos = config.get('campos_selecionados', [])
+    if agregacoes and campos:
+        agregados = [agg['campo'] for agg in agregacoes]
+        agrupados = [c for c in campos if c not in agregados]
+        if len({_separar(c, padrao)[0] for c in agrupados}) == 1:
+            for campo in agrupados:
+                tabela, coluna = _separar(campo, padrao)
+                adicionar(tabela, 'agrupamento', coluna)
+
+    return papeis, alertas, com_ou
+
+
+def _deduplicar(colunas):
+    vistas = set()
+    resultado = []
+    for coluna, desc in colunas:
+        if coluna not in vistas:
+            vistas.add(coluna)
+            resultado.append((coluna, desc))
+    return resultado
+
+
+def _candidatos(papel, com_ou):
+    """Índices candidatos de uma tabela: igualdades, depois ordenação/agrupamento ou um intervalo"""
+    if com_ou:
+        # Index merge: um índice simples por coluna filtrada
+        return [([(c, False)], "coluna de critério com OR")
+                for c in papel['igualdade'] + papel['intervalo']] + \
+               [([(c, False)], "chave de junção") for c in papel['juncao']]
+
+    igualdade = [(c, False) for c in papel['juncao'] + papel['igualdade']]
+    candidatos = []
+    if papel['ordenacao']:
+        candidatos.append((igualdade + papel['ordenacao'], "igualdades + ordenação (evita filesort)"))
+    elif papel['agrupamento']:
+        candidatos.append((igualdade + [(c, False) for c in papel['agrupamento']],
+                           "igualdades + agrupamento (evita tabela temporária)"))
+    if papel['intervalo']:
+        candidatos.insert(0, (igualdade + [(papel['intervalo'][0], False)], "igualdades + filtro de intervalo"))
+    if not candidatos and igualdade:
+        motivo = "chave de junção" if papel['juncao'] and not papel['igualdade'] else "junção + filtros de igualdade"
+        candidatos.append((igualdade, motivo))
+
+    resultado = []
+    for colunas, motivo in candidatos:
+        colunas = _deduplicar(colunas)[:MAX_COLUNAS_INDICE]
+        if colunas and colunas not in [r[0] for r in resultado]:
+            resultado.append((colunas, motivo))
+    return resultado
+
+
+def _indice_que_cobre(colunas, indices_tabela):
+    """Nome de um índice existente cujo início coincide com as colunas propostas"""
+    nomes = [c for c, _ in colunas]
+    for nome, info in indices_tabela.items():
+        if info['colunas'][:len(nomes)] == nomes:
+            return nome
+    return None
+
+
+def ddl_indice(tabela, colunas, tipos=None):
+    """CREATE INDEX para as colunas (com prefixo em TEXT/BLOB e DESC quando preciso)"""
+    tipos = tipos or {}
+    nome = ("idx_" + tabela + "_" + "_".join(c + ("_desc" if desc else "") for c, desc in colunas))[:64]
+    partes = []
+    for coluna, desc in colunas:
+        tipo = (tipos.get(coluna) or "").lower()
+        prefixo = f"({PREFIXO_TEXTO})" if "text" in tipo or "blob" in tipo else ""
+        partes.append(f"`{coluna}`{prefixo}{' DESC' if desc else ''}")
+    return nome, f"CREATE INDEX `{nome}` ON `{tabela}` ({', '.join(partes)})"
+
+
+def sugerir_indices(banco, config):
+    """Compara as colunas usadas na consulta com INFORMATION_SCHEMA.STATISTICS
+
+    Retorna (sugestões, alertas). Cada sugestão tem tabela, colunas, motivo,
+    nome, ddl e coberto_por (nome do índice existente que já atende, se houver).
+    """
+    papeis, alertas, com_ou = colunas_por_papel(config)
+    indices = catalogo_schema.obter_indices(banco)
+    sugestoes = []
+    for tabela, papel in papeis.items():
+        tipos = {coluna[0]: coluna[1] for coluna in catalogo_schema.obter_estrutura(banco, tabela)}
+        for colunas, motivo in _candidatos(papel, com_ou):
+            colunas = [(c, desc) for c, desc in colunas if c in tipos]
+            if not colunas:
+                continue
+            nome, ddl = ddl_indice(tabela, colunas, tipos)
+            sugestoes.append({
+                'tabela': tabela,
+                'colunas': colunas,
+                'motivo': motivo,
+                'nome': nome,
+                'ddl': ddl,
+                'coberto_por': _indice_que_cobre(colunas, indices.get(tabela, {}))
+            })
+    return sugestoes, alertas
+
+
+# ============ COMPARAÇÃO COM EXPLAIN ============
+def metricas_plano(conexao, sql):
+    """Custo estimado, linhas examinadas e tabelas varridas segundo o EXPLAIN"""
+    nos, _ = plano_execucao.obter_plano(conexao, sql)
+    tabelas = [no for no in nos if no['tabela']]
+    custo = next((no['custo'] for no in nos if no['custo'] is not None), None)
+    return {
+        'custo': custo,
+        'linhas': sum(no['linhas_estimadas'] or 0 for no in tabelas),
+        'tabelas': len(tabelas),
+        'varridas': sum(1 for no in tabelas
+                        if plano_execucao.VARREDURA in no['alertas']
+                        or plano_execucao.JUNCAO_SEM_INDICE in no['alertas'])
+    }
+
+
+def _remover_indice(banco, cursor, sugestao):
+    """DROP do índice de teste; se a conexão do teste caiu, tenta numa conexão nova"""
+    ddl = f"DROP INDEX `{sugestao['nome']}` ON `{sugestao['tabela']}`"
+    try:
+        cursor.execute(ddl)
+    except Error:
+        conexao = criar_conexao(banco)
+        try:
+            outro = conexao.cursor()
+            outro.execute(ddl)
+            outro.close()
+        finally:
+            conexao.close()
+
+
+def comparar_com_indice(banco, sql, sugestao, manter=False):
+    """Mede o EXPLAIN antes e depois do índice; sem `manter` o índice é só um teste
+
+    O índice de teste é criado INVISIBLE e online (ALGORITHM=INPLACE, LOCK=NONE):
+    as escritas na tabela continuam e o plano das outras sessões não muda; só
+    esta conexão o enxerga, via use_invisible_indexes. Ele é removido no finally,
+    mesmo se o EXPLAIN falhar. Índice invisível exige MySQL 8.0.
+    """
+    ddl = sugestao['ddl'] if manter else f"{sugestao['ddl']} INVISIBLE ALGORITHM=INPLACE LOCK=NONE"
+    with obter_conexao(banco) as conexao:
+        antes = metricas_plano(conexao, sql)
+        cursor = conexao.cursor()
+        criado = False
+        try:
+            cursor.execute(ddl)
+            criado = True
+            if not manter:
+                cursor.execute("SET SESSION optimizer_switch = 'use_invisible_indexes=on'")
+            depois = metricas_plano(conexao, sql)
+        finally:
+            try:
+                if not manter:
+                    if criado:
+                        _remover_indice(banco, cursor, sugestao)
+                    # A conexão volta para o pool: não deixa o ajuste na sessão
+                    cursor.execute("SET SESSION optimizer_switch = 'use_invisible_indexes=default'")
+            finally:
+                cursor.close()
+                catalogo_schema.invalidar(banco)
+    return antes, depois
+
+
+# ============ INTERFACE STREAMLIT ============
+def _exibir_comparacao(antes, depois):
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Linhas examinadas (est.)", f"{depois['linhas']:,.0f}",
+                  delta=f"{depois['linhas'] - antes['linhas']:,.0f}", delta_color="inverse")
+    with col2:
+        if antes['custo'] is not None and depois['custo'] is not None:
+            st.metric("Custo", f"{depois['custo']:,.2f}",
+                      delta=f"{depois['custo'] - antes['custo']:,.2f}", delta_color="inverse")
+    with col3:
+        st.metric("Tabelas varridas", depois['varridas'],
+                  delta=depois['varridas'] - antes['varridas'], delta_color="inverse")
+    if antes['linhas']:
+        reducao = (1 - depois['linhas'] / antes['linhas']) * 100
+        st.info(f"📉 Redução estimada de **{reducao:.0f}%** nas linhas examinadas.")
+
+
+def exibir_assistente(banco, config, sql):
+    """Painel de sugestões de índice com DDL e comparação do EXPLAIN antes/depois"""
+    try:
+        sugestoes, alertas = sugerir_indices(banco, config)
+        with obter_conexao(banco) as conexao:
+            atual = metricas_plano(conexao, sql)
+    except Error as e:
+        st.error(f"❌ Erro ao analisar índices: {e}")
+        return
+
+    for alerta in alertas:
+        st.warning(alerta)
+    if atual['tabelas'] and atual['varridas'] == atual['tabelas']:
+        st.error("🚨 Do jeito que está, a consulta não usa nenhum índice: todas as tabelas são lidas por inteiro.")
+    st.caption(f"Plano atual: ~{atual['linhas']:,.0f} linhas examinadas • "
+               f"{atual['varridas']}/{atual['tabelas']} tabela(s) varrida(s)")
+
+    if not sugestoes:
+        st.info("Nenhuma coluna de junção, filtro ou ordenação que um índice possa atender.")
+        return
+
+    for i, sugestao in enumerate(sugestoes):
+        colunas = ", ".join(c + (" DESC" if desc else "") for c, desc in sugestao['colunas'])
+        st.markdown(f"**{sugestao['tabela']}** ({colunas}) — _{sugestao['motivo']}_")
+        if sugestao['coberto_por']:
+            st.success(f"✅ Já atendido pelo índice `{sugestao['coberto_por']}`")
+            continue
+        st.code(sugestao['ddl'] + ";", language="sql")
+
+        # Mesmo o teste constrói o índice na tabela real: pede confirmação explícita
+        confirmado = st.checkbox(
+            f"Entendo que testar ou criar constrói o índice em `{sugestao['tabela']}` no servidor "
+            "(o teste usa um índice invisível, removido ao final)",
+            key=f"idx_confirmar_{i}"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            testar = st.button("🧪 Testar (índice invisível, removido ao final)", key=f"idx_testar_{i}",
+                               use_container_width=True, disabled=not confirmado)
+        with col2:
+            criar = st.button("✅ Criar índice", key=f"idx_criar_{i}", use_container_width=True,
+                              disabled=not confirmado)
+        if testar or criar:
+            try:
+                with st.spinner("Construindo índice e comparando planos..."):
+                    antes, depois = comparar_com_indice(banco, sql, sugestao, manter=criar)
+                _exibir_comparacao(antes, depois)
+                if criar:
+                    st.success(f"Índice `{sugestao['nome']}` criado.")
+            except Error as e:
+                st.error(f"❌ Erro: {e}")
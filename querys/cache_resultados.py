@@ -0,0 +1,288 @@
+# cache_resultados.py - Cache de resultados de SELECT invalidado por alterações nas tabelas
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from mysql.connector import Error
+
+from conexao_pool import identificador_servidor
+
+# ============ CONFIGURAÇÃO ============
+MAX_BYTES_CACHE = 256 * 1024 * 1024    # memória total do cache
+MAX_BYTES_ENTRADA = 64 * 1024 * 1024   # resultados maiores não são guardados
+LIMITE_CHECKSUM = 100_000              # CHECKSUM TABLE só em tabelas pequenas
+JANELA_ESCRITA = 2                     # segundos: UPDATE_TIME muito recente não é confiável
+
+_RE_COMENTARIOS = re.compile(r"(--[^\n]*|#[^\n]*|/\*(?!!).*?\*/)", re.DOTALL)
+_RE_TOKENS = re.compile(r"""`(?:[^`]|``)*`|'(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|\w+|\S""")
+# Cláusulas que encerram a lista de tabelas do FROM
+_FIM_FROM = {"WHERE", "GROUP", "HAVING", "ORDER", "LIMIT", "UNION", "WINDOW", "FOR", "LOCK", "INTO",
+             "PROCEDURE", "EXCEPT", "INTERSECT"}
+# Funções cujo resultado muda sem alteração de dados
+_RE_NAO_DETERMINISTICO = re.compile(
+    r"\b(NOW|SYSDATE|CURDATE|CURTIME|CURRENT_DATE|CURRENT_TIME|CURRENT_TIMESTAMP|"
+    r"UTC_DATE|UTC_TIME|UTC_TIMESTAMP|UNIX_TIMESTAMP|RAND|UUID|UUID_SHORT|"
+    r"CONNECTION_ID|LAST_INSERT_ID|FOUND_ROWS|ROW_COUNT|USER|CURRENT_USER|SLEEP)\b",
+    re.IGNORECASE
+)
+_RE_BLOQUEIO = re.compile(r"\b(FOR\s+UPDATE|FOR\s+SHARE|LOCK\s+IN\s+SHARE\s+MODE|INTO)\b", re.IGNORECASE)
+
+
+# ============ NORMALIZAÇÃO ============
+_RE_CITACOES = re.compile(r"""('(?:[^'\\]|\\.|'')*'|"(?:[^"\\]|\\.|"")*"|`[^`]*`)""")
+
+
+def _fora_de_aspas(sql, funcao):
+    """Aplica funcao() apenas aos trechos fora de literais e identificadores citados"""
+    partes = _RE_CITACOES.split(sql)
+    return "".join(parte if i % 2 else funcao(parte) for i, parte in enumerate(partes))
+
+
+def _sem_literais(sql):
+    """Código SQL sem literais nem identificadores citados"""
+    return " ".join(parte for i, parte in enumerate(_RE_CITACOES.split(sql)) if i % 2 == 0)
+
+
+def normalizar_sql(sql):
+    """Remove comentários, espaços redundantes e ';' final (literais preservados)"""
+    sql = _fora_de_aspas(sql, lambda trecho: _RE_COMENTARIOS.sub(" ", trecho))
+    sql = _fora_de_aspas(sql, lambda trecho: re.sub(r"\s+", " ", trecho))
+    return sql.strip().rstrip(";").strip()
+
+
+_RE_NUMEROS = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?(?:e[+-]?\d+)?\b", re.IGNORECASE)
+_RE_ESPACO_OPERADOR = re.compile(r"\s*([=<>!,()])\s*")
+_RE_LISTA = re.compile(r"\(\?(?:,\?)*\)")
+_RE_LINHAS_VALUES = re.compile(r"\(\?\+\)(?:,\(\?\+\))+")
+
+
+def forma_sql(sql):
+    """Forma da instrução, para agrupar execuções que só mudam os valores
+
+    Literais (texto e números) e marcadores %s viram ?, listas como IN (1, 2, 3)
+    e linhas de VALUES colapsam; o código fica em minúsculas e sem espaços em
+    volta de operadores.
+    """
+    partes = _RE_CITACOES.split(normalizar_sql(sql))
+    forma = []
+    for i, parte in enumerate(partes):
+        if i % 2:
+            # Identificador citado (`x`) é mantido; literal vira ?
+            forma.append(parte if parte.startswith("`") else "?")
+        else:
+            codigo = _RE_NUMEROS.sub("?", parte.replace("%s", "?")).lower()
+            forma.append(_RE_ESPACO_OPERADOR.sub(r"\1", codigo))
+    forma = _RE_LISTA.sub("(?+)", "".join(forma))
+    return _RE_LINHAS_VALUES.sub("(?+)", forma)
+
+
+def cacheavel(sql):
+    """Só SELECTs determinísticos, sem bloqueio e sem opt-out SQL_NO_CACHE"""
+    codigo = _sem_literais(normalizar_sql(sql)).upper().strip()
+    if not codigo.startswith(("SELECT", "WITH")):
+        return False
+    if "SQL_NO_CACHE" in codigo:
+        return False
+    if _RE_NAO_DETERMINISTICO.search(codigo) or _RE_BLOQUEIO.search(codigo):
+        return False
+    return True
+
+
+def _identificador(token):
+    if token.startswith("`"):
+        return token[1:-1].replace("``", "`")
+    if re.fullmatch(r"\w+", token) and not token.isdigit():
+        return token
+    return None
+
+
+def tabelas_envolvidas(sql, banco):
+    """Lista (banco, tabela) citadas em FROM (inclusive listas `FROM a, b`) e JOIN
+
+    Subconsultas são percorridas também. Retorna None se alguma referência não
+    puder ser resolvida (ex.: JSON_TABLE(...)): sem todas as tabelas, o resultado
+    não pode ser invalidado com segurança.
+    """
+    tokens = _RE_TOKENS.findall(normalizar_sql(sql))
+    tabelas = set()
+    profundidade = 0
+    em_from = {}    # profundidade de parênteses -> dentro da lista de tabelas de um FROM
+    i = 0
+    while i < len(tokens):
+        token = tokens[i]
+        palavra = token.upper()
+        i += 1
+        if token == "(":
+            profundidade += 1
+            continue
+        if token == ")":
+            em_from.pop(profundidade, None)
+            profundidade -= 1
+            continue
+        if palavra in _FIM_FROM:
+            em_from[profundidade] = False
+            continue
+        if palavra not in ("FROM", "JOIN") and not (token == "," and em_from.get(profundidade)):
+            continue
+
+        em_from[profundidade] = True
+        if i < len(tokens) and tokens[i] == "(":
+            # Tabela derivada: o FROM de dentro é tratado ao percorrer a subconsulta
+            continue
+        nome = _identificador(tokens[i]) if i < len(tokens) else None
+        if nome is None:
+            return None
+        i += 1
+        if i + 1 < len(tokens) and tokens[i] == ".":
+            esquema, nome = nome, _identificador(tokens[i + 1])
+            if nome is None:
+                return None
+            i += 2
+        else:
+            esquema = banco
+        if i < len(tokens) and tokens[i] == "(":
+            # Função de tabela (JSON_TABLE, LATERAL etc.)
+            return None
+        tabelas.add((esquema, nome))
+    return sorted(tabelas)
+
+
+# ============ MARCADORES DE ALTERAÇÃO ============
+def obter_marcadores(conexao, banco, sql):
+    """Estado atual das tabelas da consulta; None se não for possível validar o cache"""
+    tabelas = tabelas_envolvidas(sql, banco)
+    if not tabelas:
+        return None
+
+    cursor = conexao.cursor()
+    try:
+        try:
+            # MySQL 8 guarda estatísticas do INFORMATION_SCHEMA por até 24h
+            cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        except Error:
+            pass
+
+        condicoes = " OR ".join(["(TABLE_SCHEMA = %s AND TABLE_NAME = %s)"] * len(tabelas))
+        params = [valor for par in tabelas for valor in par]
+        cursor.execute(f"""
+            SELECT TABLE_SCHEMA, TABLE_NAME, TABLE_TYPE, ENGINE, UPDATE_TIME, TABLE_ROWS,
+                   UNIX_TIMESTAMP(UPDATE_TIME), UNIX_TIMESTAMP()
+            FROM INFORMATION_SCHEMA.TABLES
+            WHERE {condicoes}
+        """, params)
+        linhas = {(l[0], l[1]): l for l in cursor.fetchall()}
+
+        marcadores = {}
+        for esquema, tabela in tabelas:
+            linha = linhas.get((esquema, tabela))
+            if linha is None:
+                # CTE, tabela temporária ou nome não resolvido
+                return None
+            _, _, tipo, motor, atualizado, qtd_linhas, atualizado_ts, agora_ts = linha
+            if tipo != 'BASE TABLE':
+                return None
+            if atualizado is not None:
+                if agora_ts - atualizado_ts < JANELA_ESCRITA:
+                    return None
+                marcadores[(esquema, tabela)] = str(atualizado)
+            elif (motor or "").upper() == 'INNODB':
+                # InnoDB: NULL = sem alterações desde o início do servidor
+                marcadores[(esquema, tabela)] = None
+            elif (qtd_linhas or 0) <= LIMITE_CHECKSUM:
+                cursor.execute(f"CHECKSUM TABLE `{esquema}`.`{tabela}`")
+                marcadores[(esquema, tabela)] = ('checksum', cursor.fetchone()[1])
+            else:
+                return None
+        return marcadores
+    except Error:
+        return None
+    finally:
+        cursor.close()
+
+
+# ============ CACHE LRU POR TAMANHO ============
+class CacheResultados:
+    """Cache LRU de DataFrames limitado pela memória ocupada"""
+
+    def __init__(self, max_bytes=MAX_BYTES_CACHE, max_bytes_entrada=MAX_BYTES_ENTRADA):
+        self.max_bytes = max_bytes
+        self.max_bytes_entrada = max_bytes_entrada
+        self._dados = OrderedDict()   # chave -> (df, marcadores, tamanho, instante)
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def obter(self, chave, marcadores):
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            if item[1] != marcadores:
+                # Alguma tabela mudou: entrada velha
+                self._bytes -= item[2]
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return item[0], item[3]
+
+    def guardar(self, chave, df, marcadores):
+        tamanho = int(df.memory_usage(deep=True).sum())
+        if tamanho > self.max_bytes_entrada:
+            return
+        with self._lock:
+            antigo = self._dados.pop(chave, None)
+            if antigo:
+                self._bytes -= antigo[2]
+            self._dados[chave] = (df, marcadores, tamanho, time.time())
+            self._bytes += tamanho
+            while self._bytes > self.max_bytes and self._dados:
+                _, removido = self._dados.popitem(last=False)
+                self._bytes -= removido[2]
+
+    def limpar(self):
+        with self._lock:
+            self._dados.clear()
+            self._bytes = 0
+
+    def estatisticas(self):
+        with self._lock:
+            return {'entradas': len(self._dados), 'bytes': self._bytes}
+
+
+_cache = CacheResultados()
+
+
+def _chave(banco, sql):
+    return (identificador_servidor(), banco, normalizar_sql(sql))
+
+
+def buscar(conexao, banco, sql):
+    """Consulta o cache antes de executar
+
+    Retorna (df ou None, instante em que foi guardado, marcadores). Marcadores None
+    indica que o resultado não pode ser cacheado.
+    """
+    if not cacheavel(sql):
+        return None, None, None
+    marcadores = obter_marcadores(conexao, banco, sql)
+    if marcadores is None:
+        return None, None, None
+    encontrado = _cache.obter(_chave(banco, sql), marcadores)
+    if encontrado is None:
+        return None, None, marcadores
+    df, guardado_em = encontrado
+    return df, guardado_em, marcadores
+
+
+def guardar(banco, sql, df, marcadores):
+    """Guarda o resultado com os marcadores lidos ANTES da execução"""
+    if marcadores is not None:
+        _cache.guardar(_chave(banco, sql), df, marcadores)
+
+
+def limpar():
+    _cache.limpar()
+
+
+def estatisticas():
+    return _cache.estatisticas()
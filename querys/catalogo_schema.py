@@ -0,0 +1,271 @@
+# catalogo_schema.py - Cache compartilhado de metadados do esquema (bancos, tabelas, colunas)
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from conexao_pool import obter_conexao, identificador_servidor, BANCOS_SISTEMA
+
+# ============ CONFIGURAÇÃO ============
+TTL_CATALOGO = 300        # segundos até uma entrada ser considerada velha
+MAX_ENTRADAS = 2000       # entradas mantidas antes de descartar as menos usadas
+
+
+# ============ CACHE TTL + LRU ============
+class CacheTTL:
+    """Cache em memória com expiração por tempo e descarte LRU"""
+
+    def __init__(self, ttl=TTL_CATALOGO, max_entradas=MAX_ENTRADAS):
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self._dados = OrderedDict()   # chave -> (valor, instante de carga)
+        self._lock = threading.Lock()
+
+    def obter(self, chave):
+        """Retorna o valor em cache ou None se ausente/expirado"""
+        with self._lock:
+            item = self._dados.get(chave)
+            if item is None:
+                return None
+            valor, carregado_em = item
+            if time.monotonic() - carregado_em > self.ttl:
+                del self._dados[chave]
+                return None
+            self._dados.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor):
+        with self._lock:
+            self._dados[chave] = (valor, time.monotonic())
+            self._dados.move_to_end(chave)
+            while len(self._dados) > self.max_entradas:
+                self._dados.popitem(last=False)
+
+    def obter_ou_carregar(self, chave, carregar):
+        """Retorna do cache ou chama carregar() e guarda o resultado"""
+        valor = self.obter(chave)
+        if valor is None:
+            valor = carregar()
+            self.guardar(chave, valor)
+        return valor
+
+    def invalidar(self, filtro=None):
+        """Remove as entradas cuja chave satisfaz filtro (ou todas)"""
+        with self._lock:
+            if filtro is None:
+                self._dados.clear()
+                return
+            for chave in [c for c in self._dados if filtro(c)]:
+                del self._dados[chave]
+
+
+_cache = CacheTTL()
+
+
+# ============ CONSULTAS AO CATÁLOGO ============
+# Chaves: (servidor, banco, tabela, tipo)
+
+def listar_bancos(incluir_sistema=False):
+    """Lista os bancos do servidor (cacheado)"""
+    def carregar():
+        with obter_conexao() as conexao:
+            cursor = conexao.cursor()
+            cursor.execute("SHOW DATABASES")
+            bancos = [db[0] for db in cursor.fetchall()]
+            cursor.close()
+        return bancos
+
+    bancos = _cache.obter_ou_carregar((identificador_servidor(), None, None, 'bancos'), carregar)
+    if incluir_sistema:
+        return list(bancos)
+    return [b for b in bancos if b not in BANCOS_SISTEMA]
+
+
+def listar_tabelas(banco):
+    """Lista as tabelas de um banco (cacheado)"""
+    def carregar():
+        with obter_conexao(banco) as conexao:
+            cursor = conexao.cursor()
+            cursor.execute("SHOW TABLES")
+            tabelas = [t[0] for t in cursor.fetchall()]
+            cursor.close()
+        return tabelas
+
+    return list(_cache.obter_ou_carregar((identificador_servidor(), banco, None, 'tabelas'), carregar))
+
+
+def _texto(valor):
+    """Alguns drivers devolvem colunas do INFORMATION_SCHEMA como bytes"""
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode('utf-8')
+    return valor
+
+
+def _carregar_colunas(banco, tabela=None):
+    """{tabela: [linhas no formato de DESCRIBE]} do banco inteiro ou de uma tabela só"""
+    filtro_tabela = "AND TABLE_NAME = %s" if tabela is not None else ""
+    params = (banco, tabela) if tabela is not None else (banco,)
+    with obter_conexao(banco) as conexao:
+        cursor = conexao.cursor()
+        cursor.execute(f"""
+            SELECT 
+                TABLE_NAME,
+                COLUMN_NAME,
+                COLUMN_TYPE,
+                IS_NULLABLE,
+                COLUMN_KEY,
+                COLUMN_DEFAULT,
+                EXTRA
+            FROM 
+                INFORMATION_SCHEMA.COLUMNS
+            WHERE 
+                TABLE_SCHEMA = %s
+                {filtro_tabela}
+            ORDER BY TABLE_NAME, ORDINAL_POSITION
+        """, params)
+        linhas = cursor.fetchall()
+        cursor.close()
+
+    colunas = {}
+    for nome, *descricao in linhas:
+        colunas.setdefault(_texto(nome), []).append(tuple(_texto(v) for v in descricao))
+    return colunas
+
+
+def obter_colunas_banco(banco):
+    """Colunas de TODAS as tabelas do banco numa única consulta (cacheado)
+
+    Retorna {tabela: [(Field, Type, Null, Key, Default, Extra), ...]}, no mesmo
+    formato das linhas de DESCRIBE.
+    """
+    return _cache.obter_ou_carregar((identificador_servidor(), banco, None, 'colunas'),
+                                    lambda: _carregar_colunas(banco))
+
+
+def obter_estrutura(banco, tabela):
+    """Retorna as colunas da tabela no formato de DESCRIBE (cacheado)"""
+    estrutura = obter_colunas_banco(banco).get(tabela)
+    if estrutura is None:
+        # Fora da carga do catálogo (tabela nova ou inexistente): busca só esta tabela,
+        # com entrada própria no cache; o restante do banco continua cacheado
+        estrutura = _cache.obter_ou_carregar(
+            (identificador_servidor(), banco, tabela, 'colunas'),
+            lambda: _carregar_colunas(banco, tabela).get(tabela, [])
+        )
+    return list(estrutura)
+
+
+# ============ GRAFO DE CHAVES ESTRANGEIRAS ============
+def obter_grafo_fks(banco):
+    """Carrega todas as FKs do banco numa única consulta (cacheado)
+
+    Retorna {tabela_origem: [relacionamento, ...]} onde cada relacionamento
+    tem as chaves tabela_origem, coluna_origem, tabela_destino e coluna_destino.
+    """
+    def carregar():
+        with obter_conexao(banco) as conexao:
+            cursor = conexao.cursor()
+            cursor.execute("""
+                SELECT 
+                    TABLE_NAME,
+                    COLUMN_NAME,
+                    REFERENCED_TABLE_NAME,
+                    REFERENCED_COLUMN_NAME
+                FROM 
+                    INFORMATION_SCHEMA.KEY_COLUMN_USAGE
+                WHERE 
+                    TABLE_SCHEMA = %s
+                    AND REFERENCED_TABLE_SCHEMA = %s
+                    AND REFERENCED_TABLE_NAME IS NOT NULL
+                ORDER BY TABLE_NAME, CONSTRAINT_NAME, ORDINAL_POSITION
+            """, (banco, banco))
+            linhas = cursor.fetchall()
+            cursor.close()
+
+        grafo = {}
+        for linha in linhas:
+            tabela, coluna, ref_tab, ref_col = (_texto(v) for v in linha)
+            grafo.setdefault(tabela, []).append({
+                'tabela_origem': tabela,
+                'coluna_origem': coluna,
+                'tabela_destino': ref_tab,
+                'coluna_destino': ref_col
+            })
+        return grafo
+
+    return _cache.obter_ou_carregar((identificador_servidor(), banco, None, 'fks'), carregar)
+
+
+def relacionamentos_entre(banco, tabelas):
+    """Relacionamentos cujas duas pontas estão em `tabelas`, a partir do grafo em memória"""
+    grafo = obter_grafo_fks(banco)
+    conjunto = set(tabelas)
+    return [
+        dict(rel)
+        for tabela in tabelas
+        for rel in grafo.get(tabela, ())
+        if rel['tabela_destino'] in conjunto
+    ]
+
+
+# ============ ÍNDICES ============
+def obter_indices(banco):
+    """Índices de todas as tabelas do banco numa única consulta (cacheado)
+
+    Retorna {tabela: {nome_indice: {'colunas': [...], 'unico': bool}}}, com as
+    colunas na ordem do índice.
+    """
+    def carregar():
+        with obter_conexao(banco) as conexao:
+            cursor = conexao.cursor()
+            cursor.execute("""
+                SELECT
+                    TABLE_NAME,
+                    INDEX_NAME,
+                    COLUMN_NAME,
+                    NON_UNIQUE
+                FROM
+                    INFORMATION_SCHEMA.STATISTICS
+                WHERE
+                    TABLE_SCHEMA = %s
+                ORDER BY TABLE_NAME, INDEX_NAME, SEQ_IN_INDEX
+            """, (banco,))
+            linhas = cursor.fetchall()
+            cursor.close()
+
+        indices = {}
+        for tabela, indice, coluna, nao_unico in linhas:
+            info = indices.setdefault(_texto(tabela), {}).setdefault(
+                _texto(indice), {'colunas': [], 'unico': not int(nao_unico)}
+            )
+            if coluna is not None:
+                # Índices funcionais não têm COLUMN_NAME
+                info['colunas'].append(_texto(coluna))
+        return indices
+
+    return _cache.obter_ou_carregar((identificador_servidor(), banco, None, 'indices'), carregar)
+
+
+# ============ INVALIDAÇÃO ============
+def invalidar(banco=None, tabela=None):
+    """Invalida o catálogo inteiro, de um banco ou de uma tabela"""
+    servidor = identificador_servidor()
+    if banco is None:
+        _cache.invalidar(lambda chave: chave[0] == servidor)
+    elif tabela is None:
+        _cache.invalidar(lambda chave: chave[0] == servidor and chave[1] == banco)
+    else:
+        _cache.invalidar(lambda chave: chave[0] == servidor and chave[1] == banco
+                         and chave[2] in (tabela, None))
+
+
+_RE_DDL = re.compile(r"^\s*(CREATE|ALTER|DROP|RENAME|TRUNCATE)\b", re.IGNORECASE | re.MULTILINE)
+_RE_DDL_BANCO = re.compile(r"^\s*(CREATE|DROP|ALTER)\s+(DATABASE|SCHEMA)\b", re.IGNORECASE | re.MULTILINE)
+
+
+def invalidar_por_sql(banco, sql):
+    """Invalida o catálogo afetado se o SQL executado contém DDL"""
+    if _RE_DDL_BANCO.search(sql):
+        invalidar()
+    elif _RE_DDL.search(sql):
+        invalidar(banco)
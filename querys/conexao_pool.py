@@ -0,0 +1,282 @@
+# conexao_pool.py - Pool de conexões MySQL compartilhado por todas as páginas
+import os
+import threading
+import time
+import weakref
+from collections import deque, OrderedDict
+from contextlib import contextmanager
+
+import mysql.connector
+from mysql.connector import Error
+from mysql.connector.errors import InterfaceError, OperationalError, PoolError
+
+# ============ CONFIGURAÇÃO ============
+# ALTERE ESTES VALORES PARA SUAS CREDENCIAIS
+CONFIG_MYSQL = {
+    "host": os.environ.get("MYSQL_HOST", "localhost"),
+    "port": int(os.environ.get("MYSQL_PORT", 3306)),
+    "user": os.environ.get("MYSQL_USER", "root"),
+    "password": os.environ.get("MYSQL_PASSWORD", ""),  # Sua senha aqui
+}
+
+# Conexões por banco (sub-pool) e tempo máximo que uma conexão fica ociosa
+TAMANHO_POOL = int(os.environ.get("MYSQL_POOL_TAMANHO", 5))
+TIMEOUT_OCIOSO = float(os.environ.get("MYSQL_POOL_TIMEOUT_OCIOSO", 300))
+# Quanto tempo esperar por uma conexão livre antes de desistir
+TIMEOUT_AQUISICAO = float(os.environ.get("MYSQL_POOL_TIMEOUT_AQUISICAO", 10))
+# Conexões devolvidas há mais tempo que isso recebem um ping antes de reusar
+INTERVALO_PING = float(os.environ.get("MYSQL_POOL_INTERVALO_PING", 30))
+# Instruções preparadas mantidas abertas por conexão (o servidor limita o total)
+MAX_PREPARADAS = int(os.environ.get("MYSQL_MAX_PREPARADAS", 32))
+
+BANCOS_SISTEMA = ['information_schema', 'mysql', 'performance_schema', 'sys']
+
+
+# ============ POOL DE CONEXÕES ============
+class PoolConexoes:
+    """Pool de conexões MySQL com um sub-pool por banco de dados"""
+
+    def __init__(self, config, tamanho=TAMANHO_POOL, timeout_ocioso=TIMEOUT_OCIOSO,
+                 timeout_aquisicao=TIMEOUT_AQUISICAO, intervalo_ping=INTERVALO_PING):
+        self.config = dict(config)
+        self.tamanho = tamanho
+        self.timeout_ocioso = timeout_ocioso
+        self.timeout_aquisicao = timeout_aquisicao
+        self.intervalo_ping = intervalo_ping
+
+        self._condicao = threading.Condition()
+        # banco -> deque de (conexao, instante em que foi devolvida)
+        self._livres = {}
+        # banco -> quantidade de conexões emprestadas
+        self._em_uso = {}
+
+    def _criar(self, database):
+        return mysql.connector.connect(database=database or None, **self.config)
+
+    def _saudavel(self, conexao):
+        """Verifica com um ping se a conexão ainda está viva"""
+        try:
+            return conexao.is_connected()
+        except Error:
+            return False
+
+    def _retirar_ociosas(self):
+        """Remove (sem fechar) conexões ociosas há mais que timeout_ocioso"""
+        limite = time.monotonic() - self.timeout_ocioso
+        expiradas = []
+        for livres in self._livres.values():
+            # As mais antigas ficam à esquerda
+            while livres and livres[0][1] < limite:
+                expiradas.append(livres.popleft()[0])
+        return expiradas
+
+    @staticmethod
+    def _fechar(conexoes):
+        for conexao in conexoes:
+            try:
+                conexao.close()
+            except Exception:
+                pass
+
+    def adquirir(self, database=None):
+        """Empresta uma conexão do sub-pool do banco, criando se necessário"""
+        chave = database or ""
+        prazo = time.monotonic() + self.timeout_aquisicao
+        conexao = None
+        devolvida_em = None
+
+        with self._condicao:
+            expiradas = self._retirar_ociosas()
+            while True:
+                livres = self._livres.setdefault(chave, deque())
+                if livres:
+                    # LIFO: reutiliza a conexão usada mais recentemente
+                    conexao, devolvida_em = livres.pop()
+                    break
+                if self._em_uso.get(chave, 0) < self.tamanho:
+                    break
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    self._fechar(expiradas)
+                    raise PoolError(
+                        f"Pool esgotado para o banco '{chave or '(servidor)'}': "
+                        f"{self.tamanho} conexões em uso"
+                    )
+                self._condicao.wait(restante)
+            self._em_uso[chave] = self._em_uso.get(chave, 0) + 1
+
+        self._fechar(expiradas)
+
+        try:
+            if conexao is not None and time.monotonic() - devolvida_em > self.intervalo_ping:
+                if not self._saudavel(conexao):
+                    self._fechar([conexao])
+                    conexao = None
+            if conexao is None:
+                conexao = self._criar(database)
+        except Exception:
+            with self._condicao:
+                self._em_uso[chave] -= 1
+                self._condicao.notify()
+            raise
+
+        return conexao
+
+    def devolver(self, conexao, database=None, descartar=False):
+        """Devolve a conexão ao sub-pool, limpando estado de transação"""
+        chave = database or ""
+
+        if not descartar:
+            try:
+                if conexao.unread_result:
+                    # Resultado não consumido (ex.: streaming interrompido)
+                    descartar = True
+                else:
+                    if conexao.in_transaction:
+                        conexao.rollback()
+                    # O usuário pode ter executado USE outro_banco
+                    if (conexao.database or "") != chave:
+                        if chave:
+                            conexao.database = chave
+                        else:
+                            descartar = True
+            except Error:
+                descartar = True
+
+        if descartar:
+            self._fechar([conexao])
+
+        with self._condicao:
+            self._em_uso[chave] = max(self._em_uso.get(chave, 0) - 1, 0)
+            if not descartar:
+                self._livres.setdefault(chave, deque()).append((conexao, time.monotonic()))
+            self._condicao.notify()
+
+    def fechar_todas(self):
+        """Fecha todas as conexões ociosas do pool"""
+        with self._condicao:
+            conexoes = [c for livres in self._livres.values() for c, _ in livres]
+            self._livres.clear()
+        self._fechar(conexoes)
+
+    def estatisticas(self):
+        """Retorna {banco: {'livres': n, 'em_uso': n}} para exibição"""
+        with self._condicao:
+            bancos = set(self._livres) | set(self._em_uso)
+            return {
+                banco or "(servidor)": {
+                    'livres': len(self._livres.get(banco, ())),
+                    'em_uso': self._em_uso.get(banco, 0),
+                }
+                for banco in sorted(bancos)
+            }
+
+
+# ============ POOL GLOBAL DO PROCESSO ============
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obter_pool():
+    """Retorna o pool compartilhado pelo processo (criado na primeira chamada)"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolConexoes(CONFIG_MYSQL)
+    return _pool
+
+
+def configurar_pool(tamanho=None, timeout_ocioso=None):
+    """Ajusta tamanho e timeout ocioso do pool global"""
+    pool = obter_pool()
+    with pool._condicao:
+        if tamanho is not None:
+            pool.tamanho = tamanho
+        if timeout_ocioso is not None:
+            pool.timeout_ocioso = timeout_ocioso
+        pool._condicao.notify_all()
+
+
+@contextmanager
+def obter_conexao(database=None):
+    """Empresta uma conexão do pool e devolve ao sair do bloco `with`"""
+    pool = obter_pool()
+    conexao = pool.adquirir(database)
+    descartar = False
+    try:
+        yield conexao
+    except (InterfaceError, OperationalError):
+        # Conexão perdida ou em estado inválido: não volta para o pool
+        descartar = True
+        raise
+    finally:
+        pool.devolver(conexao, database, descartar)
+
+
+# ============ INSTRUÇÕES PREPARADAS ============
+# conexão -> OrderedDict((banco, sql) -> (cursor preparado, sql)); some junto com a conexão
+_preparadas = weakref.WeakKeyDictionary()
+_lock_preparadas = threading.Lock()
+
+
+def _fechar_cursor(cursor):
+    try:
+        cursor.close()
+    except Error:
+        pass
+
+
+def cursor_preparado(conexao, sql):
+    """Cursor preparado (cursor(prepared=True)) para `sql` nesta conexão, reaproveitado
+
+    O SQL com %s é a forma da instrução: execuções que só mudam os parâmetros
+    pulam o parse e o plano no servidor. Retorna (cursor, sql); execute com o
+    sql devolvido, pois o conector só reaproveita a preparação para o mesmo objeto.
+    Não feche o cursor: ele pertence ao cache (LRU de MAX_PREPARADAS por conexão).
+    """
+    chave = (conexao.database, sql)
+    with _lock_preparadas:
+        cursores = _preparadas.setdefault(conexao, OrderedDict())
+        item = cursores.get(chave)
+        if item is not None:
+            cursores.move_to_end(chave)
+            return item
+        item = (conexao.cursor(prepared=True), sql)
+        cursores[chave] = item
+        descartados = []
+        while len(cursores) > MAX_PREPARADAS:
+            descartados.append(cursores.popitem(last=False)[1][0])
+    for cursor in descartados:
+        # Fecha a instrução no servidor (COM_STMT_CLOSE)
+        _fechar_cursor(cursor)
+    return item
+
+
+def descartar_preparado(conexao, sql=None):
+    """Fecha o cursor preparado de `sql` (ou todos da conexão), ex.: após leitura interrompida"""
+    with _lock_preparadas:
+        cursores = _preparadas.get(conexao)
+        if not cursores:
+            return
+        if sql is None:
+            descartados = [item[0] for item in cursores.values()]
+            cursores.clear()
+        else:
+            item = cursores.pop((conexao.database, sql), None)
+            descartados = [item[0]] if item else []
+    for cursor in descartados:
+        _fechar_cursor(cursor)
+
+
+def criar_conexao(database=None, **opcoes):
+    """Cria uma conexão dedicada (fora do pool) com a configuração central
+
+    `opcoes` são repassadas ao conector (ex.: allow_local_infile=True).
+    """
+    return mysql.connector.connect(database=database or None, **CONFIG_MYSQL, **opcoes)
+
+
+def identificador_servidor():
+    """Identifica o servidor configurado (usado em chaves de cache)"""
+    return f"{CONFIG_MYSQL['user']}@{CONFIG_MYSQL['host']}:{CONFIG_MYSQL['port']}"
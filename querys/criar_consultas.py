@@ -1,65 +1,25 @@
 import streamlit as st
 import re
 import pandas as pd
-import mysql.connector
 from mysql.connector import Error
+from mysql.connector.conversion import MySQLConverter
 from datetime import datetime
-import json
+from conexao_pool import obter_conexao, cursor_preparado, descartar_preparado
+import catalogo_schema
+from execucao import exibir_streaming, ExecucaoControlada, TIMEOUT_PADRAO
+import cache_resultados
+import tarefas
+import plano_execucao
+import assistente_indices
+import exportacao
+import modelo_consulta
 
 # ============ SISTEMA DE CONEXÃO ============
-def conectar_banco(database=None):
-    """Conecta ao MySQL usando a conexão existente ou cria nova"""
-    # Primeiro, tenta usar a conexão do app.py
-    if "conexao_mysql" in st.session_state and st.session_state.conexao_mysql:
-        conexao = st.session_state.conexao_mysql
-        
-        # Se pediu banco específico, tenta usar
-        if database and database != conexao.database:
-            try:
-                cursor = conexao.cursor()
-                cursor.execute(f"USE {database}")
-                cursor.close()
-                conexao.database = database
-                return conexao
-            except:
-                pass
-        return conexao
-    
-    # Se não tem conexão no session_state, cria nova
-    try:
-        conexao = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",
-            database=database
-        )
-        return conexao
-    except Error as e:
-        st.error(f"Erro: {e}")
-        return None
-
 def listar_bancos():
     """Lista todos os bancos disponíveis"""
     try:
-        # Cria nova conexão sem banco específico para ver TODOS os bancos
-        conexao_temp = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password=""
-        )
-        
-        cursor = conexao_temp.cursor()
-        cursor.execute("SHOW DATABASES")
-        todos_bancos = [db[0] for db in cursor.fetchall()]
-        cursor.close()
-        conexao_temp.close()
-        
-        # Filtra bancos de sistema
-        bancos = [b for b in todos_bancos if b not in [
-            'information_schema', 'mysql', 'performance_schema', 'sys'
-        ]]
-        
-        return bancos
+        # Catálogo em cache, já sem os bancos de sistema
+        return catalogo_schema.listar_bancos()
         
     except Exception as e:
         st.error(f"Erro ao listar bancos: {e}")
@@ -68,25 +28,14 @@ def listar_bancos():
 def listar_tabelas(banco):
     """Lista tabelas de um banco"""
     try:
-        conexao = conectar_banco(banco)
-        if not conexao:
-            return []
-        
-        cursor = conexao.cursor()
-        cursor.execute("SHOW TABLES")
-        tabelas = [t[0] for t in cursor.fetchall()]
-        cursor.close()
-        return tabelas
+        return catalogo_schema.listar_tabelas(banco)
     except:
         return []
 
-def obter_colunas_tabela(conexao, tabela):
+def obter_colunas_tabela(banco, tabela):
     """Obtém colunas de uma tabela"""
     try:
-        cursor = conexao.cursor()
-        cursor.execute(f"DESCRIBE {tabela}")
-        colunas_info = cursor.fetchall()
-        cursor.close()
+        colunas_info = catalogo_schema.obter_estrutura(banco, tabela)
         
         colunas = []
         tipos = {}
@@ -112,165 +61,49 @@ def obter_colunas_tabela(conexao, tabela):
 def gerar_consulta_sql(tabelas_selecionadas, campos_selecionados, criterios=None, ordenacao=None, limite=None, joins=None, agregacoes=None):
     """
     Gera SQL baseado nas seleções do usuário
-    """
-    
-    # 1. SELECT com agregações
-    if not campos_selecionados and not agregacoes:
-        campos_select = ["*"]
-    else:
-        campos_select = []
-        
-        # Adiciona campos normais
-        if campos_selecionados:
-            campos_select.extend(campos_selecionados)
-        
-        # Adiciona campos com agregações
-        if agregacoes:
-            for agg in agregacoes:
-                campo = agg['campo']
-                funcao = agg['funcao']
-                alias = agg.get('alias', f"{funcao}_{campo.split('.')[-1]}")
-                
-                if funcao == "COUNT(DISTINCT)":
-                    campos_select.append(f"COUNT(DISTINCT {campo}) AS {alias}")
-                else:
-                    campos_select.append(f"{funcao}({campo}) AS {alias}")
-    
-    campos_str = ", ".join(campos_select)
-    
-    # 2. FROM com JOINs
-    if len(tabelas_selecionadas) == 1:
-        from_str = tabelas_selecionadas[0]
-    else:
-        if joins:
-            # Construir JOINs
-            from_str = tabelas_selecionadas[0]
-            for join in joins:
-                join_type = join.get('tipo', 'INNER JOIN')
-                from_str += f" {join_type} {join['tabela2']} ON {join['tabela1']}.{join['coluna1']} = {join['tabela2']}.{join['coluna2']}"
-        else:
-            # JOIN simples (CROSS JOIN)
-            from_str = ", ".join(tabelas_selecionadas)
-    
-    # 3. WHERE
-    where_str = ""
-    if criterios:
-        where_conditions = []
-        for i, criterio in enumerate(criterios):
-            campo = criterio.get('campo')
-            operador = criterio.get('operador', '=')
-            valor = criterio.get('valor')
-            
-            # Formata valor baseado no tipo e operador
-            if operador in ["IN", "NOT IN"] and valor:
-                # Para IN, espera-se valores separados por vírgula
-                valores = [v.strip() for v in valor.split(',')]
-                valores_formatados = []
-                for v in valores:
-                    if isinstance(v, str) and not v.replace('.', '', 1).isdigit():
-                        valores_formatados.append(f"'{v}'")
-                    else:
-                        valores_formatados.append(v)
-                valor_str = f"({', '.join(valores_formatados)})"
-                condition = f"{campo} {operador} {valor_str}"
-            
-            elif operador in ["IS NULL", "IS NOT NULL"]:
-                condition = f"{campo} {operador}"
-            
-            else:
-                # Formatação normal
-                if isinstance(valor, str) and not valor.replace('.', '', 1).isdigit() and valor.lower() != 'null':
-                    valor_str = f"'{valor}'"
-                else:
-                    valor_str = str(valor)
-                
-                if operador == "LIKE":
-                    if not valor_str.startswith("'%"):
-                        valor_str = f"'%{valor_str[1:-1]}%'"
-                
-                condition = f"{campo} {operador} {valor_str}"
-            
-            where_conditions.append(condition)
-        
-        if where_conditions:
-            # Usa a lógica do primeiro critério para todos (simplificado)
-            logica = criterios[0].get('logica', 'AND') if criterios else 'AND'
-            where_str = "WHERE " + f" {logica} ".join(where_conditions)
-    
-    # 4. GROUP BY (se houver agregações)
-    group_str = ""
-    if agregacoes and campos_selecionados:
-        # Agrupa por campos que não estão agregados
-        campos_nao_agregados = [c for c in campos_selecionados 
-                               if c not in [agg['campo'] for agg in agregacoes]]
-        if campos_nao_agregados:
-            group_str = "GROUP BY " + ", ".join(campos_nao_agregados)
     
-    # 5. ORDER BY
-    order_str = ""
-    if ordenacao:
-        orders = []
-        for order in ordenacao:
-            campo = order.get('campo')
-            direcao = order.get('direcao', 'ASC')
-            orders.append(f"{campo} {direcao}")
-        order_str = "ORDER BY " + ", ".join(orders)
-    
-    # 6. LIMIT
-    limit_str = ""
-    if limite:
-        limit_str = f"LIMIT {limite}"
-    
-    # Monta SQL final
-    sql_parts = [f"SELECT {campos_str}", f"FROM {from_str}"]
-    
-    if where_str:
-        sql_parts.append(where_str)
-    if group_str:
-        sql_parts.append(group_str)
-    if order_str:
-        sql_parts.append(order_str)
-    if limit_str:
-        sql_parts.append(limit_str)
-    
-    sql = " ".join(sql_parts)
-    
-    return sql
+    Retorna (sql, params): os valores dos critérios ficam em `params` e o SQL
+    traz %s no lugar deles, para execução com cursor preparado. A compilação
+    passa pelo modelo tipado e é memoizada por cláusula.
+    """
+    consulta = modelo_consulta.montar(
+        tabelas_selecionadas, campos_selecionados, criterios, ordenacao, limite, joins, agregacoes
+    )
+    return modelo_consulta.compilar(consulta)
+
+_conversor = MySQLConverter('utf8mb4')
 
-def obter_relacionamentos(conexao, tabelas):
+def contar_marcadores(sql):
+    """Quantidade de marcadores %s fora de literais e identificadores citados"""
+    contagem = [0]
+
+    def contar(trecho):
+        contagem[0] += trecho.count("%s")
+        return trecho
+
+    cache_resultados._fora_de_aspas(sql, contar)
+    return contagem[0]
+
+def sql_com_valores(sql, params):
+    """SQL com os parâmetros como literais escapados (para EXPLAIN, cache, exportação e tarefas)"""
+    if not params:
+        return sql
+    literais = iter([
+        "NULL" if v is None else _conversor.quote(_conversor.escape(_conversor.to_mysql(v))).decode('utf-8')
+        for v in params
+    ])
+    # Um %s dentro de um literal (ex.: LIKE '%silva%') não é marcador
+    return cache_resultados._fora_de_aspas(
+        sql, lambda trecho: re.sub(r"%s", lambda _: next(literais), trecho)
+    )
+
+def obter_relacionamentos(banco, tabelas):
     """Tenta inferir relacionamentos entre tabelas"""
-    relacionamentos = []
-    
-    for tabela in tabelas:
-        try:
-            cursor = conexao.cursor()
-            cursor.execute(f"""
-                SELECT 
-                    COLUMN_NAME,
-                    REFERENCED_TABLE_NAME,
-                    REFERENCED_COLUMN_NAME
-                FROM 
-                    INFORMATION_SCHEMA.KEY_COLUMN_USAGE
-                WHERE 
-                    TABLE_SCHEMA = '{conexao.database}' 
-                    AND TABLE_NAME = '{tabela}'
-                    AND REFERENCED_TABLE_NAME IS NOT NULL
-            """)
-            
-            for col, ref_tab, ref_col in cursor.fetchall():
-                if ref_tab in tabelas:
-                    relacionamentos.append({
-                        'tabela_origem': tabela,
-                        'coluna_origem': col,
-                        'tabela_destino': ref_tab,
-                        'coluna_destino': ref_col
-                    })
-            
-            cursor.close()
-        except:
-            continue
-    
-    return relacionamentos
+    # O grafo de FKs do banco inteiro vem de uma única consulta e fica em cache
+    try:
+        return catalogo_schema.relacionamentos_entre(banco, tabelas)
+    except Error:
+        return []
 
 # ============ INTERFACE STREAMLIT ============
 
@@ -308,591 +141,626 @@ def interface_consulta_visual():
         key="select_banco"
     )
     
-    if banco_selecionado:
-        st.session_state.consulta_config['banco_selecionado'] = banco_selecionado
-        
-        # Conecta ao banco
-        conexao = conectar_banco(banco_selecionado)
-        if not conexao:
-            st.error("Não foi possível conectar ao banco!")
-            return
-        
-        # ============ ETAPA 2: SELECIONAR TABELAS ============
-        st.header("2️⃣ Selecione as Tabelas")
-        
-        tabelas = listar_tabelas(banco_selecionado)
-        if not tabelas:
-            st.warning("Nenhuma tabela encontrada!")
-            return
-        
-        tabelas_selecionadas = st.multiselect(
-            "Tabelas para consulta:",
-            options=tabelas,
-            default=st.session_state.consulta_config.get('tabelas_selecionadas', []),
-            key="select_tabelas"
-        )
-        
-        st.session_state.consulta_config['tabelas_selecionadas'] = tabelas_selecionadas
+    if not banco_selecionado:
+        return
+    
+    st.session_state.consulta_config['banco_selecionado'] = banco_selecionado
+    
+    # Nenhuma conexão fica presa durante a renderização: o catálogo empresta as
+    # suas do mesmo sub-pool, e a execução empresta uma só enquanto roda
+    try:
+        etapas_consulta(banco_selecionado)
+    except Error as e:
+        st.error(f"Erro de banco de dados: {e}")
+
+def etapas_consulta(banco_selecionado):
+    """Etapas 2 a 9 do construtor para o banco selecionado"""
+    # ============ ETAPA 2: SELECIONAR TABELAS ============
+    st.header("2️⃣ Selecione as Tabelas")
+    
+    tabelas = listar_tabelas(banco_selecionado)
+    if not tabelas:
+        st.warning("Nenhuma tabela encontrada!")
+        return
+    
+    tabelas_selecionadas = st.multiselect(
+        "Tabelas para consulta:",
+        options=tabelas,
+        default=st.session_state.consulta_config.get('tabelas_selecionadas', []),
+        key="select_tabelas"
+    )
+    
+    st.session_state.consulta_config['tabelas_selecionadas'] = tabelas_selecionadas
+    
+    if tabelas_selecionadas:
+        # Mostra relacionamentos se houver múltiplas tabelas
+        if len(tabelas_selecionadas) > 1:
+            relacionamentos = obter_relacionamentos(banco_selecionado, tabelas_selecionadas)
+            if relacionamentos:
+                st.success("🔗 Relacionamentos encontrados:")
+                for rel in relacionamentos:
+                    st.write(f"{rel['tabela_origem']}.{rel['coluna_origem']} → {rel['tabela_destino']}.{rel['coluna_destino']}")
         
-        if tabelas_selecionadas:
-            # Mostra relacionamentos se houver múltiplas tabelas
-            if len(tabelas_selecionadas) > 1:
-                relacionamentos = obter_relacionamentos(conexao, tabelas_selecionadas)
-                if relacionamentos:
-                    st.success("🔗 Relacionamentos encontrados:")
-                    for rel in relacionamentos:
-                        st.write(f"{rel['tabela_origem']}.{rel['coluna_origem']} → {rel['tabela_destino']}.{rel['coluna_destino']}")
-            
-            # ============ ETAPA 3: DEFINIÇÃO DE JOINS ============
-            if len(tabelas_selecionadas) > 1:
-                st.header("3️⃣ Definir JOINs (Opcional)")
+        # ============ ETAPA 3: DEFINIÇÃO DE JOINS ============
+        if len(tabelas_selecionadas) > 1:
+            st.header("3️⃣ Definir JOINs (Opcional)")
+            
+            if st.checkbox("Configurar JOINs entre tabelas"):
+                joins = st.session_state.consulta_config.get('joins', [])
                 
-                if st.checkbox("Configurar JOINs entre tabelas"):
-                    joins = st.session_state.consulta_config.get('joins', [])
+                st.markdown("Configure como as tabelas se relacionam:")
+                
+                for i in range(len(tabelas_selecionadas) - 1):
+                    st.markdown(f"**JOIN {i+1}**")
+                    col1, col2, col3, col4, col5 = st.columns(5)
                     
-                    st.markdown("Configure como as tabelas se relacionam:")
+                    with col1:
+                        tabela1 = st.selectbox(
+                            f"Tabela A",
+                            tabelas_selecionadas,
+                            index=min(i, len(tabelas_selecionadas)-1),
+                            key=f"join_tab1_{i}"
+                        )
                     
-                    for i in range(len(tabelas_selecionadas) - 1):
-                        st.markdown(f"**JOIN {i+1}**")
-                        col1, col2, col3, col4, col5 = st.columns(5)
-                        
-                        with col1:
-                            tabela1 = st.selectbox(
-                                f"Tabela A",
-                                tabelas_selecionadas,
-                                index=min(i, len(tabelas_selecionadas)-1),
-                                key=f"join_tab1_{i}"
-                            )
-                        
-                        with col2:
-                            info1 = obter_colunas_tabela(conexao, tabela1)
-                            colunas1 = info1['colunas'] if info1 else []
-                            col_tab1 = st.selectbox(
-                                "Coluna A",
-                                colunas1,
-                                key=f"join_col1_{i}"
-                            )
-                        
-                        with col3:
-                            st.markdown("<div style='text-align: center; margin-top: 25px;'>→</div>", unsafe_allow_html=True)
-                        
-                        with col4:
-                            tabelas_disponiveis = [t for t in tabelas_selecionadas if t != tabela1]
-                            tabela2 = st.selectbox(
-                                f"Tabela B",
-                                tabelas_disponiveis,
-                                key=f"join_tab2_{i}"
-                            )
-                        
-                        with col5:
-                            info2 = obter_colunas_tabela(conexao, tabela2)
-                            colunas2 = info2['colunas'] if info2 else []
-                            col_tab2 = st.selectbox(
-                                "Coluna B",
-                                colunas2,
-                                key=f"join_col2_{i}"
-                            )
-                        
-                        tipo_join = st.selectbox(
-                            f"Tipo de JOIN",
-                            ["INNER JOIN", "LEFT JOIN", "RIGHT JOIN"],
-                            key=f"join_type_{i}"
+                    with col2:
+                        info1 = obter_colunas_tabela(banco_selecionado, tabela1)
+                        colunas1 = info1['colunas'] if info1 else []
+                        col_tab1 = st.selectbox(
+                            "Coluna A",
+                            colunas1,
+                            key=f"join_col1_{i}"
                         )
-                        
-                        if st.button(f"Adicionar JOIN {i+1}", key=f"btn_join_{i}"):
-                            novo_join = {
-                                'tabela1': tabela1,
-                                'coluna1': col_tab1,
-                                'tabela2': tabela2,
-                                'coluna2': col_tab2,
-                                'tipo': tipo_join
-                            }
-                            joins.append(novo_join)
-                            st.session_state.consulta_config['joins'] = joins
-                            st.success(f"JOIN {i+1} adicionado!")
-                            st.rerun()
                     
-                    # Mostra JOINs configurados
-                    if joins:
-                        st.subheader("JOINs Configurados:")
-                        for j, join in enumerate(joins):
-                            col1, col2 = st.columns([5, 1])
-                            with col1:
-                                st.write(f"`{join['tabela1']}.{join['coluna1']} = {join['tabela2']}.{join['coluna2']}` ({join['tipo']})")
-                            with col2:
-                                if st.button("❌", key=f"del_join_{j}"):
-                                    joins.pop(j)
-                                    st.session_state.consulta_config['joins'] = joins
-                                    st.rerun()
-            
-            # ============ ETAPA 4: SELECIONAR CAMPOS ============
-            st.header("4️⃣ Selecione os Campos")
-            
-            todas_colunas = []
-            colunas_por_tabela = {}
-            
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                st.subheader("Campos disponíveis:")
-                campos_selecionados_local = []
-                
-                for tabela in tabelas_selecionadas:
-                    with st.expander(f"📊 {tabela}", expanded=True):
-                        info_colunas = obter_colunas_tabela(conexao, tabela)
-                        if info_colunas:
-                            colunas_por_tabela[tabela] = info_colunas['colunas']
-                            
-                            for coluna in info_colunas['colunas']:
-                                chave = f"{tabela}.{coluna}"
-                                tipo = info_colunas['tipos'].get(coluna, '?')
-                                
-                                # Verifica se está selecionado no session_state
-                                is_selected = chave in st.session_state.consulta_config.get('campos_selecionados', [])
-                                
-                                # Checkbox com estado persistente
-                                if st.checkbox(f"{coluna} ({tipo})", 
-                                              value=is_selected,
-                                              key=f"campo_check_{chave}"):
-                                    campos_selecionados_local.append(chave)
-            
-            with col2:
-                st.subheader("Campos selecionados:")
-                
-                # Atualiza campos selecionados no session_state
-                st.session_state.consulta_config['campos_selecionados'] = campos_selecionados_local
-                
-                if campos_selecionados_local:
-                    # Multiselect para reordenar
-                    campos_ordenados = st.multiselect(
-                        "Arraste para reordenar:",
-                        options=campos_selecionados_local,
-                        default=campos_selecionados_local,
-                        key="reorder_campos"
-                    )
+                    with col3:
+                        st.markdown("<div style='text-align: center; margin-top: 25px;'>→</div>", unsafe_allow_html=True)
                     
-                    st.session_state.consulta_config['campos_selecionados'] = campos_ordenados
+                    with col4:
+                        tabelas_disponiveis = [t for t in tabelas_selecionadas if t != tabela1]
+                        tabela2 = st.selectbox(
+                            f"Tabela B",
+                            tabelas_disponiveis,
+                            key=f"join_tab2_{i}"
+                        )
                     
-                    st.write("**Ordem atual:**")
-                    for i, campo in enumerate(campos_ordenados, 1):
-                        st.write(f"{i}. {campo}")
-                else:
-                    st.info("Nenhum campo selecionado. Use '*' para todos os campos.")
-            
-            # ============ ETAPA 5: FUNÇÕES DE AGREGAÇÃO ============
-            if st.session_state.consulta_config['campos_selecionados']:
-                st.header("5️⃣ Funções de Agregação (Opcional)")
-                
-                if st.checkbox("Adicionar funções de agregação"):
-                    agregacoes = st.session_state.consulta_config.get('agregacoes', [])
+                    with col5:
+                        info2 = obter_colunas_tabela(banco_selecionado, tabela2)
+                        colunas2 = info2['colunas'] if info2 else []
+                        col_tab2 = st.selectbox(
+                            "Coluna B",
+                            colunas2,
+                            key=f"join_col2_{i}"
+                        )
                     
-                    st.markdown("**Selecione funções para os campos:**")
+                    tipo_join = st.selectbox(
+                        f"Tipo de JOIN",
+                        ["INNER JOIN", "LEFT JOIN", "RIGHT JOIN"],
+                        key=f"join_type_{i}"
+                    )
                     
-                    for campo in st.session_state.consulta_config['campos_selecionados']:
-                        col1, col2 = st.columns([3, 2])
-                        
+                    if st.button(f"Adicionar JOIN {i+1}", key=f"btn_join_{i}"):
+                        novo_join = {
+                            'tabela1': tabela1,
+                            'coluna1': col_tab1,
+                            'tabela2': tabela2,
+                            'coluna2': col_tab2,
+                            'tipo': tipo_join
+                        }
+                        joins.append(novo_join)
+                        st.session_state.consulta_config['joins'] = joins
+                        st.success(f"JOIN {i+1} adicionado!")
+                        st.rerun()
+                
+                # Mostra JOINs configurados
+                if joins:
+                    st.subheader("JOINs Configurados:")
+                    for j, join in enumerate(joins):
+                        col1, col2 = st.columns([5, 1])
                         with col1:
-                            st.write(f"`{campo}`")
-                        
+                            st.write(f"`{join['tabela1']}.{join['coluna1']} = {join['tabela2']}.{join['coluna2']}` ({join['tipo']})")
                         with col2:
-                            funcao = st.selectbox(
-                                "Função:",
-                                ["Nenhuma", "COUNT", "SUM", "AVG", "MIN", "MAX", "COUNT(DISTINCT)"],
-                                key=f"agg_select_{campo}"
-                            )
+                            if st.button("❌", key=f"del_join_{j}"):
+                                joins.pop(j)
+                                st.session_state.consulta_config['joins'] = joins
+                                st.rerun()
+        
+        # ============ ETAPA 4: SELECIONAR CAMPOS ============
+        st.header("4️⃣ Selecione os Campos")
+        
+        todas_colunas = []
+        colunas_por_tabela = {}
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.subheader("Campos disponíveis:")
+            campos_selecionados_local = []
+            
+            for tabela in tabelas_selecionadas:
+                with st.expander(f"📊 {tabela}", expanded=True):
+                    info_colunas = obter_colunas_tabela(banco_selecionado, tabela)
+                    if info_colunas:
+                        colunas_por_tabela[tabela] = info_colunas['colunas']
+                        
+                        for coluna in info_colunas['colunas']:
+                            chave = f"{tabela}.{coluna}"
+                            tipo = info_colunas['tipos'].get(coluna, '?')
                             
-                            if funcao != "Nenhuma":
-                                # Verifica se já existe agregação para este campo
-                                existe = any(agg['campo'] == campo for agg in agregacoes)
-                                
-                                if not existe:
-                                    agregacoes.append({
-                                        'campo': campo,
-                                        'funcao': funcao,
-                                        'alias': f"{funcao}_{campo.split('.')[-1]}"
-                                    })
-                    
-                    st.session_state.consulta_config['agregacoes'] = agregacoes
-                    
-                    if agregacoes:
-                        st.subheader("Agregações configuradas:")
-                        for agg in agregacoes:
-                            st.write(f"`{agg['funcao']}({agg['campo']}) AS {agg['alias']}`")
+                            # Verifica se está selecionado no session_state
+                            is_selected = chave in st.session_state.consulta_config.get('campos_selecionados', [])
+                            
+                            # Checkbox com estado persistente
+                            if st.checkbox(f"{coluna} ({tipo})", 
+                                          value=is_selected,
+                                          key=f"campo_check_{chave}"):
+                                campos_selecionados_local.append(chave)
+        
+        with col2:
+            st.subheader("Campos selecionados:")
             
-            # ============ ETAPA 6: CRITÉRIOS (WHERE) ============
-            st.header("6️⃣ Adicionar Critérios (Opcional)")
+            # Atualiza campos selecionados no session_state
+            st.session_state.consulta_config['campos_selecionados'] = campos_selecionados_local
             
-            if st.checkbox("Adicionar critérios WHERE"):
-                criterios = st.session_state.consulta_config.get('criterios', [])
-                
-                st.markdown("**Novo critério:**")
+            if campos_selecionados_local:
+                # Multiselect para reordenar
+                campos_ordenados = st.multiselect(
+                    "Arraste para reordenar:",
+                    options=campos_selecionados_local,
+                    default=campos_selecionados_local,
+                    key="reorder_campos"
+                )
                 
-                col1, col2, col3, col4 = st.columns([3, 2, 3, 1])
+                st.session_state.consulta_config['campos_selecionados'] = campos_ordenados
                 
-                with col1:
-                    # Lista de campos para critérios
-                    todos_campos_criterio = []
-                    for tabela, cols in colunas_por_tabela.items():
-                        for col in cols:
-                            todos_campos_criterio.append(f"{tabela}.{col}")
-                    
-                    campo_criterio = st.selectbox(
-                        "Campo:",
-                        options=todos_campos_criterio,
-                        key="campo_criterio"
-                    )
-                
-                with col2:
-                    operador = st.selectbox(
-                        "Operador:",
-                        options=["=", "!=", ">", "<", ">=", "<=", "LIKE", "IN", "NOT IN", "IS NULL", "IS NOT NULL"],
-                        key="operador_criterio"
-                    )
+                st.write("**Ordem atual:**")
+                for i, campo in enumerate(campos_ordenados, 1):
+                    st.write(f"{i}. {campo}")
+            else:
+                st.info("Nenhum campo selecionado. Use '*' para todos os campos.")
+        
+        # ============ ETAPA 5: FUNÇÕES DE AGREGAÇÃO ============
+        if st.session_state.consulta_config['campos_selecionados']:
+            st.header("5️⃣ Funções de Agregação (Opcional)")
+            
+            if st.checkbox("Adicionar funções de agregação"):
+                agregacoes = st.session_state.consulta_config.get('agregacoes', [])
                 
-                with col3:
-                    if operador not in ["IS NULL", "IS NOT NULL"]:
-                        valor_criterio = st.text_input("Valor:", key="valor_criterio")
-                    else:
-                        valor_criterio = ""
+                st.markdown("**Selecione funções para os campos:**")
                 
-                with col4:
-                    logica = st.selectbox(
-                        "Lógica:",
-                        options=["AND", "OR"],
-                        key="logica_criterio"
-                    )
+                for campo in st.session_state.consulta_config['campos_selecionados']:
+                    col1, col2 = st.columns([3, 2])
+                    
+                    with col1:
+                        st.write(f"`{campo}`")
+                    
+                    with col2:
+                        funcao = st.selectbox(
+                            "Função:",
+                            ["Nenhuma", "COUNT", "SUM", "AVG", "MIN", "MAX", "COUNT(DISTINCT)"],
+                            key=f"agg_select_{campo}"
+                        )
+                        
+                        if funcao != "Nenhuma":
+                            # Verifica se já existe agregação para este campo
+                            existe = any(agg['campo'] == campo for agg in agregacoes)
+                            
+                            if not existe:
+                                agregacoes.append({
+                                    'campo': campo,
+                                    'funcao': funcao,
+                                    'alias': f"{funcao}_{campo.split('.')[-1]}"
+                                })
                 
-                if st.button("➕ Adicionar Critério", key="add_criterio"):
-                    if operador in ["IS NULL", "IS NOT NULL"] or valor_criterio:
-                        novo_criterio = {
-                            'campo': campo_criterio,
-                            'operador': operador,
-                            'valor': valor_criterio if valor_criterio else None,
-                            'logica': logica
-                        }
-                        criterios.append(novo_criterio)
-                        st.session_state.consulta_config['criterios'] = criterios
-                        st.success("Critério adicionado!")
-                        st.rerun()
-                    else:
-                        st.warning("Por favor, insira um valor para o critério.")
+                st.session_state.consulta_config['agregacoes'] = agregacoes
                 
-                # Mostra critérios adicionados
-                if criterios:
-                    st.subheader("Critérios atuais:")
-                    for i, crit in enumerate(criterios):
-                        col1, col2, col3 = st.columns([4, 1, 1])
-                        with col1:
-                            valor_display = crit.get('valor', '') if crit.get('valor') else ''
-                            if crit['operador'] in ["IS NULL", "IS NOT NULL"]:
-                                st.code(f"{crit['campo']} {crit['operador']}")
-                            else:
-                                st.code(f"{crit['campo']} {crit['operador']} {valor_display}")
-                        with col2:
-                            if i > 0:
-                                st.write(f"({crit['logica']})")
-                        with col3:
-                            if st.button("❌", key=f"del_crit_{i}"):
-                                criterios.pop(i)
-                                st.session_state.consulta_config['criterios'] = criterios
-                                st.rerun()
+                if agregacoes:
+                    st.subheader("Agregações configuradas:")
+                    for agg in agregacoes:
+                        st.write(f"`{agg['funcao']}({agg['campo']}) AS {agg['alias']}`")
+        
+        # ============ ETAPA 6: CRITÉRIOS (WHERE) ============
+        st.header("6️⃣ Adicionar Critérios (Opcional)")
+        
+        if st.checkbox("Adicionar critérios WHERE"):
+            criterios = st.session_state.consulta_config.get('criterios', [])
             
-            # ============ ETAPA 7: ORDENAÇÃO (ORDER BY) ============
-            st.header("7️⃣ Ordenação (Opcional)")
+            st.markdown("**Novo critério:**")
             
-            if st.checkbox("Adicionar ordenação"):
-                ordenacao = st.session_state.consulta_config.get('ordenacao', [])
-                
-                st.markdown("**Nova ordenação:**")
+            col1, col2, col3, col4 = st.columns([3, 2, 3, 1])
+            
+            with col1:
+                # Lista de campos para critérios
+                todos_campos_criterio = []
+                for tabela, cols in colunas_por_tabela.items():
+                    for col in cols:
+                        todos_campos_criterio.append(f"{tabela}.{col}")
                 
-                col1, col2, col3 = st.columns([3, 1, 1])
+                campo_criterio = st.selectbox(
+                    "Campo:",
+                    options=todos_campos_criterio,
+                    key="campo_criterio"
+                )
+            
+            with col2:
+                operador = st.selectbox(
+                    "Operador:",
+                    options=["=", "!=", ">", "<", ">=", "<=", "LIKE", "IN", "NOT IN", "IS NULL", "IS NOT NULL"],
+                    key="operador_criterio"
+                )
+            
+            with col3:
+                if operador not in ["IS NULL", "IS NOT NULL"]:
+                    valor_criterio = st.text_input("Valor:", key="valor_criterio")
+                else:
+                    valor_criterio = ""
+            
+            with col4:
+                logica = st.selectbox(
+                    "Lógica:",
+                    options=["AND", "OR"],
+                    key="logica_criterio"
+                )
+            
+            if st.button("➕ Adicionar Critério", key="add_criterio"):
+                if operador in ["IS NULL", "IS NOT NULL"] or valor_criterio:
+                    novo_criterio = {
+                        'campo': campo_criterio,
+                        'operador': operador,
+                        'valor': valor_criterio if valor_criterio else None,
+                        'logica': logica
+                    }
+                    criterios.append(novo_criterio)
+                    st.session_state.consulta_config['criterios'] = criterios
+                    st.success("Critério adicionado!")
+                    st.rerun()
+                else:
+                    st.warning("Por favor, insira um valor para o critério.")
+            
+            # Mostra critérios adicionados
+            if criterios:
+                st.subheader("Critérios atuais:")
+                for i, crit in enumerate(criterios):
+                    col1, col2, col3 = st.columns([4, 1, 1])
+                    with col1:
+                        valor_display = crit.get('valor', '') if crit.get('valor') else ''
+                        if crit['operador'] in ["IS NULL", "IS NOT NULL"]:
+                            st.code(f"{crit['campo']} {crit['operador']}")
+                        else:
+                            st.code(f"{crit['campo']} {crit['operador']} {valor_display}")
+                    with col2:
+                        if i > 0:
+                            st.write(f"({crit['logica']})")
+                    with col3:
+                        if st.button("❌", key=f"del_crit_{i}"):
+                            criterios.pop(i)
+                            st.session_state.consulta_config['criterios'] = criterios
+                            st.rerun()
                 
-                with col1:
-                    campos_para_order = st.session_state.consulta_config['campos_selecionados'].copy()
-                    if not campos_para_order:
-                        campos_para_order = ["*"]
-                    
-                    campo_order = st.selectbox(
-                        "Campo para ordenar:",
-                        options=campos_para_order,
-                        key="campo_order"
-                    )
+                # Árvore AND/OR efetiva (AND tem precedência sobre OR)
+                where, _ = modelo_consulta.compilar_where(modelo_consulta.arvore_criterios(criterios))
+                st.caption(f"🌳 Agrupamento: `{where}`")
+        
+        # ============ ETAPA 7: ORDENAÇÃO (ORDER BY) ============
+        st.header("7️⃣ Ordenação (Opcional)")
+        
+        if st.checkbox("Adicionar ordenação"):
+            ordenacao = st.session_state.consulta_config.get('ordenacao', [])
+            
+            st.markdown("**Nova ordenação:**")
+            
+            col1, col2, col3 = st.columns([3, 1, 1])
+            
+            with col1:
+                campos_para_order = st.session_state.consulta_config['campos_selecionados'].copy()
+                if not campos_para_order:
+                    campos_para_order = ["*"]
                 
-                with col2:
-                    direcao = st.selectbox(
-                        "Direção:",
-                        options=["ASC", "DESC"],
-                        key="direcao_order"
-                    )
+                campo_order = st.selectbox(
+                    "Campo para ordenar:",
+                    options=campos_para_order,
+                    key="campo_order"
+                )
+            
+            with col2:
+                direcao = st.selectbox(
+                    "Direção:",
+                    options=["ASC", "DESC"],
+                    key="direcao_order"
+                )
+            
+            with col3:
+                st.write("")
+                st.write("")
+                if st.button("➕ Adicionar", key="add_order"):
+                    nova_ordenacao = {
+                        'campo': campo_order,
+                        'direcao': direcao
+                    }
+                    ordenacao.append(nova_ordenacao)
+                    st.session_state.consulta_config['ordenacao'] = ordenacao
+                    st.rerun()
+            
+            if ordenacao:
+                st.subheader("Ordenação atual:")
+                for i, order in enumerate(ordenacao):
+                    col1, col2 = st.columns([4, 1])
+                    with col1:
+                        st.write(f"{i+1}. `{order['campo']} {order['direcao']}`")
+                    with col2:
+                        if st.button("❌", key=f"del_order_{i}"):
+                            ordenacao.pop(i)
+                            st.session_state.consulta_config['ordenacao'] = ordenacao
+                            st.rerun()
+        
+        # ============ ETAPA 8: LIMITE ============
+        st.header("8️⃣ Limite de Linhas (Opcional)")
+        
+        limite = st.number_input(
+            "Número máximo de linhas:",
+            min_value=1,
+            max_value=10000,
+            value=st.session_state.consulta_config.get('limite', 100),
+            key="input_limite"
+        )
+        st.session_state.consulta_config['limite'] = limite
+        
+        # ============ ETAPA 9: GERAR E EXECUTAR SQL ============
+        st.header("9️⃣ Gerar e Executar Consulta")
+        
+        interrompida = st.session_state.pop('execucao_interrompida', None)
+        if interrompida:
+            st.warning("⏹️ Execução cancelada; a consulta foi interrompida no servidor.")
+        
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            if st.button("✨ Gerar Consulta SQL", type="primary", use_container_width=True):
+                # Obtém configuração atual
+                config = st.session_state.consulta_config
                 
-                with col3:
-                    st.write("")
-                    st.write("")
-                    if st.button("➕ Adicionar", key="add_order"):
-                        nova_ordenacao = {
-                            'campo': campo_order,
-                            'direcao': direcao
-                        }
-                        ordenacao.append(nova_ordenacao)
-                        st.session_state.consulta_config['ordenacao'] = ordenacao
-                        st.rerun()
+                # Gera SQL (valores dos critérios como parâmetros)
+                sql, params = modelo_consulta.compilar(modelo_consulta.de_config(config))
                 
-                if ordenacao:
-                    st.subheader("Ordenação atual:")
-                    for i, order in enumerate(ordenacao):
-                        col1, col2 = st.columns([4, 1])
-                        with col1:
-                            st.write(f"{i+1}. `{order['campo']} {order['direcao']}`")
-                        with col2:
-                            if st.button("❌", key=f"del_order_{i}"):
-                                ordenacao.pop(i)
-                                st.session_state.consulta_config['ordenacao'] = ordenacao
-                                st.rerun()
+                # Salva SQL no session_state
+                st.session_state.sql_gerado = sql
+                st.session_state.params_gerados = params
+                st.session_state.mostrar_sql = True
+        
+        with col2:
+            if st.button("🔄 Nova Consulta", use_container_width=True):
+                # Limpa configuração
+                for key in ['tabelas_selecionadas', 'campos_selecionados', 'criterios', 
+                           'ordenacao', 'joins', 'agregacoes']:
+                    st.session_state.consulta_config[key] = []
+                st.session_state.consulta_config['limite'] = 100
+                st.rerun()
+        
+                    # Mostra SQL gerado
+        if st.session_state.get('mostrar_sql', False) and st.session_state.get('sql_gerado'):
+            sql = st.session_state.sql_gerado
             
-            # ============ ETAPA 8: LIMITE ============
-            st.header("8️⃣ Limite de Linhas (Opcional)")
+            st.subheader("📝 Consulta SQL Gerada:")
             
-            limite = st.number_input(
-                "Número máximo de linhas:",
-                min_value=1,
-                max_value=10000,
-                value=st.session_state.consulta_config.get('limite', 100),
-                key="input_limite"
+            # EDITÁVEL: Text area para editar o SQL
+            sql_editavel = st.text_area(
+                "Edite o SQL se necessário:",
+                value=sql,
+                height=150,
+                key="sql_editavel"
             )
-            st.session_state.consulta_config['limite'] = limite
             
-            # ============ ETAPA 9: GERAR E EXECUTAR SQL ============
-            st.header("9️⃣ Gerar e Executar Consulta")
+            # Atualiza o SQL se foi editado
+            if sql_editavel != sql:
+                st.session_state.sql_gerado = sql_editavel
+                sql = sql_editavel
+                st.info("✅ SQL atualizado com as tuas edições!")
+            
+            # Cada %s fora de aspas recebe um parâmetro, na ordem; SQL editado sem marcadores roda sem parâmetros
+            params = st.session_state.get('params_gerados', [])
+            marcadores = contar_marcadores(sql)
+            sql_invalido = False
+            if marcadores == 0:
+                params = None
+            elif marcadores != len(params):
+                st.error(f"❌ O SQL tem {marcadores} marcador(es) %s, mas há {len(params)} parâmetro(s). "
+                         "Use 🔄 Restaurar Original ou escreva os valores direto no SQL.")
+                sql_invalido = True
+            else:
+                st.caption("🔒 Parâmetros (enviados separados do SQL): " +
+                           ", ".join(f"`{i}: {valor!r}`" for i, valor in enumerate(params, 1)))
+            # Texto com os valores escapados para EXPLAIN, cache, exportação e tarefas
+            sql_texto = sql if sql_invalido else sql_com_valores(sql, params)
             
-            col1, col2 = st.columns(2)
+            # Botões de ação
+            col1, col2, col3 = st.columns(3)
             
             with col1:
-                if st.button("✨ Gerar Consulta SQL", type="primary", use_container_width=True):
-                    # Obtém configuração atual
-                    config = st.session_state.consulta_config
-                    
-                    # Gera SQL
-                    sql = gerar_consulta_sql(
-                        tabelas_selecionadas=config['tabelas_selecionadas'],
-                        campos_selecionados=config['campos_selecionados'],
-                        criterios=config.get('criterios', []),
-                        ordenacao=config.get('ordenacao', []),
-                        limite=config.get('limite'),
-                        joins=config.get('joins', []),
-                        agregacoes=config.get('agregacoes', [])
-                    )
-                    
-                    # Salva SQL no session_state
-                    st.session_state.sql_gerado = sql
-                    st.session_state.mostrar_sql = True
+                if st.button("📋 Copiar SQL", use_container_width=True):
+                    st.code(sql_texto, language="sql")
+                    st.toast("SQL copiado para a área de transferência!", icon="✅")
             
             with col2:
-                if st.button("🔄 Nova Consulta", use_container_width=True):
-                    # Limpa configuração
-                    for key in ['tabelas_selecionadas', 'campos_selecionados', 'criterios', 
-                               'ordenacao', 'joins', 'agregacoes']:
-                        st.session_state.consulta_config[key] = []
-                    st.session_state.consulta_config['limite'] = 100
+                if st.button("💾 Salvar SQL", use_container_width=True):
+                    st.session_state.sql_salvo = sql_texto
+                    st.toast("SQL guardado no sistema!", icon="💾")
+            
+            with col3:
+                if st.button("🔄 Restaurar Original", use_container_width=True):
+                    # Gera SQL original novamente
+                    config = st.session_state.consulta_config
+                    sql_original, params_originais = modelo_consulta.compilar(modelo_consulta.de_config(config))
+                    st.session_state.sql_gerado = sql_original
+                    st.session_state.params_gerados = params_originais
                     st.rerun()
             
-                        # Mostra SQL gerado
-            if st.session_state.get('mostrar_sql', False) and st.session_state.get('sql_gerado'):
-                sql = st.session_state.sql_gerado
+            # Separador
+            st.divider()
+            # Adiciona validação de SQL antes de executar
+            def validar_sql_basico(sql):
+                """Validação básica de SQL"""
+                sql_upper = sql.upper().strip()
                 
-                st.subheader("📝 Consulta SQL Gerada:")
-                
-                # EDITÁVEL: Text area para editar o SQL
-                sql_editavel = st.text_area(
-                    "Edite o SQL se necessário:",
-                    value=sql,
-                    height=150,
-                    key="sql_editavel"
-                )
+                # Verifica se começa com SELECT
+                if not sql_upper.startswith("SELECT"):
+                    return False, "SQL deve começar com SELECT"
                 
-                # Atualiza o SQL se foi editado
-                if sql_editavel != sql:
-                    st.session_state.sql_gerado = sql_editavel
-                    sql = sql_editavel
-                    st.info("✅ SQL atualizado com as tuas edições!")
+                # Verifica se tem FROM
+                if "FROM" not in sql_upper:
+                    return False, "SQL deve conter cláusula FROM"
                 
-                # Botões de ação
-                col1, col2, col3 = st.columns(3)
+                # Verifica por palavras perigosas (em ambiente de produção)
+                palavras_perigosas = ["DROP", "DELETE", "TRUNCATE", "INSERT", "UPDATE"]
+                for palavra in palavras_perigosas:
+                    if palavra in sql_upper and f"COMMENT" not in sql_upper:
+                        return False, f"Operação {palavra} não permitida"
                 
-                with col1:
-                    if st.button("📋 Copiar SQL", use_container_width=True):
-                        st.code(sql, language="sql")
-                        st.toast("SQL copiado para a área de transferência!", icon="✅")
-                
-                with col2:
-                    if st.button("💾 Salvar SQL", use_container_width=True):
-                        st.session_state.sql_salvo = sql
-                        st.toast("SQL guardado no sistema!", icon="💾")
-                
-                with col3:
-                    if st.button("🔄 Restaurar Original", use_container_width=True):
-                        # Gera SQL original novamente
-                        config = st.session_state.consulta_config
-                        sql_original = gerar_consulta_sql(
-                            tabelas_selecionadas=config['tabelas_selecionadas'],
-                            campos_selecionados=config['campos_selecionados'],
-                            criterios=config.get('criterios', []),
-                            ordenacao=config.get('ordenacao', []),
-                            limite=config.get('limite'),
-                            joins=config.get('joins', []),
-                            agregacoes=config.get('agregacoes', [])
-                        )
-                        st.session_state.sql_gerado = sql_original
-                        st.rerun()
-                
-                # Separador
-                st.divider()
-                # Adiciona validação de SQL antes de executar
-                def validar_sql_basico(sql):
-                    """Validação básica de SQL"""
-                    sql_upper = sql.upper().strip()
-                    
-                    # Verifica se começa com SELECT
-                    if not sql_upper.startswith("SELECT"):
-                        return False, "SQL deve começar com SELECT"
-                    
-                    # Verifica se tem FROM
-                    if "FROM" not in sql_upper:
-                        return False, "SQL deve conter cláusula FROM"
-                    
-                    # Verifica por palavras perigosas (em ambiente de produção)
-                    palavras_perigosas = ["DROP", "DELETE", "TRUNCATE", "INSERT", "UPDATE"]
-                    for palavra in palavras_perigosas:
-                        if palavra in sql_upper and f"COMMENT" not in sql_upper:
-                            return False, f"Operação {palavra} não permitida"
-                    
-                    return True, "SQL válido"
+                return True, "SQL válido"
 
-                    # Uso:
-                    if st.button("Validar SQL"):
-                        valido, mensagem = validar_sql_basico(sql)
-                        if valido:
-                            st.success("✅ " + mensagem)
+                # Uso:
+                if st.button("Validar SQL"):
+                    valido, mensagem = validar_sql_basico(sql)
+                    if valido:
+                        st.success("✅ " + mensagem)
+                    else:
+                        st.error("❌ " + mensagem)                
+            
+            # Plano de execução da consulta gerada
+            col_plano1, col_plano2 = st.columns([1, 2])
+            with col_plano1:
+                ver_plano = st.button("🧭 Plano de execução", use_container_width=True, key="builder_plano")
+            with col_plano2:
+                plano_analyze = st.checkbox("EXPLAIN ANALYZE (executa a consulta)", key="builder_plano_analyze")
+            if ver_plano:
+                plano_execucao.exibir_plano(banco_selecionado, sql_texto, plano_analyze)
+            
+            # Assistente de índices (fica aberto entre reruns para os botões de teste)
+            if st.button("🧠 Sugerir índices", key="builder_sugerir_indices"):
+                st.session_state.assistente_indices_aberto = not st.session_state.get('assistente_indices_aberto')
+            if st.session_state.get('assistente_indices_aberto'):
+                with st.expander("🧠 Assistente de índices", expanded=True):
+                    assistente_indices.exibir_assistente(banco_selecionado, st.session_state.consulta_config, sql_texto)
+            
+            # Executa consulta
+            usar_cache = st.checkbox("⚡ Usar cache de resultados", value=True, key="builder_usar_cache")
+            segundo_plano = st.checkbox("🧵 Executar em segundo plano", key="builder_segundo_plano")
+            executar_sql = st.button("▶️ Executar Consulta SQL", type="primary", use_container_width=True,
+                                     disabled=sql_invalido)
+            if executar_sql and segundo_plano:
+                tarefa = tarefas.submeter_da_sessao("builder", sql_texto, banco_selecionado, usar_cache=usar_cache)
+                st.toast(f"🧵 Tarefa {tarefa.id} enviada; continue montando a próxima consulta")
+            elif executar_sql:
+                controle = None
+                try:
+                    df, guardado_em, marcadores = None, None, None
+                    leitor = None
+                    # Conexão emprestada só durante a consulta ao cache e a execução
+                    with obter_conexao(banco_selecionado) as conexao:
+                        if usar_cache:
+                            df, guardado_em, marcadores = cache_resultados.buscar(conexao, banco_selecionado, sql_texto)
+                    
+                        st.subheader("📊 Resultados:")
+                        if df is not None:
+                            st.dataframe(df, use_container_width=True)
+                            st.caption(f"⚡ Resultado do cache (guardado às "
+                                       f"{datetime.fromtimestamp(guardado_em).strftime('%H:%M:%S')})")
                         else:
-                            st.error("❌ " + mensagem)                
-                
-                # Executa consulta
-                if st.button("▶️ Executar Consulta SQL", type="primary", use_container_width=True):
-                    try:
-                        cursor = conexao.cursor(dictionary=True)
-                        cursor.execute(sql)
-                        resultados = cursor.fetchall()
-                        cursor.close()
+                            # Cursor preparado por forma da instrução: mudar só os valores não refaz parse/plano
+                            cursor, sql_preparado = cursor_preparado(conexao, sql)
+                            botao_cancelar = st.empty()
+                            botao_cancelar.button("⏹️ Cancelar execução", key="builder_cancelar_execucao")
+                            with ExecucaoControlada(conexao, sql_preparado, banco_selecionado, TIMEOUT_PADRAO,
+                                                    origem="builder", texto=sql_texto) as controle:
+                                controle.executar(cursor, params)
+                                # Primeiro bloco aparece logo; o restante é acrescentado em seguida
+                                df, leitor = exibir_streaming(conexao, cursor)
+                                controle.linhas, controle.bytes = leitor.linhas, leitor.bytes
+                            botao_cancelar.empty()
+                            if leitor.truncado:
+                                # Leitura interrompida com KILL: não reaproveita este cursor
+                                descartar_preparado(conexao, sql)
+                            else:
+                                cache_resultados.guardar(banco_selecionado, sql_texto, df, marcadores)
+                    
+                    if not df.empty:
                         
-                        if resultados:
-                            df = pd.DataFrame(resultados)
-                            st.subheader("📊 Resultados:")
-                            st.dataframe(df, use_container_width=True)
-                            
-                            # Estatísticas
-                            col1, col2, col3, col4 = st.columns(4)
-                            with col1:
-                                st.metric("Linhas", len(df))
-                            with col2:
-                                st.metric("Colunas", len(df.columns))
-                            with col3:
-                                tamanho_kb = df.memory_usage().sum() / 1024
-                                st.metric("Tamanho", f"{tamanho_kb:.1f} KB")
-                            with col4:
-                                st.metric("Tipo", "SELECT")
-                            
-                            # Opções para exportar
-                            st.subheader("📤 Exportar Resultados:")
-                            col_exp1, col_exp2, col_exp3 = st.columns(3)
-                            
-                            with col_exp1:
-                                csv = df.to_csv(index=False).encode('utf-8')
-                                st.download_button(
-                                    label="📥 Download CSV",
-                                    data=csv,
-                                    file_name=f"consulta_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
-                                    mime="text/csv",
-                                    use_container_width=True
-                                )
-                            
-                            with col_exp2:
-                                # Exportar para Excel
-                                import io
-                                from openpyxl import Workbook
-                                
-                                output = io.BytesIO()
-                                with pd.ExcelWriter(output, engine='openpyxl') as writer:
-                                    df.to_excel(writer, index=False, sheet_name='Consulta')
+                        # Estatísticas
+                        col1, col2, col3, col4 = st.columns(4)
+                        with col1:
+                            st.metric("Linhas", len(df))
+                        with col2:
+                            st.metric("Colunas", len(df.columns))
+                        with col3:
+                            tamanho_kb = df.memory_usage().sum() / 1024
+                            st.metric("Tamanho", f"{tamanho_kb:.1f} KB")
+                        with col4:
+                            st.metric("Tipo", "SELECT")
+                        
+                        # Opções para exportar
+                        # Exportação: painel "Exportar último resultado", gerado em blocos direto do servidor
+                        st.caption("📤 Para baixar, use o painel de exportação abaixo.")
+                        exportacao.registrar_resultado(
+                            "builder",
+                            exportacao.fonte_sql(banco_selecionado, sql_texto, None if leitor and leitor.truncado else len(df), df),
+                            f"consulta_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+                            exportacao.id_resultado(banco_selecionado, sql_texto, marcadores)
+                        )
+                        
+                        # Salvar consulta como template
+                        st.subheader("💾 Salvar Consulta:")
+                        nome_template = st.text_input("Nome do template:", key="nome_template")
+                        
+                        if st.button("💾 Salvar como Template", key="salvar_template_btn"):
+                            if nome_template:
+                                if 'templates' not in st.session_state:
+                                    st.session_state.templates = {}
                                 
-                                st.download_button(
-                                    label="📊 Download Excel",
-                                    data=output.getvalue(),
-                                    file_name=f"consulta_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx",
-                                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                    use_container_width=True
-                                )
-                            
-                            with col_exp3:
-                                json_str = df.to_json(orient='records', indent=2)
-                                st.download_button(
-                                    label="📄 Download JSON",
-                                    data=json_str,
-                                    file_name=f"consulta_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                                    mime="application/json",
-                                    use_container_width=True
-                                )
-                            
-                            # Salvar consulta como template
-                            st.subheader("💾 Salvar Consulta:")
-                            nome_template = st.text_input("Nome do template:", key="nome_template")
-                            
-                            if st.button("💾 Salvar como Template", key="salvar_template_btn"):
-                                if nome_template:
-                                    if 'templates' not in st.session_state:
-                                        st.session_state.templates = {}
-                                    
-                                    st.session_state.templates[nome_template] = {
-                                        'sql': sql,
-                                        'config': st.session_state.consulta_config.copy(),
-                                        'data': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                                    }
-                                    st.success(f"Template '{nome_template}' salvo!")
-                                else:
-                                    st.warning("Por favor, insira um nome para o template.")
-                            
-                            # Carregar templates
-                            if st.session_state.get('templates'):
-                                st.subheader("📂 Templates Salvos:")
-                                for nome, template in st.session_state.templates.items():
-                                    col_t1, col_t2, col_t3 = st.columns([3, 1, 1])
-                                    with col_t1:
-                                        st.write(f"**{nome}** ({template['data']})")
-                                    with col_t2:
-                                        if st.button("Carregar", key=f"load_{nome}"):
-                                            st.session_state.consulta_config = template['config']
-                                            # Re-gera SQL com a configuração carregada
-                                            sql_recarregado = gerar_consulta_sql(
-                                                tabelas_selecionadas=template['config']['tabelas_selecionadas'],
-                                                campos_selecionados=template['config']['campos_selecionados'],
-                                                criterios=template['config'].get('criterios', []),
-                                                ordenacao=template['config'].get('ordenacao', []),
-                                                limite=template['config'].get('limite'),
-                                                joins=template['config'].get('joins', []),
-                                                agregacoes=template['config'].get('agregacoes', [])
-                                            )
-                                            st.session_state.sql_gerado = sql_recarregado
-                                            st.session_state.mostrar_sql = True
-                                            st.rerun()
-                                    with col_t3:
-                                        if st.button("🗑️", key=f"del_{nome}"):
-                                            del st.session_state.templates[nome]
-                                            st.rerun()
+                                st.session_state.templates[nome_template] = {
+                                    'sql': sql_texto,
+                                    'config': st.session_state.consulta_config.copy(),
+                                    'data': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+                                }
+                                st.success(f"Template '{nome_template}' salvo!")
+                            else:
+                                st.warning("Por favor, insira um nome para o template.")
                         
-                        else:
-                            st.info("✅ Consulta executada com sucesso, mas sem resultados.")
-                            
-                    except Error as e:
+                        # Carregar templates
+                        if st.session_state.get('templates'):
+                            st.subheader("📂 Templates Salvos:")
+                            for nome, template in st.session_state.templates.items():
+                                col_t1, col_t2, col_t3 = st.columns([3, 1, 1])
+                                with col_t1:
+                                    st.write(f"**{nome}** ({template['data']})")
+                                with col_t2:
+                                    if st.button("Carregar", key=f"load_{nome}"):
+                                        st.session_state.consulta_config = template['config']
+                                        # Re-gera SQL com a configuração carregada
+                                        sql_recarregado, params_recarregados = modelo_consulta.compilar(modelo_consulta.de_config(template['config']))
+                                        st.session_state.sql_gerado = sql_recarregado
+                                        st.session_state.params_gerados = params_recarregados
+                                        st.session_state.mostrar_sql = True
+                                        st.rerun()
+                                with col_t3:
+                                    if st.button("🗑️", key=f"del_{nome}"):
+                                        del st.session_state.templates[nome]
+                                        st.rerun()
+                    
+                    else:
+                        st.info("✅ Consulta executada com sucesso, mas sem resultados.")
+                        
+                except Error as e:
+                    mensagem = controle.mensagem_erro(e) if controle else None
+                    if mensagem:
+                        st.error(mensagem)
+                    else:
                         st.error(f"❌ Erro ao executar consulta: {e}")
-                        st.error(f"SQL problemático: ```{sql}```")
+                        st.error(f"SQL problemático: ```{sql_texto}```")
+            
+            if st.session_state.get("exportacao_builder"):
+                st.markdown("**📤 Exportar último resultado** (gerado só quando pedido)")
+                exportacao.exibir_exportacao("builder")
+            
+            if tarefas.ids_da_sessao("builder"):
+                st.subheader("🧵 Execuções em segundo plano")
+                tarefas.exibir_tarefas("builder")
 
 # ============ EXECUÇÃO PRINCIPAL ============
 if __name__ == "__main__":
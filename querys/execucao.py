@@ -0,0 +1,321 @@
+# execucao.py - Execução de consultas com leitura em blocos (streaming)
+import threading
+import time
+import uuid
+
+import streamlit as st
+import pandas as pd
+from mysql.connector import Error
+
+from conexao_pool import criar_conexao
+from cache_resultados import normalizar_sql
+import historico
+
+# ============ CONFIGURAÇÃO ============
+TAMANHO_CHUNK = 5000              # linhas por fetchmany
+MAX_LINHAS = 200_000              # limite rígido de linhas mantidas na sessão
+MAX_BYTES = 200 * 1024 * 1024     # limite rígido (estimado) de bytes mantidos
+TIMEOUT_PADRAO = 60               # segundos por execução (0 = sem limite)
+INTERVALO_VERIFICACAO = 0.25      # segundos entre verificações da thread de execução
+
+
+# ============ CANCELAMENTO ============
+def cancelar_consulta(id_conexao):
+    """Interrompe a consulta em andamento de outra conexão (KILL QUERY)
+
+    Usa uma conexão de controle própria, fora do pool: é justamente quando as
+    consultas descontroladas esgotam o pool que o cancelamento é necessário.
+    """
+    controle = criar_conexao()
+    try:
+        cursor = controle.cursor()
+        cursor.execute(f"KILL QUERY {int(id_conexao)}")
+        cursor.close()
+    finally:
+        controle.close()
+
+
+# Consultas em execução neste processo: id da conexão -> informações (inclui a sessão dona)
+_em_andamento = {}
+_lock_andamento = threading.Lock()
+
+
+def _sessao_atual():
+    """Identificador da sessão do navegador, guardado no session_state"""
+    if 'id_sessao_execucao' not in st.session_state:
+        st.session_state['id_sessao_execucao'] = uuid.uuid4().hex
+    return st.session_state['id_sessao_execucao']
+
+
+def listar_em_andamento():
+    """Consultas em execução pela sessão atual (as de outras sessões não aparecem)"""
+    sessao = _sessao_atual()
+    with _lock_andamento:
+        return [dict(info, id_conexao=id_conexao) for id_conexao, info in _em_andamento.items()
+                if info['sessao'] == sessao]
+
+
+def cancelar_da_sessao(id_conexao):
+    """KILL QUERY só se a consulta pertence à sessão atual; retorna False caso contrário"""
+    with _lock_andamento:
+        info = _em_andamento.get(id_conexao)
+        if info is None or info['sessao'] != _sessao_atual():
+            return False
+    cancelar_consulta(id_conexao)
+    return True
+
+
+def eh_select(sql):
+    return normalizar_sql(sql).upper().startswith("SELECT")
+
+
+class ExecucaoControlada:
+    """Execução com tempo limite e cancelamento via KILL QUERY
+
+    Use em volta de toda a execução, inclusive a leitura em blocos. SELECTs
+    recebem MAX_EXECUTION_TIME no servidor; um vigia (thread) interrompe qualquer
+    instrução que passe do limite. Se o bloco for abandonado porque o script do
+    Streamlit foi interrompido (botão Cancelar, nova execução, aba fechada), a
+    consulta é interrompida no servidor.
+
+    Com `origem`, a execução é gravada no histórico ao sair do bloco; preencha
+    `linhas`/`bytes` dentro dele e marque `do_cache` quando o servidor não foi usado.
+    """
+
+    def __init__(self, conexao, sql, banco=None, timeout=TIMEOUT_PADRAO, origem=None, texto=None):
+        self.conexao = conexao
+        self.sql = sql
+        self.banco = banco
+        self.timeout = timeout or None
+        self.origem = origem
+        self.texto = texto or sql     # SQL gravado no histórico (ex.: com os valores dos parâmetros)
+        self.id_conexao = conexao.connection_id
+        self.tempo_esgotado = False
+        self.inicio = None
+        self.linhas = None
+        self.bytes = None
+        self.do_cache = False
+        self._vigia = None
+        self._limite_select = False
+
+    def __enter__(self):
+        self.inicio = time.monotonic()
+        if self.timeout and eh_select(self.sql):
+            try:
+                cursor = self.conexao.cursor()
+                cursor.execute(f"SET SESSION MAX_EXECUTION_TIME = {int(self.timeout * 1000)}")
+                cursor.close()
+                self._limite_select = True
+            except Error:
+                pass
+        if self.timeout:
+            # Para SELECTs o servidor já aplica o limite; o vigia fica de reserva
+            folga = 1 if self._limite_select else 0
+            self._vigia = threading.Timer(self.timeout + folga, self._esgotar)
+            self._vigia.daemon = True
+            self._vigia.start()
+        sessao = _sessao_atual()
+        with _lock_andamento:
+            _em_andamento[self.id_conexao] = {
+                'sessao': sessao,
+                'sql': self.sql,
+                'banco': self.banco,
+                'inicio': time.time()
+            }
+        return self
+
+    def _esgotar(self):
+        self.tempo_esgotado = True
+        self._interromper()
+
+    def _interromper(self):
+        try:
+            cancelar_consulta(self.id_conexao)
+        except Error:
+            pass
+
+    def executar(self, cursor, params=None):
+        """cursor.execute numa thread auxiliar, com a thread do script livre para ser interrompida"""
+        erros = []
+
+        def alvo():
+            try:
+                cursor.execute(self.sql, params)
+            except Exception as e:
+                erros.append(e)
+
+        trabalho = threading.Thread(target=alvo, name=f"execucao_{self.id_conexao}", daemon=True)
+        trabalho.start()
+        aviso = st.empty()
+        try:
+            while True:
+                trabalho.join(INTERVALO_VERIFICACAO)
+                if not trabalho.is_alive():
+                    break
+                # Cada atualização da tela é um ponto em que o Streamlit pode parar o script
+                aviso.caption(f"⏳ Executando há {time.monotonic() - self.inicio:.1f}s...")
+        except BaseException:
+            # Script interrompido: para a consulta e espera a conexão ficar livre
+            self._interromper()
+            trabalho.join(10)
+            raise
+        aviso.empty()
+        if erros:
+            raise erros[0]
+
+    def mensagem_erro(self, erro):
+        """Mensagem amigável quando o erro veio do tempo limite"""
+        if self.tempo_esgotado or getattr(erro, 'errno', None) == 3024:
+            return f"⏱️ Tempo limite de {self.timeout:.0f}s excedido; a consulta foi interrompida no servidor."
+        return None
+
+    def __exit__(self, tipo, exc, tb):
+        if self._vigia:
+            self._vigia.cancel()
+        if self.origem and not self.do_cache:
+            if tipo is None:
+                erro = None
+            elif issubclass(tipo, Error):
+                erro = self.mensagem_erro(exc) or exc
+            else:
+                erro = historico.INTERROMPIDA
+            historico.registrar(self.origem, self.banco, self.texto, time.monotonic() - self.inicio,
+                                self.linhas, self.bytes, erro)
+        with _lock_andamento:
+            _em_andamento.pop(self.id_conexao, None)
+        if tipo is not None and not issubclass(tipo, Error):
+            # Cancelar/rerun/aba fechada durante a execução ou a leitura dos blocos
+            self._interromper()
+            st.session_state['execucao_interrompida'] = self.sql
+        if self._limite_select:
+            try:
+                cursor = self.conexao.cursor()
+                cursor.execute("SET SESSION MAX_EXECUTION_TIME = DEFAULT")
+                cursor.close()
+            except Error:
+                # Resultado ainda pendente: o pool descarta esta conexão
+                pass
+        return False
+
+
+def exibir_em_andamento():
+    """Lista as consultas em execução nesta sessão, com botão para interromper cada uma"""
+    consultas = listar_em_andamento()
+    if not consultas:
+        st.caption("Nenhuma consulta em execução.")
+        return
+    for info in consultas:
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            decorrido = time.time() - info['inicio']
+            st.code(f"[{info['banco'] or '-'}] #{info['id_conexao']} • {decorrido:.0f}s\n{info['sql'][:300]}",
+                    language="sql")
+        with col2:
+            if st.button("⏹️ KILL", key=f"kill_{info['id_conexao']}"):
+                try:
+                    if cancelar_da_sessao(info['id_conexao']):
+                        st.toast(f"KILL QUERY enviado para #{info['id_conexao']}", icon="⏹️")
+                    else:
+                        st.caption("A consulta já terminou.")
+                except Error as e:
+                    st.error(f"❌ Erro ao cancelar: {e}")
+
+
+# ============ LEITURA EM BLOCOS ============
+def estimar_bytes(linhas):
+    """Estimativa barata do tamanho em memória de um bloco de linhas"""
+    total = 0
+    for linha in linhas:
+        for valor in linha:
+            if isinstance(valor, (str, bytes, bytearray)):
+                total += len(valor)
+            else:
+                total += 8
+    return total
+
+
+class LeitorStreaming:
+    """Lê o resultado de um cursor não-bufferizado em DataFrames de até tamanho_chunk linhas
+
+    Para ao atingir max_linhas ou max_bytes; nesse caso `truncado` fica True e o
+    restante do resultado é interrompido no servidor e descartado.
+    """
+
+    def __init__(self, conexao, cursor, tamanho_chunk=TAMANHO_CHUNK, max_linhas=MAX_LINHAS, max_bytes=MAX_BYTES):
+        self.conexao = conexao
+        self.cursor = cursor
+        self.tamanho_chunk = tamanho_chunk
+        self.max_linhas = max_linhas
+        self.max_bytes = max_bytes
+        self.colunas = [desc[0] for desc in cursor.description] if cursor.description else []
+        self.linhas = 0
+        self.bytes = 0
+        self.truncado = False
+
+    def __iter__(self):
+        while True:
+            restante = self.max_linhas - self.linhas
+            linhas = self.cursor.fetchmany(min(self.tamanho_chunk, restante))
+            if not linhas:
+                break
+            self.linhas += len(linhas)
+            self.bytes += estimar_bytes(linhas)
+            yield pd.DataFrame(linhas, columns=self.colunas)
+
+            if self.linhas >= self.max_linhas or self.bytes >= self.max_bytes:
+                self.truncado = self._descartar_restante()
+                break
+
+    def _descartar_restante(self):
+        """Interrompe o envio do resto do resultado; retorna True se havia mais linhas"""
+        linha = self.cursor.fetchone()
+        if linha is None:
+            return False
+        try:
+            cancelar_consulta(self.conexao.connection_id)
+        except Error:
+            pass
+        # O servidor responde ao KILL com erro no meio do resultado: consome até lá
+        try:
+            while self.cursor.fetchmany(self.tamanho_chunk):
+                pass
+        except Error:
+            pass
+        return True
+
+    def dataframe(self):
+        """Lê todo o resultado (respeitando os limites) num único DataFrame"""
+        partes = list(self)
+        if not partes:
+            return pd.DataFrame(columns=self.colunas)
+        return pd.concat(partes, ignore_index=True)
+
+
+def exibir_streaming(conexao, cursor, tamanho_chunk=TAMANHO_CHUNK, max_linhas=MAX_LINHAS, max_bytes=MAX_BYTES):
+    """Mostra o primeiro bloco imediatamente e acrescenta os seguintes à tabela
+
+    Retorna (DataFrame completo, leitor) para estatísticas e exportação.
+    """
+    leitor = LeitorStreaming(conexao, cursor, tamanho_chunk, max_linhas, max_bytes)
+    progresso = st.empty()
+    tabela = None
+    partes = []
+
+    for chunk in leitor:
+        partes.append(chunk)
+        if tabela is None:
+            tabela = st.dataframe(chunk, use_container_width=True)
+        else:
+            tabela.add_rows(chunk)
+        progresso.caption(f"⏳ {leitor.linhas:,} linha(s) carregada(s)...")
+
+    progresso.empty()
+    if leitor.truncado:
+        st.warning(
+            f"⚠️ Resultado truncado em {leitor.linhas:,} linhas "
+            f"(~{leitor.bytes / 1024 / 1024:.1f} MB). Refine a consulta ou use LIMIT."
+        )
+
+    if not partes:
+        return pd.DataFrame(columns=leitor.colunas), leitor
+    return pd.concat(partes, ignore_index=True), leitor
@@ -0,0 +1,700 @@
+# exportacao.py - Exportação de resultados em blocos, direto do cursor para arquivo temporário
+import csv
+import datetime
+import decimal
+import gzip
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import streamlit as st
+from mysql.connector import Error
+from mysql.connector.constants import FieldType, FieldFlag
+from openpyxl import Workbook
+from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+try:
+    # Opcional: formatos colunares (Parquet e Arrow IPC)
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+try:
+    # Opcional: codificador JSON em C, bem mais rápido que o json da stdlib
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    # Opcional: zstd comprime mais rápido que gzip com taxa parecida
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from conexao_pool import obter_conexao, identificador_servidor
+from cache_resultados import normalizar_sql
+from execucao import ExecucaoControlada, eh_select, estimar_bytes
+
+# ============ CONFIGURAÇÃO ============
+TAMANHO_LOTE = 10_000                  # linhas por fetchmany durante a exportação
+VALIDADE_ARQUIVOS = 3600               # segundos até um arquivo exportado ser apagado
+DIRETORIO_EXPORTACOES = os.path.join(tempfile.gettempdir(), "query_builder_exportacoes")
+MAX_LINHAS_PLANILHA = 1_048_576        # limite do Excel por planilha (inclui o cabeçalho)
+MAX_ARQUIVOS_GUARDADOS = 64            # arquivos prontos lembrados entre reruns e sessões
+TAMANHO_AMOSTRA = 1_000                # linhas usadas para estimar o tamanho de cada formato
+NIVEL_GZIP = 6
+NIVEL_ZSTD = 3
+TIMEOUT_EXPORTACAO = 600               # segundos para reexecutar e ler o resultado inteiro (0 = sem limite)
+
+# Streamlit >= 1.52 aceita `data` como função, chamada só quando o botão de download é clicado
+_DOWNLOAD_SOB_DEMANDA = tuple(int(p) for p in st.__version__.split(".")[:2]) >= (1, 52)
+
+
+# ============ FONTES ============
+def fonte_sql(banco, sql, linhas=None, amostra=None):
+    """Exporta executando a consulta de novo (resultado completo, sem passar por DataFrame)
+
+    `linhas` é o total esperado, quando conhecido, para a barra de progresso.
+    `amostra` (DataFrame já exibido) serve para estimar o tamanho dos arquivos.
+    Só SELECTs são reexecutados: para outras instruções que retornam linhas
+    (CALL, SHOW...), reexecutar repetiria efeitos colaterais, e a exportação usa
+    o DataFrame `amostra` inteiro.
+    """
+    if not eh_select(sql):
+        if amostra is None:
+            raise ValueError("Só SELECTs podem ser reexecutados para exportação; informe o DataFrame")
+        return fonte_dataframe(amostra)
+    return {'banco': banco, 'sql': normalizar_sql(sql), 'linhas': linhas,
+            'amostra': amostra.head(TAMANHO_AMOSTRA) if amostra is not None else None}
+
+
+def fonte_dataframe(df):
+    """Exporta um resultado já em memória"""
+    return {'df': df, 'linhas': len(df), 'amostra': df.head(TAMANHO_AMOSTRA)}
+
+
+@contextmanager
+def abrir_lotes(fonte, tamanho_lote=TAMANHO_LOTE):
+    """Abre a fonte e entrega (colunas, descrição do cursor ou None, gerador de lotes de linhas)"""
+    if 'df' in fonte:
+        df = fonte['df']
+
+        def lotes_df():
+            for inicio in range(0, len(df), tamanho_lote):
+                bloco = df.iloc[inicio:inicio + tamanho_lote]
+                # NaN, NaT e pd.NA viram None, como o NULL vindo do cursor
+                bloco = bloco.astype(object).where(bloco.notna(), None)
+                yield list(bloco.itertuples(index=False, name=None))
+
+        yield list(df.columns), None, lotes_df()
+        return
+
+    # Tempo limite e KILL QUERY se a exportação for abandonada, como no editor
+    with obter_conexao(fonte['banco']) as conexao, \
+            ExecucaoControlada(conexao, fonte['sql'], fonte['banco'], TIMEOUT_EXPORTACAO,
+                               origem="exportacao") as controle:
+        # Não-bufferizado: o servidor envia as linhas conforme são lidas
+        cursor = conexao.cursor(buffered=False)
+        try:
+            controle.executar(cursor)
+            descricao = cursor.description or []
+            controle.linhas = controle.bytes = 0
+
+            def lotes_cursor():
+                while True:
+                    linhas = cursor.fetchmany(tamanho_lote)
+                    if not linhas:
+                        break
+                    controle.linhas += len(linhas)
+                    controle.bytes += estimar_bytes(linhas)
+                    yield linhas
+
+            yield [d[0] for d in descricao], descricao, lotes_cursor()
+        finally:
+            try:
+                cursor.close()
+            except Error:
+                # Exportação interrompida no meio: o pool descarta a conexão
+                pass
+
+
+# ============ FORMATOS ============
+def _texto_csv(valor):
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        # NULL do cursor ou NaN vindo de DataFrame
+        return ""
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode('utf-8', errors='replace')
+    if isinstance(valor, (set, frozenset)):
+        # Colunas SET chegam como conjunto; no texto do MySQL são 'a,b'
+        return ",".join(sorted(valor))
+    return valor
+
+
+def gerar_csv(fonte, saida, progresso=None):
+    """Grava CSV (UTF-8) em `saida` (arquivo binário) lote a lote; retorna o nº de linhas"""
+    texto = io.TextIOWrapper(saida, encoding='utf-8', newline='', write_through=True)
+    escritor = csv.writer(texto)
+    total = 0
+    try:
+        with abrir_lotes(fonte) as (colunas, _, lotes):
+            escritor.writerow(colunas)
+            for lote in lotes:
+                escritor.writerows([[_texto_csv(v) for v in linha] for linha in lote])
+                total += len(lote)
+                if progresso:
+                    progresso(total)
+    finally:
+        texto.detach()
+    return total
+
+
+def _valor_excel(valor):
+    if valor is None or (isinstance(valor, float) and valor != valor):
+        return None
+    if isinstance(valor, (bytes, bytearray)):
+        valor = valor.decode('utf-8', errors='replace')
+    if isinstance(valor, (set, frozenset)):
+        # Colunas SET: openpyxl não grava conjuntos
+        valor = ",".join(sorted(valor))
+    if isinstance(valor, str):
+        # Caracteres de controle invalidam o XML da planilha
+        return ILLEGAL_CHARACTERS_RE.sub("", valor)
+    return valor
+
+
+def gerar_xlsx(fonte, saida, progresso=None):
+    """Grava XLSX com workbook write-only, abrindo nova planilha a cada MAX_LINHAS_PLANILHA"""
+    livro = Workbook(write_only=True)
+    total = 0
+    with abrir_lotes(fonte) as (colunas, _, lotes):
+        planilha = None
+        linhas_planilha = MAX_LINHAS_PLANILHA
+        for lote in lotes:
+            for linha in lote:
+                if linhas_planilha >= MAX_LINHAS_PLANILHA:
+                    numero = len(livro.worksheets) + 1
+                    planilha = livro.create_sheet("Resultados" if numero == 1 else f"Resultados_{numero}")
+                    planilha.append(colunas)
+                    linhas_planilha = 1
+                planilha.append([_valor_excel(v) for v in linha])
+                linhas_planilha += 1
+            total += len(lote)
+            if progresso:
+                progresso(total)
+        if planilha is None:
+            livro.create_sheet("Resultados").append(colunas)
+    livro.save(saida)
+    return total
+
+
+# ============ JSON ============
+def _valor_json(valor):
+    """Tipos que o codificador JSON não conhece (chamado só para eles)"""
+    if isinstance(valor, decimal.Decimal):
+        # Como texto, igual ao CSV: float perderia precisão de colunas DECIMAL
+        return str(valor)
+    if isinstance(valor, (datetime.datetime, datetime.date, datetime.time)):
+        return valor.isoformat()
+    if isinstance(valor, datetime.timedelta):
+        return str(valor)
+    if isinstance(valor, (bytes, bytearray)):
+        return valor.decode('utf-8', errors='replace')
+    if isinstance(valor, (set, frozenset)):
+        return sorted(valor)
+    if hasattr(valor, 'item'):
+        # Escalares numpy vindos de DataFrame
+        return valor.item()
+    raise TypeError(f"Tipo não serializável em JSON: {type(valor).__name__}")
+
+
+if orjson is not None:
+    def _codificar(objeto, indentar=False):
+        opcoes = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if indentar else 0)
+        return orjson.dumps(objeto, default=_valor_json, option=opcoes)
+else:
+    _codificador = json.JSONEncoder(default=_valor_json, ensure_ascii=False, separators=(",", ":"))
+    _codificador_indentado = json.JSONEncoder(default=_valor_json, ensure_ascii=False, indent=2)
+
+    def _codificar(objeto, indentar=False):
+        return (_codificador_indentado if indentar else _codificador).encode(objeto).encode('utf-8')
+
+
+def _registros(fonte, progresso):
+    """Gera um dict por linha"""
+    total = 0
+    with abrir_lotes(fonte) as (colunas, _, lotes):
+        for lote in lotes:
+            for linha in lote:
+                yield dict(zip(colunas, linha))
+            total += len(lote)
+            if progresso:
+                progresso(total)
+
+
+def gerar_ndjson(fonte, saida, progresso=None):
+    """JSON Lines: um objeto compacto por linha, escrito lote a lote"""
+    total = 0
+    for registro in _registros(fonte, progresso):
+        saida.write(_codificar(registro))
+        saida.write(b"\n")
+        total += 1
+    return total
+
+
+def gerar_json_formatado(fonte, saida, progresso=None):
+    """Array JSON indentado (maior e mais lento; útil para leitura humana)"""
+    total = 0
+    saida.write(b"[")
+    for registro in _registros(fonte, progresso):
+        saida.write(b",\n" if total else b"\n")
+        saida.write(_codificar(registro, indentar=True))
+        total += 1
+    saida.write(b"\n]\n" if total else b"]\n")
+    return total
+
+
+# ============ FORMATOS COLUNARES (PYARROW) ============
+_TIPOS_INTEIROS = (FieldType.TINY, FieldType.SHORT, FieldType.INT24, FieldType.LONG,
+                   FieldType.LONGLONG, FieldType.YEAR, FieldType.BIT)
+_TIPOS_BINARIOS = (FieldType.TINY_BLOB, FieldType.MEDIUM_BLOB, FieldType.LONG_BLOB, FieldType.BLOB,
+                   FieldType.STRING, FieldType.VAR_STRING, FieldType.VARCHAR)
+CHARSET_BINARIO = 63
+
+
+def _escala_decimal(valores):
+    for valor in valores:
+        if valor is not None:
+            return max(0, -valor.as_tuple().exponent)
+    return 10
+
+
+def tipo_arrow(coluna, valores):
+    """Tipo Arrow de uma coluna a partir do cursor.description (valores só para a escala de DECIMAL)"""
+    tipo = coluna[1]
+    flags = coluna[7] if len(coluna) > 7 else 0
+    charset = coluna[8] if len(coluna) > 8 else None
+    if tipo in _TIPOS_INTEIROS:
+        if tipo == FieldType.LONGLONG and flags & FieldFlag.UNSIGNED:
+            return pa.uint64()
+        return pa.int64()
+    if tipo == FieldType.FLOAT:
+        return pa.float32()
+    if tipo == FieldType.DOUBLE:
+        return pa.float64()
+    if tipo in (FieldType.DECIMAL, FieldType.NEWDECIMAL):
+        return pa.decimal128(38, _escala_decimal(valores))
+    if tipo in (FieldType.DATE, FieldType.NEWDATE):
+        return pa.date32()
+    if tipo in (FieldType.DATETIME, FieldType.TIMESTAMP):
+        return pa.timestamp('us')
+    if tipo == FieldType.TIME:
+        return pa.duration('us')
+    if tipo == FieldType.GEOMETRY:
+        return pa.binary()
+    if tipo in _TIPOS_BINARIOS and (charset == CHARSET_BINARIO or (charset is None and flags & FieldFlag.BINARY)):
+        return pa.binary()
+    return pa.string()
+
+
+def _valor_arrow(valor, tipo):
+    if valor is None:
+        return None
+    if pa.types.is_string(tipo):
+        if isinstance(valor, (bytes, bytearray)):
+            return valor.decode('utf-8', errors='replace')
+        if isinstance(valor, (set, frozenset)):
+            # Colunas SET chegam como conjunto
+            return ",".join(sorted(valor))
+        return str(valor)
+    if pa.types.is_binary(tipo) and isinstance(valor, str):
+        return valor.encode('utf-8')
+    return valor
+
+
+def _lotes_arrow(fonte):
+    """Gera (schema, RecordBatch) tipados pelo cursor.description (ou pelo DataFrame)"""
+    if 'df' in fonte:
+        df = fonte['df']
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        for inicio in range(0, max(len(df), 1), TAMANHO_LOTE):
+            yield schema, pa.RecordBatch.from_pandas(df.iloc[inicio:inicio + TAMANHO_LOTE],
+                                                     schema=schema, preserve_index=False)
+        return
+
+    with abrir_lotes(fonte) as (colunas, descricao, lotes):
+        schema = None
+        for lote in lotes:
+            por_coluna = list(zip(*lote))
+            if schema is None:
+                schema = pa.schema([pa.field(nome, tipo_arrow(desc, valores))
+                                    for nome, desc, valores in zip(colunas, descricao, por_coluna)])
+            arrays = [pa.array([_valor_arrow(v, campo.type) for v in valores], type=campo.type)
+                      for campo, valores in zip(schema, por_coluna)]
+            yield schema, pa.RecordBatch.from_arrays(arrays, schema=schema)
+        if schema is None:
+            # Resultado vazio: só o schema
+            schema = pa.schema([pa.field(nome, tipo_arrow(desc, [])) for nome, desc in zip(colunas, descricao)])
+            yield schema, pa.RecordBatch.from_arrays([pa.array([], type=c.type) for c in schema], schema=schema)
+
+
+def _codec(preferido="zstd"):
+    return preferido if pa.Codec.is_available(preferido) else "snappy"
+
+
+def gerar_parquet(fonte, saida, progresso=None):
+    """Grava Parquet comprimido (zstd quando disponível), um row group por lote"""
+    escritor = None
+    total = 0
+    try:
+        for schema, lote in _lotes_arrow(fonte):
+            if escritor is None:
+                escritor = pq.ParquetWriter(saida, schema, compression=_codec())
+            escritor.write_batch(lote)
+            total += lote.num_rows
+            if progresso:
+                progresso(total)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return total
+
+
+def gerar_arrow(fonte, saida, progresso=None):
+    """Grava Arrow IPC em formato de arquivo (Feather v2) com compressão por bloco"""
+    escritor = None
+    total = 0
+    try:
+        for schema, lote in _lotes_arrow(fonte):
+            if escritor is None:
+                codec = "zstd" if pa.Codec.is_available("zstd") else "lz4"
+                escritor = pa.ipc.new_file(saida, schema, options=pa.ipc.IpcWriteOptions(compression=codec))
+            escritor.write_batch(lote)
+            total += lote.num_rows
+            if progresso:
+                progresso(total)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return total
+
+
+FORMATOS = {
+    'csv': {'rotulo': "CSV", 'extensao': "csv", 'mime': "text/csv", 'gerar': gerar_csv},
+    'xlsx': {'rotulo': "Excel", 'extensao': "xlsx",
+             'mime': "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet", 'gerar': gerar_xlsx},
+    'ndjson': {'rotulo': "JSON Lines", 'extensao': "jsonl", 'mime': "application/x-ndjson", 'gerar': gerar_ndjson},
+    'json': {'rotulo': "JSON formatado", 'extensao': "json", 'mime': "application/json",
+             'gerar': gerar_json_formatado},
+}
+# Fora da lista padrão do painel; aparece quando pedido
+FORMATOS_OPCIONAIS = ('json',)
+if pa is not None:
+    FORMATOS['parquet'] = {'rotulo': "Parquet", 'extensao': "parquet",
+                           'mime': "application/vnd.apache.parquet", 'gerar': gerar_parquet}
+    FORMATOS['arrow'] = {'rotulo': "Arrow/Feather", 'extensao': "arrow",
+                         'mime': "application/vnd.apache.arrow.file", 'gerar': gerar_arrow}
+
+
+# ============ COMPRESSÃO ============
+class _SaidaSequencial(io.RawIOBase):
+    """Saída só de escrita e sem seek: o zip do XLSX passa a usar descritores de dados
+    em vez de voltar para reescrever cabeçalhos, o que permite comprimir em fluxo"""
+
+    def __init__(self, destino):
+        super().__init__()
+        self._destino = destino
+        self._posicao = 0
+
+    def write(self, dados):
+        self._destino.write(dados)
+        self._posicao += len(dados)
+        return len(dados)
+
+    def tell(self):
+        return self._posicao
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        # Fechar a saída não fecha o destino (o compressor é finalizado por abrir_saida)
+        if not self.closed:
+            self._destino.flush()
+
+
+def _gzip(saida):
+    return gzip.GzipFile(fileobj=saida, mode='wb', compresslevel=NIVEL_GZIP, mtime=0)
+
+
+def _zstd(saida):
+    return zstandard.ZstdCompressor(level=NIVEL_ZSTD).stream_writer(saida, closefd=False)
+
+
+COMPRESSOES = {
+    'nenhuma': {'rotulo': "Sem compressão", 'extensao': "", 'mime': None, 'abrir': None},
+    'gzip': {'rotulo': "gzip", 'extensao': ".gz", 'mime': "application/gzip", 'abrir': _gzip},
+}
+if zstandard is not None:
+    COMPRESSOES['zstd'] = {'rotulo': "zstd", 'extensao': ".zst", 'mime': "application/zstd", 'abrir': _zstd}
+
+
+@contextmanager
+def abrir_saida(saida, compressao='nenhuma'):
+    """Entrega o destino onde o gerador escreve; comprime cada bloco conforme é gravado"""
+    abrir = COMPRESSOES[compressao]['abrir']
+    if abrir is None:
+        yield saida
+        return
+    comprimido = abrir(saida)
+    try:
+        yield _SaidaSequencial(comprimido)
+    finally:
+        comprimido.close()
+
+
+class _Contador:
+    """Destino que só conta os bytes recebidos"""
+
+    def __init__(self):
+        self.total = 0
+
+    def write(self, dados):
+        self.total += len(dados)
+        return len(dados)
+
+    def flush(self):
+        pass
+
+
+def estimar_tamanho(fonte, formato, compressao='nenhuma'):
+    """Bytes esperados do arquivo, extrapolados da amostra gerada em memória (ou None)
+
+    Sem total de linhas conhecido, a estimativa é para TAMANHO_LOTE linhas.
+    """
+    amostra = fonte.get('amostra')
+    if amostra is None or amostra.empty:
+        return None
+    contador = _Contador()
+    with abrir_saida(contador, compressao) as destino:
+        FORMATOS[formato]['gerar'](fonte_dataframe(amostra), _SaidaSequencial(destino))
+    return int(contador.total / len(amostra) * (fonte.get('linhas') or TAMANHO_LOTE))
+
+
+def formatar_bytes(tamanho):
+    for unidade in ("B", "KB", "MB", "GB"):
+        if tamanho < 1024 or unidade == "GB":
+            return f"{tamanho:,.0f} {unidade}" if unidade == "B" else f"{tamanho:,.1f} {unidade}"
+        tamanho /= 1024
+
+
+# ============ ARQUIVOS TEMPORÁRIOS ============
+# (id do resultado, formato, compressão) -> {'caminho', 'linhas'}; só é gerado quando alguém pede o formato
+_arquivos = OrderedDict()
+_lock_arquivos = threading.Lock()
+
+
+def id_resultado(banco, sql, marcadores):
+    """Id estável do resultado: mesma consulta com as tabelas inalteradas reaproveita os arquivos
+
+    Sem marcadores (consulta não cacheável) retorna None e cada execução ganha um id novo.
+    """
+    if marcadores is None:
+        return None
+    chave = (identificador_servidor(), banco, normalizar_sql(sql), sorted(marcadores.items(), key=repr))
+    return hashlib.sha1(repr(chave).encode('utf-8')).hexdigest()
+
+
+def _remover_arquivo(caminho):
+    try:
+        os.remove(caminho)
+    except OSError:
+        pass
+
+
+def _limpar_antigos():
+    """Apaga exportações mais velhas que VALIDADE_ARQUIVOS"""
+    if not os.path.isdir(DIRETORIO_EXPORTACOES):
+        return
+    limite = time.time() - VALIDADE_ARQUIVOS
+    for nome in os.listdir(DIRETORIO_EXPORTACOES):
+        caminho = os.path.join(DIRETORIO_EXPORTACOES, nome)
+        try:
+            if os.path.getmtime(caminho) < limite:
+                os.remove(caminho)
+        except OSError:
+            pass
+
+
+def arquivo_pronto(id_res, formato, compressao='nenhuma'):
+    """Arquivo já gerado para (resultado, formato, compressão), ou None se ausente/expirado"""
+    chave = (id_res, formato, compressao)
+    with _lock_arquivos:
+        arquivo = _arquivos.get(chave)
+        if arquivo is None:
+            return None
+        if not os.path.exists(arquivo['caminho']):
+            del _arquivos[chave]
+            return None
+        _arquivos.move_to_end(chave)
+        return arquivo
+
+
+def _guardar_arquivo(chave, caminho, linhas):
+    with _lock_arquivos:
+        anterior = _arquivos.pop(chave, None)
+        if anterior and anterior['caminho'] != caminho:
+            _remover_arquivo(anterior['caminho'])
+        _arquivos[chave] = {'caminho': caminho, 'linhas': linhas}
+        while len(_arquivos) > MAX_ARQUIVOS_GUARDADOS:
+            _, descartado = _arquivos.popitem(last=False)
+            _remover_arquivo(descartado['caminho'])
+
+
+def descartar_arquivos(id_res):
+    """Apaga todos os formatos gerados para um resultado"""
+    with _lock_arquivos:
+        for chave in [c for c in _arquivos if c[0] == id_res]:
+            _remover_arquivo(_arquivos.pop(chave)['caminho'])
+
+
+def conteudo_download(caminho):
+    """`data` do st.download_button: o arquivo só é lido no clique quando o Streamlit permite"""
+    def ler():
+        with open(caminho, 'rb') as arquivo:
+            return arquivo.read()
+    return ler if _DOWNLOAD_SOB_DEMANDA else ler()
+
+
+def nome_arquivo(nome_base, formato, compressao='nenhuma'):
+    return f"{nome_base}.{FORMATOS[formato]['extensao']}{COMPRESSOES[compressao]['extensao']}"
+
+
+def exportar(fonte, formato, progresso=None, compressao='nenhuma'):
+    """Gera o arquivo do formato pedido; retorna (caminho, linhas exportadas)"""
+    os.makedirs(DIRETORIO_EXPORTACOES, exist_ok=True)
+    _limpar_antigos()
+    caminho = os.path.join(DIRETORIO_EXPORTACOES, nome_arquivo(uuid.uuid4().hex, formato, compressao))
+    try:
+        with open(caminho, 'wb') as saida, abrir_saida(saida, compressao) as destino:
+            linhas = FORMATOS[formato]['gerar'](fonte, destino, progresso)
+    except BaseException:
+        if os.path.exists(caminho):
+            os.remove(caminho)
+        raise
+    return caminho, linhas
+
+
+def obter_exportacao(id_res, fonte, formato, progresso=None, compressao='nenhuma'):
+    """Arquivo do formato para o resultado: reaproveita o já gerado ou gera agora
+
+    Retorna (caminho, linhas exportadas).
+    """
+    arquivo = arquivo_pronto(id_res, formato, compressao)
+    if arquivo is None:
+        caminho, linhas = exportar(fonte, formato, progresso, compressao)
+        _guardar_arquivo((id_res, formato, compressao), caminho, linhas)
+        arquivo = {'caminho': caminho, 'linhas': linhas}
+    return arquivo['caminho'], arquivo['linhas']
+
+
+# ============ INTERFACE STREAMLIT ============
+def registrar_resultado(chave, fonte, nome_base, id_resultado=None):
+    """Guarda na sessão o resultado exportável da página (substitui o anterior)
+
+    Nada é gerado aqui: cada formato só vira arquivo quando pedido no painel.
+    Registrar de novo o mesmo id_resultado mantém os arquivos já gerados; um
+    resultado novo apaga os arquivos exclusivos da sessão do anterior.
+    """
+    atual = st.session_state.get(f"exportacao_{chave}")
+    if id_resultado and atual and atual['id'] == id_resultado:
+        return
+    if atual and not atual['compartilhado']:
+        descartar_arquivos(atual['id'])
+    st.session_state[f"exportacao_{chave}"] = {
+        'id': id_resultado or uuid.uuid4().hex,
+        'compartilhado': id_resultado is not None,
+        'fonte': fonte,
+        'nome_base': nome_base,
+        'estimativas': {}
+    }
+
+
+def limpar_resultado(chave):
+    atual = st.session_state.pop(f"exportacao_{chave}", None)
+    if atual and not atual['compartilhado']:
+        descartar_arquivos(atual['id'])
+
+
+def exibir_exportacao(chave, formatos=None):
+    """Botões para gerar cada formato sob demanda e baixar o arquivo gerado"""
+    estado = st.session_state.get(f"exportacao_{chave}")
+    if not estado:
+        return
+    if formatos is None:
+        formatos = [f for f in FORMATOS if f not in FORMATOS_OPCIONAIS]
+        if st.checkbox("JSON formatado (indentado)", key=f"exportacao_{chave}_json_formatado"):
+            formatos.append('json')
+    if pa is None:
+        st.caption("ℹ️ Instale `pyarrow` para exportar em Parquet e Arrow/Feather.")
+    compressao = st.radio(
+        "Compressão", list(COMPRESSOES), format_func=lambda c: COMPRESSOES[c]['rotulo'],
+        horizontal=True, key=f"exportacao_{chave}_compressao"
+    )
+    if zstandard is None:
+        st.caption("ℹ️ Instale `zstandard` para comprimir com zstd.")
+    total = estado['fonte'].get('linhas')
+    colunas = st.columns(len(formatos))
+    for coluna, formato in zip(colunas, formatos):
+        info = FORMATOS[formato]
+        mime = COMPRESSOES[compressao]['mime'] or info['mime']
+        with coluna:
+            arquivo = arquivo_pronto(estado['id'], formato, compressao)
+            if arquivo:
+                st.download_button(
+                    f"⬇️ Baixar {info['rotulo']} ({arquivo['linhas']:,} linhas, "
+                    f"{formatar_bytes(os.path.getsize(arquivo['caminho']))})",
+                    conteudo_download(arquivo['caminho']),
+                    nome_arquivo(estado['nome_base'], formato, compressao),
+                    mime,
+                    key=f"baixar_{chave}_{formato}_{compressao}_{estado['id']}",
+                    use_container_width=True
+                )
+                continue
+
+            # Estimativa feita uma vez por resultado, a partir da amostra já em memória
+            if (formato, compressao) not in estado['estimativas']:
+                try:
+                    estado['estimativas'][(formato, compressao)] = estimar_tamanho(estado['fonte'], formato, compressao)
+                except (ValueError, TypeError):
+                    estado['estimativas'][(formato, compressao)] = None
+            estimativa = estado['estimativas'][(formato, compressao)]
+            if st.button(f"📦 Preparar {info['rotulo']}", key=f"preparar_{chave}_{formato}_{compressao}_{estado['id']}",
+                         use_container_width=True):
+                aviso = st.empty()
+
+                def progresso(linhas):
+                    if total:
+                        aviso.progress(min(linhas / total, 1.0), text=f"⏳ {linhas:,} de {total:,} linhas")
+                    else:
+                        aviso.caption(f"⏳ {linhas:,} linha(s) gravada(s)...")
+
+                try:
+                    obter_exportacao(estado['id'], estado['fonte'], formato, progresso, compressao)
+                except (Error, OSError, ValueError) as e:
+                    # ValueError: valor que o formato não consegue gravar
+                    st.error(f"❌ Erro ao exportar: {e}")
+                    continue
+                aviso.empty()
+                st.rerun()
+            if estimativa is not None:
+                st.caption(f"≈ {formatar_bytes(estimativa)}" if total
+                           else f"≈ {formatar_bytes(estimativa)} a cada {TAMANHO_LOTE:,} linhas")
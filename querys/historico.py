@@ -0,0 +1,387 @@
+# historico.py - Histórico persistente de execuções (SQLite) com relatório por impressão digital
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import streamlit as st
+import pandas as pd
+from mysql.connector import Error
+
+from cache_resultados import forma_sql
+
+# ============ CONFIGURAÇÃO ============
+ARQUIVO_HISTORICO = os.environ.get(
+    "QUERY_BUILDER_HISTORICO",
+    os.path.join(os.path.expanduser("~"), ".query_builder_historico.sqlite3")
+)
+MAX_REGISTROS = int(os.environ.get("QUERY_BUILDER_HISTORICO_MAX", 500_000))
+INTERVALO_LIMPEZA = 1000     # gravações entre verificações do limite de registros
+MAX_TEXTO_SQL = 64 * 1024    # caracteres do SQL guardados por execução
+LINHAS_RELATORIO = 50
+
+LINHAS_BUSCA = 20
+
+OK = "ok"
+ERRO = "erro"
+INTERROMPIDA = "interrompida"
+
+# Cada script leva o arquivo à versão seguinte (PRAGMA user_version)
+_MIGRACOES = [
+    """
+    CREATE TABLE IF NOT EXISTS impressoes (
+        impressao TEXT PRIMARY KEY,
+        forma     TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS execucoes (
+        id        INTEGER PRIMARY KEY,
+        instante  REAL NOT NULL,
+        origem    TEXT NOT NULL,
+        banco     TEXT,
+        impressao TEXT NOT NULL,
+        sql       TEXT NOT NULL,
+        tempo     REAL NOT NULL,
+        linhas    INTEGER,
+        bytes     INTEGER,
+        erro      TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_execucoes_impressao ON execucoes (impressao, instante);
+    CREATE INDEX IF NOT EXISTS idx_execucoes_instante ON execucoes (instante);
+    """,
+    # Busca textual (FTS5 sobre o SQL completo) e filtros por usuário e situação
+    """
+    ALTER TABLE execucoes ADD COLUMN usuario TEXT;
+    ALTER TABLE execucoes ADD COLUMN status TEXT NOT NULL DEFAULT 'ok';
+    UPDATE execucoes SET status = CASE WHEN erro IS NULL THEN 'ok'
+                                       WHEN erro = 'interrompida' THEN 'interrompida'
+                                       ELSE 'erro' END;
+    CREATE INDEX idx_execucoes_banco ON execucoes (banco, instante);
+    CREATE INDEX idx_execucoes_usuario ON execucoes (usuario, instante);
+    CREATE INDEX idx_execucoes_status ON execucoes (status, instante);
+    CREATE VIRTUAL TABLE execucoes_fts USING fts5(
+        sql, content='execucoes', content_rowid='id', tokenize="unicode61 tokenchars '_'"
+    );
+    CREATE TRIGGER execucoes_fts_inserir AFTER INSERT ON execucoes BEGIN
+        INSERT INTO execucoes_fts (rowid, sql) VALUES (new.id, new.sql);
+    END;
+    CREATE TRIGGER execucoes_fts_excluir AFTER DELETE ON execucoes BEGIN
+        INSERT INTO execucoes_fts (execucoes_fts, rowid, sql) VALUES ('delete', old.id, old.sql);
+    END;
+    INSERT INTO execucoes_fts (execucoes_fts) VALUES ('rebuild');
+    """,
+    # A coluna usuario guardava sempre a mesma conta MySQL do app: não identifica ninguém.
+    # DROP COLUMN exige SQLite 3.35; antes disso a coluna fica no arquivo, sem uso
+    "DROP INDEX IF EXISTS idx_execucoes_usuario;"
+    + (" ALTER TABLE execucoes DROP COLUMN usuario;" if sqlite3.sqlite_version_info >= (3, 35) else ""),
+]
+
+
+# ============ ARMAZENAMENTO ============
+# Uma conexão por processo, compartilhada entre sessões e threads de tarefas
+_conexao = None
+_lock = threading.Lock()
+_gravacoes = 0
+
+
+def _abrir():
+    global _conexao
+    if _conexao is None:
+        conexao = sqlite3.connect(ARQUIVO_HISTORICO, timeout=5, check_same_thread=False, isolation_level=None)
+        try:
+            # WAL: leituras do relatório e da busca não bloqueiam as gravações
+            conexao.execute("PRAGMA journal_mode = WAL")
+            conexao.execute("PRAGMA synchronous = NORMAL")
+            _migrar(conexao)
+        except sqlite3.Error:
+            conexao.close()
+            raise
+        _conexao = conexao
+    return _conexao
+
+
+def _migrar(conexao):
+    versao = conexao.execute("PRAGMA user_version").fetchone()[0]
+    for numero, script in enumerate(_MIGRACOES[versao:], versao + 1):
+        conexao.executescript(f"BEGIN; {script}; PRAGMA user_version = {numero}; COMMIT;")
+
+
+def _impressao(forma):
+    return hashlib.sha1(forma.encode("utf-8")).hexdigest()[:16]
+
+
+def impressao_digital(sql):
+    """Identificador curto da forma da consulta: mesmas consultas com valores diferentes coincidem"""
+    return _impressao(forma_sql(sql))
+
+
+def _limpar(conexao):
+    """Mantém as MAX_REGISTROS execuções mais recentes e as impressões ainda usadas"""
+    conexao.execute("BEGIN")
+    conexao.execute("DELETE FROM execucoes WHERE id <= (SELECT MAX(id) FROM execucoes) - ?", (MAX_REGISTROS,))
+    conexao.execute("DELETE FROM impressoes WHERE impressao NOT IN (SELECT impressao FROM execucoes)")
+    conexao.execute("COMMIT")
+
+
+def registrar(origem, banco, sql, tempo, linhas=None, bytes_=None, erro=None):
+    """Grava uma execução; falhas do histórico nunca interrompem a execução em si"""
+    global _gravacoes
+    try:
+        forma = forma_sql(sql)
+        impressao = _impressao(forma)
+        if erro is None:
+            status = OK
+        elif erro == INTERROMPIDA:
+            status = INTERROMPIDA
+        else:
+            status = ERRO
+        with _lock:
+            conexao = _abrir()
+            conexao.execute("BEGIN")
+            conexao.execute("INSERT OR IGNORE INTO impressoes (impressao, forma) VALUES (?, ?)",
+                            (impressao, forma))
+            conexao.execute(
+                "INSERT INTO execucoes "
+                "(instante, origem, banco, impressao, sql, tempo, linhas, bytes, status, erro) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), origem, banco, impressao, sql[:MAX_TEXTO_SQL], tempo,
+                 linhas, bytes_, status, None if erro is None else str(erro))
+            )
+            conexao.execute("COMMIT")
+            _gravacoes += 1
+            if _gravacoes % INTERVALO_LIMPEZA == 0:
+                _limpar(conexao)
+    except (sqlite3.Error, OSError):
+        try:
+            if _conexao is not None and _conexao.in_transaction:
+                _conexao.execute("ROLLBACK")
+        except sqlite3.Error:
+            pass
+
+
+@contextmanager
+def medir(origem, banco, sql):
+    """Mede o bloco e grava a execução
+
+    Dentro do bloco, preencha registro['linhas'] e registro['bytes'] quando souber.
+    """
+    registro = {'linhas': None, 'bytes': None}
+    inicio = time.monotonic()
+    try:
+        yield registro
+    except Error as e:
+        registrar(origem, banco, sql, time.monotonic() - inicio, registro['linhas'], registro['bytes'], e)
+        raise
+    except BaseException:
+        registrar(origem, banco, sql, time.monotonic() - inicio, registro['linhas'], registro['bytes'],
+                  INTERROMPIDA)
+        raise
+    registrar(origem, banco, sql, time.monotonic() - inicio, registro['linhas'], registro['bytes'])
+
+
+# ============ BUSCA ============
+_RE_TERMOS = re.compile(r"\w+")
+
+STATUS = {
+    OK: "✅ Sucesso",
+    ERRO: "❌ Erro",
+    INTERROMPIDA: "⏹️ Interrompida",
+}
+
+
+def consulta_fts(texto):
+    """Termos digitados viram prefixos obrigatórios: `cli ped` acha `clientes ... pedidos`"""
+    return " ".join(f'"{termo}"*' for termo in _RE_TERMOS.findall(texto))
+
+
+def buscar(texto=None, banco=None, status=None, desde=None, ate=None, limite=LINHAS_BUSCA):
+    """Execuções mais recentes que atendem aos filtros; `texto` usa o índice FTS5 do SQL"""
+    condicoes, params = [], []
+    tabelas = "execucoes e"
+    if texto and _RE_TERMOS.search(texto):
+        tabelas = "execucoes_fts JOIN execucoes e ON e.id = execucoes_fts.rowid"
+        condicoes.append("execucoes_fts MATCH ?")
+        params.append(consulta_fts(texto))
+    for coluna, valor in (("banco", banco), ("status", status)):
+        if valor:
+            condicoes.append(f"e.{coluna} = ?")
+            params.append(valor)
+    if desde is not None:
+        condicoes.append("e.instante >= ?")
+        params.append(desde)
+    if ate is not None:
+        condicoes.append("e.instante < ?")
+        params.append(ate)
+    where = "WHERE " + " AND ".join(condicoes) if condicoes else ""
+    with _lock:
+        return pd.read_sql_query(
+            f"""SELECT e.id, e.instante, e.origem, e.banco, e.status, e.tempo, e.linhas,
+                       e.erro, e.sql
+                FROM {tabelas}
+                {where}
+                ORDER BY e.id DESC
+                LIMIT ?""",
+            _abrir(), params=params + [limite]
+        )
+
+
+def valores_distintos(coluna):
+    """Valores já registrados de banco, para os filtros"""
+    if coluna not in ("banco",):
+        raise ValueError(f"Coluna sem filtro: {coluna}")
+    with _lock:
+        linhas = _abrir().execute(
+            f"SELECT DISTINCT {coluna} FROM execucoes WHERE {coluna} IS NOT NULL ORDER BY {coluna}"
+        ).fetchall()
+    return [linha[0] for linha in linhas]
+
+
+def _intervalo(datas):
+    """(início, fim) em segundos a partir do st.date_input; fim inclui o último dia"""
+    if not isinstance(datas, (list, tuple)):
+        datas = (datas,)
+    if not datas:
+        return None, None
+    inicio = time.mktime(datas[0].timetuple())
+    fim = time.mktime((datas[-1] + timedelta(days=1)).timetuple())
+    return inicio, fim
+
+
+def exibir_busca(ao_recuperar):
+    """Busca no histórico persistente; ao_recuperar(sql, banco) é chamado pelo botão de cada execução"""
+    try:
+        bancos = valores_distintos("banco")
+    except (sqlite3.Error, OSError) as e:
+        st.error(f"❌ Erro ao ler o histórico: {e}")
+        return
+
+    texto = st.text_input("🔎 Buscar no SQL:", key="historico_busca",
+                          placeholder="Ex: clientes pedidos (prefixos, todos os termos)")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        banco = st.selectbox("Banco:", ["Todos"] + bancos, key="historico_banco")
+    with col2:
+        status = st.selectbox("Situação:", ["Todas"] + list(STATUS), key="historico_status",
+                              format_func=lambda s: STATUS.get(s, s))
+    with col3:
+        hoje = date.today()
+        datas = st.date_input("Período:", value=(hoje - timedelta(days=7), hoje), key="historico_datas")
+
+    desde, ate = _intervalo(datas)
+    try:
+        df = buscar(
+            texto,
+            banco=None if banco == "Todos" else banco,
+            status=None if status == "Todas" else status,
+            desde=desde,
+            ate=ate
+        )
+    except (sqlite3.Error, OSError) as e:
+        st.error(f"❌ Erro na busca: {e}")
+        return
+
+    if df.empty:
+        st.info("Nenhuma execução encontrada.")
+        return
+    if len(df) == LINHAS_BUSCA:
+        st.caption(f"Mostrando as {LINHAS_BUSCA} execuções mais recentes; refine a busca para ver outras.")
+
+    for execucao in df.itertuples():
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            quando = time.strftime('%d/%m/%Y %H:%M:%S', time.localtime(execucao.instante))
+            linhas = "" if pd.isna(execucao.linhas) else f" • {int(execucao.linhas):,} linha(s)"
+            st.caption(f"{STATUS.get(execucao.status, execucao.status)} • {quando} • "
+                       f"{execucao.banco or '-'} • {execucao.origem} • "
+                       f"{execucao.tempo:.3f}s{linhas}")
+            st.code(execucao.sql[:1000] + ("..." if len(execucao.sql) > 1000 else ""), language="sql")
+            if execucao.erro and execucao.status == ERRO:
+                st.caption(f"⚠️ {execucao.erro[:300]}")
+        with col2:
+            st.button("↩️ Abrir no editor", key=f"historico_recuperar_{execucao.id}",
+                      on_click=ao_recuperar, args=(execucao.sql, execucao.banco))
+
+
+# ============ RELATÓRIO ============
+ORDENS = {
+    "⏱️ Mais lentas (tempo médio)": "tempo_medio",
+    "🔁 Mais frequentes": "execucoes",
+    "🔥 Maior tempo total no servidor": "tempo_total",
+}
+
+PERIODOS = {
+    "Últimas 24 horas": 24 * 3600,
+    "Últimos 7 dias": 7 * 24 * 3600,
+    "Últimos 30 dias": 30 * 24 * 3600,
+    "Tudo": None,
+}
+
+
+def relatorio(ordem="tempo_total", periodo=None, limite=LINHAS_RELATORIO):
+    """Execuções agregadas por impressão digital, ordenadas pela coluna `ordem`"""
+    if ordem not in ORDENS.values():
+        raise ValueError(f"Ordem desconhecida: {ordem}")
+    desde = time.time() - periodo if periodo else 0
+    with _lock:
+        return pd.read_sql_query(
+            f"""SELECT f.forma,
+                       COUNT(*) AS execucoes,
+                       SUM(e.tempo) AS tempo_total,
+                       AVG(e.tempo) AS tempo_medio,
+                       MAX(e.tempo) AS tempo_maximo,
+                       SUM(e.linhas) AS linhas,
+                       SUM(e.bytes) AS bytes,
+                       SUM(e.erro IS NOT NULL) AS erros,
+                       GROUP_CONCAT(DISTINCT e.banco) AS bancos,
+                       MAX(e.instante) AS ultima,
+                       e.impressao
+                FROM execucoes e JOIN impressoes f ON f.impressao = e.impressao
+                WHERE e.instante >= ?
+                GROUP BY e.impressao
+                ORDER BY {ordem} DESC
+                LIMIT ?""",
+            _abrir(), params=(desde, limite)
+        )
+
+
+def exibir_relatorio():
+    """Relatório "mais lentas / mais frequentes" agrupado por impressão digital"""
+    col1, col2 = st.columns([2, 1])
+    with col1:
+        ordem = st.radio("Ordenar por:", list(ORDENS), horizontal=True, key="historico_ordem")
+    with col2:
+        periodo = st.selectbox("Período:", list(PERIODOS), key="historico_periodo")
+
+    try:
+        df = relatorio(ORDENS[ordem], PERIODOS[periodo])
+    except (sqlite3.Error, OSError) as e:
+        st.error(f"❌ Erro ao ler o histórico: {e}")
+        return
+
+    if df.empty:
+        st.info("Nenhuma execução registrada no período.")
+        return
+
+    df['ultima'] = df['ultima'].map(lambda t: time.strftime('%d/%m/%Y %H:%M:%S', time.localtime(t)))
+    st.dataframe(
+        df,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "forma": st.column_config.TextColumn("Consulta (normalizada)", width="large"),
+            "execucoes": "Execuções",
+            "tempo_total": st.column_config.NumberColumn("Tempo total (s)", format="%.2f"),
+            "tempo_medio": st.column_config.NumberColumn("Tempo médio (s)", format="%.3f"),
+            "tempo_maximo": st.column_config.NumberColumn("Tempo máximo (s)", format="%.3f"),
+            "linhas": "Linhas",
+            "bytes": "Bytes",
+            "erros": "Erros",
+            "bancos": "Bancos",
+            "ultima": "Última execução",
+            "impressao": "Impressão digital",
+        }
+    )
+    st.caption(f"📁 Histórico em {ARQUIVO_HISTORICO}")
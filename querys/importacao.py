@@ -0,0 +1,353 @@
+# importacao.py - Importação em massa de CSV/XLSX para uma tabela, em lotes
+import csv
+import datetime
+import io
+import os
+import tempfile
+import time
+from contextlib import contextmanager
+
+import streamlit as st
+import pandas as pd
+from mysql.connector import Error
+from openpyxl import load_workbook
+
+from conexao_pool import obter_conexao, criar_conexao
+import historico
+
+# ============ CONFIGURAÇÃO ============
+TAMANHO_LOTE_IMPORTACAO = 1_000        # linhas por executemany / LOAD DATA (um commit por lote)
+LINHAS_PREVIA = 5
+AMOSTRA_SEPARADOR = 64 * 1024          # bytes lidos para detectar o separador do CSV
+SEPARADORES = ",;\t|"
+CODIFICACOES = ["utf-8-sig", "latin-1"]
+IGNORAR = "(ignorar)"
+MAX_AVISOS_EXIBIDOS = 10               # avisos do LOAD DATA mostrados ao final
+
+
+# ============ LEITURA DO ARQUIVO ============
+def _detectar_separador(arquivo, codificacao):
+    amostra = arquivo.read(AMOSTRA_SEPARADOR).decode(codificacao, errors='ignore')
+    arquivo.seek(0)
+    try:
+        return csv.Sniffer().sniff(amostra, delimiters=SEPARADORES).delimiter
+    except csv.Error:
+        return ","
+
+
+@contextmanager
+def abrir_arquivo(arquivo, nome, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, codificacao="utf-8-sig"):
+    """Abre CSV ou XLSX e entrega (cabeçalho, total de linhas ou None, gerador de lotes)
+
+    O arquivo é lido em fluxo: CSV linha a linha e XLSX em modo read-only, sem
+    carregar a planilha inteira em memória.
+    """
+    arquivo.seek(0)
+    if nome.lower().endswith((".xlsx", ".xlsm")):
+        livro = load_workbook(arquivo, read_only=True, data_only=True)
+        try:
+            planilha = livro.worksheets[0]
+            linhas = planilha.iter_rows(values_only=True)
+            cabecalho = [str(c).strip() if c is not None else "" for c in next(linhas, ())]
+            total = planilha.max_row - 1 if planilha.max_row else None
+            yield cabecalho, total, _em_lotes(linhas, tamanho_lote)
+        finally:
+            livro.close()
+        return
+
+    separador = _detectar_separador(arquivo, codificacao)
+    texto = io.TextIOWrapper(arquivo, encoding=codificacao, newline='')
+    try:
+        leitor = csv.reader(texto, delimiter=separador)
+        cabecalho = [c.strip() for c in next(leitor, [])]
+        yield cabecalho, None, _em_lotes(leitor, tamanho_lote)
+    finally:
+        # Não fecha o arquivo enviado: ele é relido a cada rerun
+        texto.detach()
+
+
+def _em_lotes(linhas, tamanho_lote):
+    lote = []
+    for linha in linhas:
+        if not any(v not in (None, "") for v in linha):
+            # Linhas vazias (comuns no fim de planilhas) são ignoradas
+            continue
+        lote.append(linha)
+        if len(lote) >= tamanho_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def ler_previa(arquivo, nome, codificacao="utf-8-sig"):
+    """Cabeçalho e primeiras linhas do arquivo, para conferir o mapeamento"""
+    with abrir_arquivo(arquivo, nome, LINHAS_PREVIA, codificacao) as (cabecalho, total, lotes):
+        primeiras = next(lotes, [])
+    return cabecalho, total, primeiras
+
+
+# ============ MAPEAMENTO ============
+def mapear_colunas(cabecalho, estrutura):
+    """Sugere {coluna da tabela: coluna do arquivo} casando nomes sem diferenciar maiúsculas"""
+    por_nome = {c.lower(): c for c in cabecalho if c}
+    mapa = {}
+    for coluna in estrutura:
+        nome = coluna[0]
+        mapa[nome] = por_nome.get(nome.lower())
+    return mapa
+
+
+def _conversores(cabecalho, estrutura, mapa):
+    """Lista (índice no arquivo, coluna nullable) na ordem das colunas mapeadas"""
+    nullable = {c[0]: c[2] == 'YES' for c in estrutura}
+    posicoes = {nome: i for i, nome in enumerate(cabecalho)}
+    colunas = [col for col, origem in mapa.items() if origem]
+    return colunas, [(posicoes[mapa[col]], nullable.get(col, True)) for col in colunas]
+
+
+def _linha_mapeada(linha, conversores):
+    valores = []
+    for indice, nullable in conversores:
+        valor = linha[indice] if indice < len(linha) else None
+        if valor == "" and nullable:
+            # Célula vazia vira NULL onde a coluna aceita
+            valor = None
+        valores.append(valor)
+    return tuple(valores)
+
+
+# ============ CARGA VIA EXECUTEMANY ============
+def _insert(tabela, colunas):
+    lista = ", ".join(f"`{c}`" for c in colunas)
+    marcadores = ", ".join(["%s"] * len(colunas))
+    return f"INSERT INTO `{tabela}` ({lista}) VALUES ({marcadores})"
+
+
+def carregar_executemany(conexao, tabela, colunas, lotes, conversores, progresso=None):
+    """Insere lote a lote com executemany (INSERT de várias linhas) e commit por lote
+
+    Retorna (linhas confirmadas, erro ou None). No erro o lote atual é desfeito;
+    os anteriores já estão confirmados.
+    """
+    sql = _insert(tabela, colunas)
+    cursor = conexao.cursor()
+    confirmadas = 0
+    try:
+        for numero, lote in enumerate(lotes, 1):
+            try:
+                # O conector reescreve INSERT ... VALUES em um único comando com todas as linhas
+                with historico.medir("importacao", conexao.database, sql) as registro:
+                    cursor.executemany(sql, [_linha_mapeada(linha, conversores) for linha in lote])
+                    conexao.commit()
+                    registro['linhas'] = len(lote)
+            except Error as e:
+                conexao.rollback()
+                return confirmadas, f"lote {numero}: {e}"
+            confirmadas += len(lote)
+            if progresso:
+                progresso(confirmadas)
+        return confirmadas, None
+    finally:
+        cursor.close()
+
+
+# ============ CARGA VIA LOAD DATA LOCAL INFILE ============
+_ESCAPES_LOAD = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r", "\0": "\\0"})
+
+
+def _campo_load(valor):
+    """Formato padrão do LOAD DATA: tab entre campos, \\N para NULL"""
+    if valor is None:
+        return "\\N"
+    if isinstance(valor, bool):
+        return "1" if valor else "0"
+    if isinstance(valor, datetime.datetime):
+        return valor.isoformat(sep=" ")
+    if isinstance(valor, (datetime.date, datetime.time)):
+        return valor.isoformat()
+    return str(valor).translate(_ESCAPES_LOAD)
+
+
+def load_data_permitido(conexao):
+    """O servidor precisa de local_infile=ON para aceitar LOAD DATA LOCAL"""
+    cursor = conexao.cursor()
+    try:
+        cursor.execute("SELECT @@GLOBAL.local_infile")
+        return bool(int(cursor.fetchone()[0]))
+    except Error:
+        return False
+    finally:
+        cursor.close()
+
+
+def carregar_load_data(banco, tabela, colunas, lotes, conversores, progresso=None):
+    """Carrega cada lote com LOAD DATA LOCAL INFILE a partir de um arquivo temporário
+
+    Usa conexão dedicada com allow_local_infile (o pool não habilita). Com LOCAL,
+    erros de conversão e chaves duplicadas viram avisos em vez de abortar: as
+    linhas são descartadas ou ajustadas. Por isso os avisos de cada lote são lidos.
+    Retorna (linhas confirmadas, erro ou None, avisos) com avisos =
+    {'descartadas': n, 'total': n, 'exemplos': [(nível, código, mensagem), ...]}.
+    """
+    lista = ", ".join(f"`{c}`" for c in colunas)
+    sql = (f"LOAD DATA LOCAL INFILE %s INTO TABLE `{tabela}` CHARACTER SET utf8mb4 "
+           f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({lista})")
+    descritor, caminho = tempfile.mkstemp(prefix="importacao_", suffix=".tsv")
+    os.close(descritor)
+    conexao = criar_conexao(banco, allow_local_infile=True)
+    cursor = conexao.cursor()
+    confirmadas = 0
+    avisos = {'descartadas': 0, 'total': 0, 'exemplos': []}
+    try:
+        for numero, lote in enumerate(lotes, 1):
+            with open(caminho, 'w', encoding='utf-8', newline='') as saida:
+                for linha in lote:
+                    saida.write("\t".join(_campo_load(v) for v in _linha_mapeada(linha, conversores)))
+                    saida.write("\n")
+            try:
+                with historico.medir("importacao", banco, sql) as registro:
+                    cursor.execute(sql, (caminho,))
+                    carregadas = cursor.rowcount
+                    qtd_avisos = cursor.warning_count or 0
+                    if qtd_avisos and len(avisos['exemplos']) < MAX_AVISOS_EXIBIDOS:
+                        # Antes do commit: os avisos são os da última instrução
+                        cursor.execute(f"SHOW WARNINGS LIMIT {MAX_AVISOS_EXIBIDOS - len(avisos['exemplos'])}")
+                        avisos['exemplos'].extend(tuple(aviso) for aviso in cursor.fetchall())
+                    conexao.commit()
+                    registro['linhas'] = carregadas
+                    registro['bytes'] = os.path.getsize(caminho)
+            except Error as e:
+                conexao.rollback()
+                return confirmadas, f"lote {numero}: {e}", avisos
+            confirmadas += carregadas
+            # Linhas do arquivo que não entraram (ex.: chave duplicada ignorada)
+            avisos['descartadas'] += max(len(lote) - carregadas, 0)
+            avisos['total'] += qtd_avisos
+            if progresso:
+                progresso(confirmadas)
+        return confirmadas, None, avisos
+    finally:
+        cursor.close()
+        conexao.close()
+        os.remove(caminho)
+
+
+# ============ INTERFACE STREAMLIT ============
+def exibir_avisos_load_data(avisos):
+    """Linhas descartadas e valores ajustados pelo LOAD DATA (que não aborta nesses casos)"""
+    st.warning(f"⚠️ LOAD DATA não interrompe em erros: {avisos['descartadas']:,} linha(s) do arquivo não "
+               f"foram inseridas e o servidor gerou {avisos['total']:,} aviso(s) (chave duplicada, valor "
+               "convertido ou truncado). Desmarque LOAD DATA para parar no primeiro erro.")
+    if avisos['exemplos']:
+        st.dataframe(pd.DataFrame(avisos['exemplos'], columns=["Nível", "Código", "Mensagem"]),
+                     use_container_width=True, hide_index=True)
+        if avisos['total'] > len(avisos['exemplos']):
+            st.caption(f"Mostrando os primeiros {len(avisos['exemplos'])} avisos.")
+
+
+def exibir_importacao(banco, tabela, estrutura):
+    """Upload de CSV/XLSX, mapeamento para as colunas do DESCRIBE e carga em lotes"""
+    arquivo = st.file_uploader("Arquivo CSV ou Excel", type=["csv", "txt", "xlsx", "xlsm"],
+                               key=f"importacao_arquivo_{tabela}")
+    if arquivo is None:
+        st.caption("A primeira linha do arquivo deve ter os nomes das colunas.")
+        return
+
+    codificacao = "utf-8-sig"
+    if not arquivo.name.lower().endswith((".xlsx", ".xlsm")):
+        codificacao = st.selectbox("Codificação do CSV", CODIFICACOES, key="importacao_codificacao")
+    try:
+        cabecalho, total, primeiras = ler_previa(arquivo, arquivo.name, codificacao)
+    except (UnicodeDecodeError, csv.Error, OSError, ValueError, KeyError) as e:
+        st.error(f"❌ Não foi possível ler o arquivo: {e}")
+        return
+    if not cabecalho:
+        st.warning("⚠️ Arquivo vazio.")
+        return
+
+    st.markdown("**Prévia do arquivo**")
+    st.dataframe(pd.DataFrame([list(l) + [None] * (len(cabecalho) - len(l)) for l in primeiras],
+                              columns=cabecalho), use_container_width=True, hide_index=True)
+    if total:
+        st.caption(f"≈ {total:,} linha(s) de dados")
+
+    # Mapeamento coluna da tabela <- coluna do arquivo
+    st.markdown("**Mapeamento de colunas**")
+    sugestao = mapear_colunas(cabecalho, estrutura)
+    opcoes = [IGNORAR] + [c for c in cabecalho if c]
+    mapa = {}
+    grade = st.columns(3)
+    for i, coluna in enumerate(estrutura):
+        nome = coluna[0]
+        auto_inc = 'auto_increment' in str(coluna[5]).lower()
+        padrao = sugestao[nome] if sugestao[nome] else IGNORAR
+        with grade[i % 3]:
+            escolha = st.selectbox(
+                f"{nome} ({coluna[1]}){' *' if coluna[2] == 'NO' and coluna[4] is None and not auto_inc else ''}",
+                opcoes, index=opcoes.index(padrao), key=f"importacao_mapa_{tabela}_{nome}"
+            )
+        mapa[nome] = None if escolha == IGNORAR else escolha
+
+    obrigatorias = [c[0] for c in estrutura if c[2] == 'NO' and c[4] is None
+                    and 'auto_increment' not in str(c[5]).lower() and not mapa[c[0]]]
+    if obrigatorias:
+        st.warning(f"⚠️ Colunas obrigatórias sem origem: {', '.join(obrigatorias)}")
+    if not any(mapa.values()):
+        st.info("Mapeie ao menos uma coluna para importar.")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        tamanho_lote = st.number_input("Linhas por lote (um commit por lote)", 100, 100_000,
+                                       TAMANHO_LOTE_IMPORTACAO, step=500, key="importacao_lote")
+    with col2:
+        usar_load_data = st.checkbox("Usar LOAD DATA LOCAL INFILE (mais rápido, exige local_infile no servidor)",
+                                     key="importacao_load_data")
+
+    if not st.button("📥 Importar", type="primary", use_container_width=True, key="btn_importar"):
+        return
+
+    aviso = st.empty()
+
+    def progresso(linhas):
+        if total:
+            aviso.progress(min(linhas / total, 1.0), text=f"⏳ {linhas:,} de {total:,} linhas")
+        else:
+            aviso.caption(f"⏳ {linhas:,} linha(s) importada(s)...")
+
+    inicio = time.perf_counter()
+    try:
+        with abrir_arquivo(arquivo, arquivo.name, int(tamanho_lote), codificacao) as (cabecalho, _, lotes):
+            colunas, conversores = _conversores(cabecalho, estrutura, mapa)
+            if usar_load_data:
+                with obter_conexao(banco) as conexao:
+                    permitido = load_data_permitido(conexao)
+                if not permitido:
+                    st.warning("⚠️ O servidor está com local_infile desativado; usando INSERT em lotes.")
+                    usar_load_data = False
+            avisos = None
+            if usar_load_data:
+                confirmadas, erro, avisos = carregar_load_data(banco, tabela, colunas, lotes, conversores, progresso)
+            else:
+                with obter_conexao(banco) as conexao:
+                    confirmadas, erro = carregar_executemany(conexao, tabela, colunas, lotes, conversores, progresso)
+    except Error as e:
+        st.error(f"❌ Erro na importação: {e}")
+        return
+    except (UnicodeDecodeError, csv.Error, OSError) as e:
+        st.error(f"❌ Erro ao ler o arquivo: {e}")
+        return
+    aviso.empty()
+
+    tempo = time.perf_counter() - inicio
+    if erro:
+        st.error(f"❌ Importação interrompida no {erro}")
+        if confirmadas:
+            st.info(f"{confirmadas:,} linha(s) dos lotes anteriores já foram confirmadas.")
+    else:
+        st.success(f"✅ {confirmadas:,} linha(s) importada(s) em `{tabela}` em {tempo:.1f}s "
+                   f"({confirmadas / tempo if tempo else 0:,.0f} linhas/s)")
+    if avisos and (avisos['descartadas'] or avisos['total']):
+        exibir_avisos_load_data(avisos)
+    return confirmadas
@@ -0,0 +1,234 @@
+# modelo_consulta.py - Representação tipada das consultas do construtor visual e compilação para SQL
+import re
+from functools import lru_cache
+from typing import NamedTuple, Optional, Tuple, Union
+
+# ============ CONFIGURAÇÃO ============
+MAX_COMPILACOES = 512     # cláusulas/consultas compiladas mantidas em memória
+
+
+# ============ MODELO ============
+# Tuplas imutáveis: comparáveis e com hash estrutural, servem direto de chave de cache
+
+class Agregacao(NamedTuple):
+    funcao: str
+    campo: str
+    alias: str
+
+
+class Juncao(NamedTuple):
+    tipo: str
+    tabela1: str
+    coluna1: str
+    tabela2: str
+    coluna2: str
+
+
+class Condicao(NamedTuple):
+    campo: str
+    operador: str
+    valor: object = None          # tupla para IN / NOT IN
+
+
+class Grupo(NamedTuple):
+    logica: str                   # 'AND' ou 'OR'
+    itens: Tuple[Union['Condicao', 'Grupo'], ...]
+
+
+class Ordenacao(NamedTuple):
+    campo: str
+    direcao: str = 'ASC'
+
+
+class Consulta(NamedTuple):
+    tabelas: Tuple[str, ...]
+    campos: Tuple[str, ...] = ()
+    agregacoes: Tuple[Agregacao, ...] = ()
+    juncoes: Tuple[Juncao, ...] = ()
+    filtro: Optional[Grupo] = None
+    ordenacao: Tuple[Ordenacao, ...] = ()
+    limite: Optional[int] = None
+
+
+# ============ CONSTRUÇÃO A PARTIR DO CONSTRUTOR VISUAL ============
+# Só dígitos ASCII: isdigit() aceita '²' e lstrip('-') aceita '--5', que int() rejeita
+_RE_INTEIRO = re.compile(r"-?[0-9]+")
+_RE_DECIMAL = re.compile(r"-?[0-9]+\.[0-9]+")
+
+
+def valor_parametro(valor):
+    """Converte o texto digitado no critério para o tipo do parâmetro"""
+    if not isinstance(valor, str):
+        return valor
+    if valor.lower() == 'null':
+        return None
+    if _RE_INTEIRO.fullmatch(valor):
+        return int(valor)
+    if _RE_DECIMAL.fullmatch(valor):
+        return float(valor)
+    return valor
+
+
+def condicao_de_criterio(criterio):
+    campo = criterio.get('campo')
+    operador = criterio.get('operador', '=')
+    valor = criterio.get('valor')
+    if operador in ("IN", "NOT IN"):
+        # Para IN, espera-se valores separados por vírgula
+        valor = tuple(valor_parametro(v.strip()) for v in (valor or "").split(','))
+    elif operador in ("IS NULL", "IS NOT NULL"):
+        valor = None
+    else:
+        valor = valor_parametro(valor)
+        if operador == "LIKE" and not str(valor).startswith("%"):
+            valor = f"%{valor}%"
+    return Condicao(campo, operador, valor)
+
+
+def arvore_criterios(criterios):
+    """Monta a árvore AND/OR a partir da lista de critérios da tela
+
+    A lógica de cada critério liga-o ao anterior, com AND precedendo OR:
+    `a AND b OR c` vira OR(AND(a, b), c).
+    """
+    if not criterios:
+        return None
+    ramos = [[condicao_de_criterio(criterios[0])]]
+    for criterio in criterios[1:]:
+        if criterio.get('logica', 'AND') == 'OR':
+            ramos.append([])
+        ramos[-1].append(condicao_de_criterio(criterio))
+    grupos = tuple(Grupo('AND', tuple(ramo)) if len(ramo) > 1 else ramo[0] for ramo in ramos)
+    if len(grupos) == 1:
+        return grupos[0] if isinstance(grupos[0], Grupo) else Grupo('AND', grupos)
+    return Grupo('OR', grupos)
+
+
+def montar(tabelas_selecionadas, campos_selecionados, criterios=None, ordenacao=None, limite=None,
+           joins=None, agregacoes=None):
+    """Consulta tipada a partir das seleções do usuário (mesmos argumentos de gerar_consulta_sql)"""
+    return Consulta(
+        tabelas=tuple(tabelas_selecionadas),
+        campos=tuple(campos_selecionados or ()),
+        agregacoes=tuple(
+            Agregacao(agg['funcao'], agg['campo'], agg.get('alias', f"{agg['funcao']}_{agg['campo'].split('.')[-1]}"))
+            for agg in agregacoes or ()
+        ),
+        juncoes=tuple(
+            Juncao(j.get('tipo', 'INNER JOIN'), j['tabela1'], j['coluna1'], j['tabela2'], j['coluna2'])
+            for j in joins or ()
+        ),
+        filtro=arvore_criterios(criterios),
+        ordenacao=tuple(Ordenacao(o.get('campo'), o.get('direcao', 'ASC')) for o in ordenacao or ()),
+        limite=int(limite) if limite else None
+    )
+
+
+def de_config(config):
+    """Consulta tipada a partir do st.session_state.consulta_config"""
+    return montar(
+        config['tabelas_selecionadas'],
+        config['campos_selecionados'],
+        criterios=config.get('criterios', []),
+        ordenacao=config.get('ordenacao', []),
+        limite=config.get('limite'),
+        joins=config.get('joins', []),
+        agregacoes=config.get('agregacoes', [])
+    )
+
+
+# ============ COMPILAÇÃO ============
+# Cada cláusula é memoizada separadamente: mudar só o WHERE reaproveita SELECT, FROM etc.
+
+@lru_cache(maxsize=MAX_COMPILACOES)
+def compilar_select(campos, agregacoes):
+    if not campos and not agregacoes:
+        return "SELECT *"
+    itens = list(campos)
+    for agg in agregacoes:
+        if agg.funcao == "COUNT(DISTINCT)":
+            itens.append(f"COUNT(DISTINCT {agg.campo}) AS {agg.alias}")
+        else:
+            itens.append(f"{agg.funcao}({agg.campo}) AS {agg.alias}")
+    return "SELECT " + ", ".join(itens)
+
+
+@lru_cache(maxsize=MAX_COMPILACOES)
+def compilar_from(tabelas, juncoes):
+    if len(tabelas) == 1:
+        return f"FROM {tabelas[0]}"
+    if not juncoes:
+        # JOIN simples (CROSS JOIN)
+        return "FROM " + ", ".join(tabelas)
+    partes = [tabelas[0]]
+    for j in juncoes:
+        partes.append(f"{j.tipo} {j.tabela2} ON {j.tabela1}.{j.coluna1} = {j.tabela2}.{j.coluna2}")
+    return "FROM " + " ".join(partes)
+
+
+def _compilar_condicao(condicao):
+    if condicao.operador in ("IS NULL", "IS NOT NULL"):
+        return f"{condicao.campo} {condicao.operador}", ()
+    if condicao.operador in ("IN", "NOT IN"):
+        return f"{condicao.campo} {condicao.operador} ({', '.join(['%s'] * len(condicao.valor))})", condicao.valor
+    return f"{condicao.campo} {condicao.operador} %s", (condicao.valor,)
+
+
+def _compilar_no(no, raiz=False):
+    if isinstance(no, Condicao):
+        return _compilar_condicao(no)
+    partes, params = [], []
+    for item in no.itens:
+        texto, valores = _compilar_no(item)
+        partes.append(texto)
+        params.extend(valores)
+    texto = f" {no.logica} ".join(partes)
+    if not raiz and len(partes) > 1:
+        texto = f"({texto})"
+    return texto, tuple(params)
+
+
+@lru_cache(maxsize=MAX_COMPILACOES)
+def compilar_where(filtro):
+    """Retorna (cláusula WHERE, parâmetros); valores sempre como %s"""
+    if filtro is None or not filtro.itens:
+        return "", ()
+    texto, params = _compilar_no(filtro, raiz=True)
+    return "WHERE " + texto, params
+
+
+@lru_cache(maxsize=MAX_COMPILACOES)
+def compilar_group(campos, agregacoes):
+    if not agregacoes or not campos:
+        return ""
+    # Agrupa por campos que não estão agregados
+    agregados = {agg.campo for agg in agregacoes}
+    nao_agregados = [c for c in campos if c not in agregados]
+    return "GROUP BY " + ", ".join(nao_agregados) if nao_agregados else ""
+
+
+@lru_cache(maxsize=MAX_COMPILACOES)
+def compilar_order(ordenacao):
+    if not ordenacao:
+        return ""
+    return "ORDER BY " + ", ".join(f"{o.campo} {o.direcao}" for o in ordenacao)
+
+
+@lru_cache(maxsize=MAX_COMPILACOES)
+def _compilar(consulta):
+    where, params = compilar_where(consulta.filtro)
+    partes = [
+        compilar_select(consulta.campos, consulta.agregacoes),
+        compilar_from(consulta.tabelas, consulta.juncoes),
+        where,
+        compilar_group(consulta.campos, consulta.agregacoes),
+        compilar_order(consulta.ordenacao),
+        f"LIMIT {consulta.limite}" if consulta.limite else ""
+    ]
+    return " ".join(p for p in partes if p), params
+
+
+def compilar(consulta):
+    """Compila a consulta em (sql, params) — memoizado pelo hash estrutural da consulta"""
+    sql, params = _compilar(consulta)
+    return sql, list(params)
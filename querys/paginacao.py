@@ -0,0 +1,310 @@
+# paginacao.py - Visualizador de resultados paginado no servidor (keyset com OFFSET de reserva)
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+import streamlit as st
+import pandas as pd
+from mysql.connector import Error
+
+from conexao_pool import obter_conexao
+from cache_resultados import normalizar_sql
+from execucao import estimar_bytes
+import catalogo_schema
+import historico
+
+# ============ CONFIGURAÇÃO ============
+TAMANHO_PAGINA = 50
+
+# Threads que buscam a próxima página enquanto o usuário lê a atual
+_executor_prefetch = ThreadPoolExecutor(max_workers=4, thread_name_prefix="prefetch_pagina")
+
+_RE_LIMIT_FINAL = re.compile(r"\bLIMIT\s+\d+(\s*(,|OFFSET)\s*\d+)?\s*$", re.IGNORECASE)
+
+
+# ============ FONTES DE DADOS ============
+def _citar(identificador):
+    return "`" + str(identificador).replace("`", "``") + "`"
+
+
+def fonte_tabela(tabela):
+    """Fonte paginável a partir de uma tabela"""
+    return {'tabela': tabela}
+
+
+def fonte_consulta(sql):
+    """Fonte paginável a partir de um SELECT arbitrário
+
+    Sem comentários nem ';' final: o LIMIT/OFFSET anexado não pode cair num `-- ...`.
+    """
+    return {'sql': normalizar_sql(sql)}
+
+
+def _from(fonte):
+    if 'tabela' in fonte:
+        return _citar(fonte['tabela'])
+    return f"({fonte['sql']}) AS consulta_paginada"
+
+
+def colunas_chave_primaria(banco, tabela):
+    """Colunas da PRIMARY KEY da tabela, na ordem da tabela (via catálogo)"""
+    return [coluna[0] for coluna in catalogo_schema.obter_estrutura(banco, tabela) if coluna[3] == 'PRI']
+
+
+# ============ BUSCA DE PÁGINAS ============
+def sql_pagina(fonte, tamanho, chave=None, descendente=False,
+               apos=None, antes=None, inicio=None, offset=0):
+    """SQL de uma página: retorna (sql, params, inverter)
+
+    `inverter` indica que as linhas vêm de trás para frente (página anterior no keyset).
+    """
+    params = []
+    inverter = False
+    if chave:
+        tupla = "(" + ", ".join(_citar(c) for c in chave) + ")"
+        marcadores = "(" + ", ".join(["%s"] * len(chave)) + ")"
+        maior, menor = ("<", ">") if descendente else (">", "<")
+        where = ""
+        if apos is not None:
+            where = f"WHERE {tupla} {maior} {marcadores}"
+            params = list(apos)
+        elif antes is not None:
+            # Página anterior: lê de trás para frente e inverte
+            where = f"WHERE {tupla} {menor} {marcadores}"
+            params = list(antes)
+            inverter = True
+        elif inicio is not None:
+            where = f"WHERE {tupla} {maior}= {marcadores}"
+            params = list(inicio)
+
+        direcao = "DESC" if descendente != inverter else "ASC"
+        ordem = ", ".join(f"{_citar(c)} {direcao}" for c in chave)
+        sql = f"SELECT * FROM {_from(fonte)} {where} ORDER BY {ordem} LIMIT {int(tamanho)}"
+    elif 'sql' in fonte and not _RE_LIMIT_FINAL.search(fonte['sql']):
+        # Sem LIMIT próprio: anexa direto para preservar o ORDER BY do usuário
+        sql = f"{fonte['sql']} LIMIT {int(tamanho)} OFFSET {int(offset)}"
+    else:
+        sql = f"SELECT * FROM {_from(fonte)} LIMIT {int(tamanho)} OFFSET {int(offset)}"
+    return sql, params, inverter
+
+
+def buscar_pagina(banco, fonte, tamanho, chave=None, descendente=False,
+                  apos=None, antes=None, inicio=None, offset=0, registrar=True):
+    """Busca uma página de resultados
+
+    Com `chave` (colunas que ordenam de forma única) usa keyset: `apos`/`antes`
+    recebem a tupla-limite da página vizinha e `inicio` a primeira chave da página.
+    Sem chave usa LIMIT/OFFSET. Retorna dict com df, primeira e ultima chave.
+    Com registrar=False (pré-busca) a leitura não é gravada no histórico.
+    """
+    sql, params, inverter = sql_pagina(fonte, tamanho, chave, descendente, apos, antes, inicio, offset)
+
+    medicao = historico.medir("paginacao", banco, sql) if registrar else nullcontext({})
+    with obter_conexao(banco) as conexao, medicao as registro:
+        cursor = conexao.cursor()
+        cursor.execute(sql, params or None)
+        linhas = cursor.fetchall()
+        colunas = [desc[0] for desc in cursor.description]
+        cursor.close()
+        registro['linhas'] = len(linhas)
+        registro['bytes'] = estimar_bytes(linhas)
+
+    if inverter:
+        linhas.reverse()
+
+    primeira = ultima = None
+    if chave and linhas:
+        indices = [colunas.index(c) for c in chave]
+        primeira = tuple(linhas[0][i] for i in indices)
+        ultima = tuple(linhas[-1][i] for i in indices)
+
+    return {
+        'df': pd.DataFrame(linhas, columns=colunas),
+        'primeira': primeira,
+        'ultima': ultima
+    }
+
+
+def buscar_inicio_pagina(banco, fonte, tamanho, chave, pagina, descendente=False):
+    """Primeira chave da página N, buscada só no índice (sem trazer as linhas)"""
+    colunas = ", ".join(_citar(c) for c in chave)
+    direcao = "DESC" if descendente else "ASC"
+    ordem = ", ".join(f"{_citar(c)} {direcao}" for c in chave)
+    offset = (int(pagina) - 1) * int(tamanho)
+    with obter_conexao(banco) as conexao:
+        cursor = conexao.cursor()
+        cursor.execute(f"SELECT {colunas} FROM {_from(fonte)} ORDER BY {ordem} LIMIT 1 OFFSET {offset}")
+        linha = cursor.fetchone()
+        cursor.close()
+    return tuple(linha) if linha else None
+
+
+def contar_linhas(banco, fonte, exato=False):
+    """Total de linhas: estimativa do INFORMATION_SCHEMA para tabelas ou COUNT(*) exato"""
+    with obter_conexao(banco) as conexao:
+        cursor = conexao.cursor()
+        if 'tabela' in fonte and not exato:
+            cursor.execute("""
+                SELECT TABLE_ROWS FROM INFORMATION_SCHEMA.TABLES
+                WHERE TABLE_SCHEMA = %s AND TABLE_NAME = %s
+            """, (banco, fonte['tabela']))
+        else:
+            cursor.execute(f"SELECT COUNT(*) FROM {_from(fonte)}")
+        linha = cursor.fetchone()
+        cursor.close()
+    return int(linha[0]) if linha and linha[0] is not None else None
+
+
+# ============ INTERFACE STREAMLIT ============
+def _requisicao_pagina(banco, fonte, tamanho, chave, descendente, requisicao, pagina, registrar=True):
+    """Resolve a requisição de navegação numa chamada a buscar_pagina
+
+    A pré-busca passa registrar=False: só o que o usuário pede entra no histórico.
+    """
+    tipo, valor = requisicao
+    if not chave:
+        return buscar_pagina(banco, fonte, tamanho, offset=(pagina - 1) * tamanho, registrar=registrar)
+    if tipo == 'apos':
+        return buscar_pagina(banco, fonte, tamanho, chave, descendente, apos=valor, registrar=registrar)
+    if tipo == 'antes':
+        return buscar_pagina(banco, fonte, tamanho, chave, descendente, antes=valor, registrar=registrar)
+    if pagina > 1:
+        inicio = buscar_inicio_pagina(banco, fonte, tamanho, chave, pagina, descendente)
+        if inicio is None:
+            # Página além do fim dos dados
+            return {'df': pd.DataFrame(), 'primeira': None, 'ultima': None}
+        return buscar_pagina(banco, fonte, tamanho, chave, descendente, inicio=inicio, registrar=registrar)
+    return buscar_pagina(banco, fonte, tamanho, chave, descendente, registrar=registrar)
+
+
+def exibir_paginado(chave_estado, banco, fonte, chave=None, descendente=False,
+                    tamanho=TAMANHO_PAGINA, altura=None):
+    """Mostra uma grade paginada com navegação anterior/próxima/ir para página
+
+    Retorna o DataFrame da página atual.
+    """
+    assinatura = (banco, tuple(sorted(fonte.items())), tuple(chave or ()), descendente, tamanho)
+    nome_estado = f"paginacao_{chave_estado}"
+    estado = st.session_state.get(nome_estado)
+    if not estado or estado['assinatura'] != assinatura:
+        estado = {
+            'assinatura': assinatura,
+            'pagina': 1,
+            'requisicao': ('pagina', 1),
+            'resultado': None,
+            'prefetch': None,
+            'total': None,
+            'total_exato': False
+        }
+        st.session_state[nome_estado] = estado
+
+    # Página atual: usa a pré-busca se ela corresponde à navegação pedida
+    if estado['resultado'] is None:
+        try:
+            prefetch = estado['prefetch']
+            if prefetch and prefetch[0] == (estado['requisicao'], estado['pagina']):
+                estado['resultado'] = prefetch[1].result()
+            else:
+                estado['resultado'] = _requisicao_pagina(
+                    banco, fonte, tamanho, chave, descendente, estado['requisicao'], estado['pagina']
+                )
+        except Error as e:
+            st.error(f"❌ Erro ao carregar página: {e}")
+            return pd.DataFrame()
+        estado['prefetch'] = None
+
+    resultado = estado['resultado']
+    df = resultado['df']
+    pagina = estado['pagina']
+    tem_proxima = len(df) == tamanho
+
+    # Pré-busca da próxima página em segundo plano
+    if tem_proxima and estado['prefetch'] is None:
+        proxima = ('apos', resultado['ultima']) if chave else ('pagina', pagina + 1)
+        estado['prefetch'] = (
+            (proxima, pagina + 1),
+            _executor_prefetch.submit(
+                _requisicao_pagina, banco, fonte, tamanho, chave, descendente, proxima, pagina + 1, False
+            )
+        )
+
+    if estado['total'] is None:
+        try:
+            estado['total'] = contar_linhas(banco, fonte) if 'tabela' in fonte else None
+        except Error:
+            estado['total'] = None
+
+    # Grade
+    if df.empty:
+        st.info("📭 Nenhum registro nesta página")
+    else:
+        if altura:
+            st.dataframe(df, use_container_width=True, height=altura)
+        else:
+            st.dataframe(df, use_container_width=True)
+
+    # Navegação
+    total = estado['total']
+    total_paginas = max(1, -(-total // tamanho)) if total is not None else None
+    col_nav1, col_nav2, col_nav3, col_nav4, col_nav5, col_nav6 = st.columns([1, 1, 2, 1, 1, 1])
+
+    def navegar(requisicao, nova_pagina):
+        estado['requisicao'] = requisicao
+        estado['pagina'] = nova_pagina
+        estado['resultado'] = None
+        st.rerun()
+
+    with col_nav1:
+        if st.button("⏮️", key=f"{nome_estado}_primeira", disabled=pagina == 1, use_container_width=True):
+            navegar(('pagina', 1), 1)
+    with col_nav2:
+        if st.button("◀️", key=f"{nome_estado}_anterior", disabled=pagina == 1, use_container_width=True):
+            if chave and resultado['primeira'] is not None:
+                navegar(('antes', resultado['primeira']), pagina - 1)
+            else:
+                navegar(('pagina', pagina - 1), pagina - 1)
+    with col_nav3:
+        prefixo = "≈ " if total is not None and not estado['total_exato'] else ""
+        if total_paginas:
+            st.markdown(f"<div style='text-align: center;'>Página <b>{pagina}</b> de {prefixo}{total_paginas:,}</div>",
+                        unsafe_allow_html=True)
+        else:
+            st.markdown(f"<div style='text-align: center;'>Página <b>{pagina}</b></div>", unsafe_allow_html=True)
+    with col_nav4:
+        if st.button("▶️", key=f"{nome_estado}_proxima", disabled=not tem_proxima, use_container_width=True):
+            if chave:
+                navegar(('apos', resultado['ultima']), pagina + 1)
+            else:
+                navegar(('pagina', pagina + 1), pagina + 1)
+    with col_nav5:
+        destino = st.number_input("Página", min_value=1, max_value=total_paginas or None,
+                                  value=pagina, key=f"{nome_estado}_destino",
+                                  label_visibility="collapsed")
+    with col_nav6:
+        if st.button("Ir", key=f"{nome_estado}_ir", use_container_width=True):
+            navegar(('pagina', int(destino)), int(destino))
+
+    # Informações
+    col_info1, col_info2 = st.columns([3, 1])
+    with col_info1:
+        if total is not None:
+            rotulo = "registros totais" if estado['total_exato'] else "registros totais (estimativa)"
+            st.info(f"**{total:,}** {rotulo} | **{len(df.columns)}** colunas | "
+                    f"{'keyset' if chave else 'OFFSET'} • {tamanho} por página")
+        else:
+            st.info(f"**{len(df.columns)}** colunas | {'keyset' if chave else 'OFFSET'} • {tamanho} por página")
+    with col_info2:
+        if not estado['total_exato'] and st.button("🔢 Contar exato", key=f"{nome_estado}_contar"):
+            try:
+                estado['total'] = contar_linhas(banco, fonte, exato=True)
+                estado['total_exato'] = True
+                st.rerun()
+            except Error as e:
+                st.error(f"❌ Erro ao contar: {e}")
+
+    return df
+
+
+def limpar_paginacao(chave_estado):
+    """Descarta o estado da grade (ex.: após alterar os dados)"""
+    st.session_state.pop(f"paginacao_{chave_estado}", None)
@@ -0,0 +1,304 @@
+# plano_execucao.py - Plano de execução (EXPLAIN FORMAT=JSON / EXPLAIN ANALYZE) com alertas
+import json
+import re
+
+import streamlit as st
+import pandas as pd
+from mysql.connector import Error
+
+from conexao_pool import obter_conexao
+from execucao import ExecucaoControlada, TIMEOUT_PADRAO
+from cache_resultados import normalizar_sql
+
+# ============ ALERTAS ============
+VARREDURA = "🔴 varredura completa"
+VARREDURA_INDICE = "🟠 varredura de índice inteiro"
+JUNCAO_SEM_INDICE = "🔴 junção sem índice"
+FILESORT = "🟠 filesort"
+TEMPORARIA = "🟠 tabela temporária"
+ESTIMATIVA_RUIM = "🟡 estimativa ≠ real"
+
+_OPERACOES_JSON = {
+    'ordering_operation': "Ordenação (ORDER BY)",
+    'grouping_operation': "Agrupamento (GROUP BY)",
+    'duplicates_removal': "Remoção de duplicatas (DISTINCT)",
+    'windowing': "Funções de janela",
+    'buffer_result': "Buffer de resultado",
+    'union_result': "UNION",
+    'materialized_from_subquery': "Subconsulta materializada"
+}
+
+_RE_LINHA_ANALYZE = re.compile(
+    r"^(?P<recuo>\s*)-> (?P<operacao>.*?)"
+    r"(?:\s+\(cost=(?P<custo>[\d.e+]+)(?:\.\.[\d.e+]+)? rows=(?P<estimadas>[\d.e+]+)\))?"
+    r"(?:\s+\((?:actual time=(?P<inicio>[\d.e+]+)\.\.(?P<fim>[\d.e+]+) "
+    r"rows=(?P<reais>[\d.e+]+) loops=(?P<loops>\d+)|never executed)\))?\s*$"
+)
+
+
+def _numero(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return None
+
+
+def _no(nivel, operacao, tabela=None, acesso=None, indice=None, estimadas=None,
+        reais=None, custo=None, tempo=None, alertas=None):
+    return {
+        'nivel': nivel,
+        'operacao': operacao,
+        'tabela': tabela,
+        'acesso': acesso,
+        'indice': indice,
+        'linhas_estimadas': estimadas,
+        'linhas_reais': reais,
+        'custo': custo,
+        'tempo_ms': tempo,
+        'alertas': alertas or []
+    }
+
+
+# ============ EXPLAIN FORMAT=JSON ============
+def _no_tabela(tabela, nivel):
+    acesso = tabela.get('access_type')
+    alertas = []
+    if acesso == 'ALL':
+        # Sem índice utilizável; com join buffer é uma junção que varre a tabela a cada combinação
+        alertas.append(JUNCAO_SEM_INDICE if tabela.get('using_join_buffer') else VARREDURA)
+    elif acesso == 'index':
+        alertas.append(VARREDURA_INDICE)
+    custo = tabela.get('cost_info', {})
+    return _no(
+        nivel,
+        f"Tabela {tabela.get('table_name', '?')}",
+        tabela=tabela.get('table_name'),
+        acesso=acesso,
+        indice=tabela.get('key'),
+        estimadas=_numero(tabela.get('rows_examined_per_scan')),
+        custo=_numero(custo.get('prefix_cost') or custo.get('read_cost')),
+        alertas=alertas
+    )
+
+
+def _percorrer_json(no, nivel, nos):
+    """Formato JSON tradicional (explain_json_format_version=1)"""
+    if isinstance(no, list):
+        for item in no:
+            _percorrer_json(item, nivel, nos)
+        return
+    if not isinstance(no, dict):
+        return
+    for chave, valor in no.items():
+        if chave == 'query_block' and isinstance(valor, dict):
+            custo = _numero(valor.get('cost_info', {}).get('query_cost'))
+            nos.append(_no(nivel, f"Bloco SELECT #{valor.get('select_id', '?')}", custo=custo))
+            _percorrer_json(valor, nivel + 1, nos)
+        elif chave == 'table' and isinstance(valor, dict):
+            nos.append(_no_tabela(valor, nivel))
+            _percorrer_json(valor, nivel + 1, nos)
+        elif chave in _OPERACOES_JSON and isinstance(valor, dict):
+            alertas = []
+            if valor.get('using_filesort'):
+                alertas.append(FILESORT)
+            if valor.get('using_temporary_table'):
+                alertas.append(TEMPORARIA)
+            nos.append(_no(nivel, _OPERACOES_JSON[chave], alertas=alertas))
+            _percorrer_json(valor, nivel + 1, nos)
+        elif isinstance(valor, (dict, list)):
+            _percorrer_json(valor, nivel, nos)
+
+
+def _percorrer_json_v2(no, nivel, nos):
+    """Formato JSON em árvore de iteradores (explain_json_format_version=2)"""
+    operacao = no.get('operation', '?')
+    acesso = no.get('access_type')
+    alertas = []
+    if acesso == 'table':
+        alertas.append(VARREDURA)
+    elif acesso == 'index' and not no.get('index_access_type'):
+        alertas.append(VARREDURA_INDICE)
+    if acesso == 'sort' or operacao.startswith('Sort'):
+        alertas.append(FILESORT)
+    if acesso in ('materialize', 'temp_table_aggregate') or 'temporary' in operacao.lower():
+        alertas.append(TEMPORARIA)
+    if no.get('join_algorithm') == 'hash':
+        alertas.append(JUNCAO_SEM_INDICE)
+    nos.append(_no(
+        nivel, operacao,
+        tabela=no.get('table_name'),
+        acesso=acesso,
+        indice=no.get('index_name'),
+        estimadas=_numero(no.get('estimated_rows')),
+        custo=_numero(no.get('estimated_total_cost')),
+        alertas=alertas
+    ))
+    for filho in no.get('inputs', []):
+        _percorrer_json_v2(filho, nivel + 1, nos)
+
+
+def analisar_plano_json(plano):
+    """Converte o JSON do EXPLAIN em lista de nós (nível, operação, linhas, custo, alertas)"""
+    nos = []
+    if 'query_block' in plano:
+        _percorrer_json(plano, 0, nos)
+    else:
+        _percorrer_json_v2(plano, 0, nos)
+    return nos
+
+
+# ============ EXPLAIN ANALYZE ============
+def analisar_plano_analyze(texto):
+    """Converte a árvore em texto do EXPLAIN ANALYZE em lista de nós"""
+    nos = []
+    for linha in texto.splitlines():
+        encontrado = _RE_LINHA_ANALYZE.match(linha)
+        if not encontrado:
+            continue
+        operacao = encontrado['operacao']
+        estimadas = _numero(encontrado['estimadas'])
+        loops = _numero(encontrado['loops']) or 1
+        reais = _numero(encontrado['reais'])
+        if reais is not None:
+            # rows do EXPLAIN ANALYZE é média por loop
+            reais *= loops
+            estimadas = estimadas * loops if estimadas is not None else None
+        tempo = _numero(encontrado['fim'])
+
+        alertas = []
+        if operacao.startswith("Table scan on"):
+            alertas.append(VARREDURA)
+        elif operacao.startswith("Index scan on"):
+            alertas.append(VARREDURA_INDICE)
+        if operacao.startswith(("Sort", "Filesort")) and not operacao.startswith("Sort row IDs"):
+            alertas.append(FILESORT)
+        if "temporary" in operacao.lower() or operacao.startswith("Materialize"):
+            alertas.append(TEMPORARIA)
+        if "hash join" in operacao.lower():
+            alertas.append(JUNCAO_SEM_INDICE)
+        if estimadas and reais is not None and max(estimadas, reais) > 100 \
+                and max(estimadas, reais) / max(min(estimadas, reais), 1) > 10:
+            alertas.append(ESTIMATIVA_RUIM)
+
+        tabela = re.search(r"\bon (\w+)", operacao)
+        indice = re.search(r"\busing (\w+)", operacao)
+        nos.append(_no(
+            len(encontrado['recuo']) // 4,
+            operacao,
+            tabela=tabela.group(1) if tabela else None,
+            indice=indice.group(1) if indice else None,
+            estimadas=estimadas,
+            reais=reais,
+            custo=_numero(encontrado['custo']),
+            tempo=tempo,
+            alertas=alertas
+        ))
+    return nos
+
+
+# ============ OBTENÇÃO ============
+def explicavel(sql):
+    """EXPLAIN ANALYZE executa a consulta: só é permitido para leituras"""
+    return normalizar_sql(sql).upper().startswith(("SELECT", "WITH", "TABLE"))
+
+
+def obter_plano(conexao, sql, analisar=False, banco=None, timeout=TIMEOUT_PADRAO):
+    """Executa EXPLAIN e retorna (nós do plano, plano bruto)"""
+    sql = normalizar_sql(sql)
+    cursor = conexao.cursor()
+    try:
+        if analisar:
+            if not explicavel(sql):
+                raise ValueError("EXPLAIN ANALYZE executa a consulta; use apenas com SELECT.")
+            explain = f"EXPLAIN ANALYZE {sql}"
+            with ExecucaoControlada(conexao, explain, banco, timeout) as controle:
+                controle.executar(cursor)
+            bruto = "\n".join(linha[0] for linha in cursor.fetchall())
+            return analisar_plano_analyze(bruto), bruto
+        cursor.execute(f"EXPLAIN FORMAT=JSON {sql}")
+        bruto = json.loads(cursor.fetchone()[0])
+        return analisar_plano_json(bruto), bruto
+    finally:
+        cursor.close()
+
+
+def resumo_alertas(nos):
+    """Conta ocorrências de cada alerta no plano"""
+    contagem = {}
+    for no in nos:
+        for alerta in no['alertas']:
+            contagem[alerta] = contagem.get(alerta, 0) + 1
+    return contagem
+
+
+# ============ INTERFACE STREAMLIT ============
+def tabela_plano(nos):
+    """DataFrame do plano com a árvore indentada na coluna Operação"""
+    return pd.DataFrame([{
+        'Operação': "\u2003" * no['nivel'] + ("└ " if no['nivel'] else "") + no['operacao'],
+        'Tabela': no['tabela'],
+        'Acesso': no['acesso'],
+        'Índice': no['indice'],
+        'Linhas est.': no['linhas_estimadas'],
+        'Linhas reais': no['linhas_reais'],
+        'Custo': no['custo'],
+        'Tempo (ms)': no['tempo_ms'],
+        'Alertas': ", ".join(no['alertas'])
+    } for no in nos])
+
+
+def exibir_plano(banco, sql, analisar=False, timeout=TIMEOUT_PADRAO):
+    """Painel do plano: árvore com linhas estimadas x reais, custo e destaques"""
+    try:
+        with obter_conexao(banco) as conexao:
+            nos, bruto = obter_plano(conexao, sql, analisar, banco, timeout)
+    except ValueError as e:
+        st.warning(f"⚠️ {e}")
+        return None
+    except Error as e:
+        st.error(f"❌ Erro ao obter plano: {e}")
+        return None
+
+    if not nos:
+        st.info("Plano vazio (a consulta pode ter sido resolvida sem acessar tabelas).")
+        return nos
+
+    alertas = resumo_alertas(nos)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        custo = next((no['custo'] for no in nos if no['custo'] is not None), None)
+        st.metric("Custo estimado", f"{custo:,.2f}" if custo is not None else "-")
+    with col2:
+        st.metric("Operações", len(nos))
+    with col3:
+        st.metric("Alertas", sum(alertas.values()))
+
+    df = tabela_plano(nos)
+    if not analisar:
+        df = df.drop(columns=['Linhas reais', 'Tempo (ms)'])
+
+    def destacar(linha):
+        cor = ""
+        if "🔴" in linha['Alertas']:
+            cor = "background-color: rgba(255, 0, 0, 0.15)"
+        elif "🟠" in linha['Alertas'] or "🟡" in linha['Alertas']:
+            cor = "background-color: rgba(255, 165, 0, 0.15)"
+        return [cor] * len(linha)
+
+    st.dataframe(df.style.apply(destacar, axis=1), use_container_width=True, hide_index=True)
+
+    if alertas:
+        for alerta, quantidade in alertas.items():
+            st.warning(f"{alerta} × {quantidade}")
+        if JUNCAO_SEM_INDICE in alertas:
+            st.error("🚨 Há junções sem índice: cada linha de uma tabela é comparada com todas da outra. "
+                     "Confira as condições de JOIN e crie índices nas colunas de ligação.")
+    else:
+        st.success("✅ Nenhuma varredura completa, filesort ou tabela temporária no plano.")
+
+    with st.expander("📄 Plano bruto"):
+        if isinstance(bruto, str):
+            st.code(bruto, language="text")
+        else:
+            st.json(bruto)
+    return nos
@@ -1,39 +1,26 @@
 # query_editor.py - Editor SQL completo COM VISUALIZAÇÃO DE TABELAS
 import streamlit as st
 import pandas as pd
-import mysql.connector
 from mysql.connector import Error
 import io
-from io import BytesIO
-
-# ============ FUNÇÃO DE CONEXÃO ============
-def conectar_mysql(database=None):
-    try:
-        conexao = mysql.connector.connect(
-            host="localhost",
-            user="root",
-            password="",  # Sua senha aqui
-            database=database
-        )
-        return conexao
-    except Error as e:
-        st.error(f"Erro: {e}")
-        return None
+import time
+from conexao_pool import obter_conexao, obter_pool
+import catalogo_schema
+from execucao import exibir_streaming, TAMANHO_CHUNK, MAX_LINHAS, TIMEOUT_PADRAO, ExecucaoControlada, exibir_em_andamento, eh_select
+from cache_resultados import normalizar_sql
+import paginacao
+import cache_resultados
+import historico
+import tarefas
+import script_sql
+import plano_execucao
+import exportacao
 
 # ============ FUNÇÃO PARA OBTER TABELAS ============
 def obter_tabelas(banco):
     """Retorna lista de tabelas do banco selecionado"""
     try:
-        conexao = conectar_mysql(banco)
-        if not conexao:
-            return []
-        
-        cursor = conexao.cursor()
-        cursor.execute("SHOW TABLES")
-        tabelas = [tabela[0] for tabela in cursor.fetchall()]
-        cursor.close()
-        conexao.close()
-        return tabelas
+        return catalogo_schema.listar_tabelas(banco)
     except Error as e:
         st.error(f"Erro ao obter tabelas: {e}")
         return []
@@ -42,23 +29,59 @@ def obter_tabelas(banco):
 def obter_estrutura_tabela(banco, tabela):
     """Retorna estrutura (colunas) de uma tabela específica"""
     try:
-        conexao = conectar_mysql(banco)
-        if not conexao:
-            return []
-        
-        cursor = conexao.cursor()
-        cursor.execute(f"DESCRIBE {tabela}")
-        estrutura = cursor.fetchall()
-        cursor.close()
-        conexao.close()
-        return estrutura
+        return catalogo_schema.obter_estrutura(banco, tabela)
     except Error as e:
         st.error(f"Erro ao obter estrutura da tabela: {e}")
         return []
 
+# ============ PREVIEW SOB DEMANDA ============
+PREVIEW_LINHAS = 5
+PREVIEW_VALIDADE = 120  # segundos até o preview ser marcado como desatualizado
+
+def carregar_preview(banco, tabela):
+    """Busca as primeiras linhas da tabela e guarda no cache da sessão"""
+    with obter_conexao(banco) as conexao:
+        cursor = conexao.cursor()
+        cursor.execute(f"SELECT * FROM `{tabela}` LIMIT {PREVIEW_LINHAS}")
+        dados = cursor.fetchall()
+        colunas = [desc[0] for desc in cursor.description] if cursor.description else []
+        cursor.close()
+    
+    st.session_state.previews_tabelas[(banco, tabela)] = {
+        'df': pd.DataFrame(dados, columns=colunas),
+        'carregado_em': time.time()
+    }
+
+def descartar_previews(banco):
+    """Remove os previews em cache de um banco (após escrita pelo editor)"""
+    previews = st.session_state.get('previews_tabelas', {})
+    for chave in [c for c in previews if c[0] == banco]:
+        del previews[chave]
+
+# ============ FUNÇÃO PARA EXIBIR RESULTADO ============
+def exibir_resultado(df, banco_selecionado):
+    """Resumo e estatísticas de um resultado com linhas (downloads ficam no painel de exportação)"""
+    st.success(f"✅ {len(df)} linha(s) retornada(s)")
+
+    # Estatísticas
+    with st.expander("📈 Estatísticas"):
+        st.write(f"**Colunas:** {len(df.columns)}")
+        st.write(f"**Linhas:** {len(df)}")
+        st.write("**Tipos de dados:**")
+        tipos = {col: str(dtype) for col, dtype in df.dtypes.items()}
+        st.json(tipos)
+
 # ============ CALLBACK PARA LIMPAR ============
 def limpar_editor():
     st.session_state.texto_query = ""
+    st.session_state.editor_sql = ""
+
+def recuperar_no_editor(sql, banco):
+    """Callback do histórico: coloca o SQL no editor e seleciona o banco em que rodou"""
+    st.session_state.texto_query = sql
+    st.session_state.editor_sql = sql
+    if banco and banco in st.session_state.get("bancos_editor", []):
+        st.session_state.banco_selector = banco
 
 def pagina_query_editor():
     st.title("🔍 Criar Querys em SQL - Versão Pro")
@@ -66,26 +89,28 @@ def pagina_query_editor():
     # Inicializar estado do editor se não existir
     if "texto_query" not in st.session_state:
         st.session_state.texto_query = "SELECT 'Hello MySQL' as teste"
+    # O text_area do editor (key="editor_sql") lê o texto só do session_state
+    if "editor_sql" not in st.session_state:
+        st.session_state.editor_sql = st.session_state.texto_query
+    
+    # Previews de tabelas carregados sob demanda: (banco, tabela) -> dados
+    if "previews_tabelas" not in st.session_state:
+        st.session_state.previews_tabelas = {}
     
     # Seção 1: Seleção do banco
     st.subheader("1. 📁 Selecione um Banco")
     
-    conexao = conectar_mysql()
-    if not conexao:
-        st.error("Não foi possível conectar ao MySQL")
+    try:
+        bancos = catalogo_schema.listar_bancos()
+    except Error as e:
+        st.error(f"Não foi possível conectar ao MySQL: {e}")
         st.stop()
     
-    cursor = conexao.cursor()
-    cursor.execute("SHOW DATABASES")
-    bancos = [db[0] for db in cursor.fetchall() 
-             if db[0] not in ['information_schema', 'mysql', 'performance_schema', 'sys']]
-    cursor.close()
-    conexao.close()
-    
     if not bancos:
         st.error("Nenhum banco disponível!")
         st.stop()
     
+    st.session_state.bancos_editor = bancos
     banco_selecionado = st.selectbox("Banco:", bancos, key="banco_selector")
     st.success(f"✅ Banco selecionado: **{banco_selecionado}**")
     
@@ -94,6 +119,10 @@ def pagina_query_editor():
         # Obter tabelas do banco selecionado
         tabelas = obter_tabelas(banco_selecionado)
         
+        if st.button("🔄 Atualizar esquema", key="btn_atualizar_esquema"):
+            catalogo_schema.invalidar(banco_selecionado)
+            st.rerun()
+        
         if tabelas:
             st.info(f"📁 **{len(tabelas)} tabela(s)** encontrada(s) no banco `{banco_selecionado}`")
             
@@ -108,6 +137,7 @@ def pagina_query_editor():
                         # Botão para inserir no editor
                         if st.button(f"📝 Usar {tabela}", key=f"btn_use_{tabela}"):
                             st.session_state.texto_query = f"SELECT * FROM {tabela} LIMIT 10;"
+                            st.session_state.editor_sql = st.session_state.texto_query
                             st.rerun()
                         
                         # Obter estrutura da tabela
@@ -120,29 +150,30 @@ def pagina_query_editor():
                                 st.code(f"{nome}: {tipo}")
                     
                     with col2:
-                        # Mostrar preview dos dados
-                        try:
-                            conexao = conectar_mysql(banco_selecionado)
-                            if conexao:
-                                cursor = conexao.cursor()
-                                cursor.execute(f"SELECT * FROM {tabela} LIMIT 5")
-                                dados = cursor.fetchall()
-                                
-                                if cursor.description:
-                                    colunas = [desc[0] for desc in cursor.description]
-                                    if dados:
-                                        df_preview = pd.DataFrame(dados, columns=colunas)
-                                        st.dataframe(df_preview, use_container_width=True)
-                                        st.caption(f"Preview: {len(dados)} registros")
-                                    else:
-                                        st.info("Tabela vazia")
-                                else:
-                                    st.info("Sem dados para mostrar")
-                                
-                                cursor.close()
-                                conexao.close()
-                        except Error as e:
-                            st.warning(f"Não foi possível carregar dados: {e}")
+                        # Preview só é buscado quando o usuário pede
+                        preview = st.session_state.previews_tabelas.get((banco_selecionado, tabela))
+                        rotulo = "🔄 Recarregar preview" if preview else "👁️ Carregar preview"
+                        if st.button(rotulo, key=f"btn_preview_{tabela}"):
+                            try:
+                                carregar_preview(banco_selecionado, tabela)
+                                preview = st.session_state.previews_tabelas[(banco_selecionado, tabela)]
+                            except Error as e:
+                                st.warning(f"Não foi possível carregar dados: {e}")
+                        
+                        if preview:
+                            df_preview = preview['df']
+                            if not df_preview.empty:
+                                st.dataframe(df_preview, use_container_width=True)
+                            else:
+                                st.info("Tabela vazia")
+                            
+                            idade = int(time.time() - preview['carregado_em'])
+                            if idade > PREVIEW_VALIDADE:
+                                st.caption(f"⚠️ Preview: {len(df_preview)} registros • carregado há {idade}s, pode estar desatualizado")
+                            else:
+                                st.caption(f"Preview: {len(df_preview)} registros • carregado há {idade}s")
+                        else:
+                            st.caption("Preview não carregado")
         else:
             st.warning(f"⚠️ Nenhuma tabela encontrada no banco `{banco_selecionado}`")
             st.info("Crie uma tabela para começar:")
@@ -176,10 +207,9 @@ CREATE TABLE clientes (
     </style>
     """, unsafe_allow_html=True)
     
-    # Text area usando session_state
+    # Text area usando session_state (sem value=: o texto vem de st.session_state.editor_sql)
     query = st.text_area(
         "Digite sua query:",
-        value=st.session_state.texto_query,
         height=350,
         placeholder="Ex: SELECT * FROM tabela LIMIT 10;",
         key="editor_sql"
@@ -189,16 +219,70 @@ CREATE TABLE clientes (
     st.session_state.texto_query = query
     
     # Botões
-    col1, col2, col3 = st.columns([2, 1, 1])
+    col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
     with col1:
         executar = st.button("▶️ Executar Query", type="primary", use_container_width=True)
     with col2:
+        plano = st.button("🧭 Plano", use_container_width=True, help="Mostra como o MySQL vai executar a query")
+    with col3:
         # Botão limpar com callback
         if st.button("🗑️ Limpar Editor", use_container_width=True, on_click=limpar_editor):
             pass  # A ação é feita pelo callback
-    with col3:
+    with col4:
         exemplos = st.button("📚 Exemplos", use_container_width=True)
     
+    with st.expander("⚙️ Opções de execução"):
+        col_op1, col_op2 = st.columns(2)
+        with col_op1:
+            tamanho_chunk = st.number_input(
+                "Linhas por bloco (streaming):",
+                min_value=100,
+                max_value=100_000,
+                value=TAMANHO_CHUNK,
+                step=500,
+                key="editor_tamanho_chunk"
+            )
+        with col_op2:
+            max_linhas = st.number_input(
+                "Máximo de linhas mantidas:",
+                min_value=1_000,
+                max_value=2_000_000,
+                value=MAX_LINHAS,
+                step=10_000,
+                key="editor_max_linhas"
+            )
+        timeout = st.number_input(
+            "Tempo limite (s) — 0 = sem limite:",
+            min_value=0,
+            max_value=3600,
+            value=TIMEOUT_PADRAO,
+            step=10,
+            key="editor_timeout"
+        )
+        usar_cache = st.checkbox(
+            "⚡ Usar cache de resultados (SELECTs idênticos com tabelas inalteradas)",
+            value=True,
+            key="editor_usar_cache"
+        )
+        paginar = st.checkbox(
+            "📄 Paginar SELECTs no servidor (navegação por páginas em vez de carregar tudo)",
+            key="editor_paginar"
+        )
+        segundo_plano = st.checkbox(
+            "🧵 Executar em segundo plano (continue editando enquanto a consulta roda)",
+            key="editor_segundo_plano"
+        )
+        transacao = st.checkbox(
+            "🔒 Scripts com várias instruções em transação única (desfaz tudo no primeiro erro)",
+            value=True,
+            key="editor_transacao",
+            help="DDL (CREATE/ALTER/DROP) faz commit implícito no MySQL e não pode ser desfeito."
+        )
+        plano_analyze = st.checkbox(
+            "🧭 Plano com EXPLAIN ANALYZE (executa o SELECT para medir linhas e tempo reais)",
+            key="editor_plano_analyze"
+        )
+    
     if exemplos:
         with st.expander("📚 Exemplos de Queries", expanded=True):
             tab1, tab2, tab3 = st.tabs(["Básico", "Intermediário", "Avançado"])
@@ -265,131 +349,207 @@ CALL relatorio_vendas('2024-01-01', '2024-12-31');
                 """, language="sql")
     
     # Seção 3: Execução
+    interrompida = st.session_state.pop('execucao_interrompida', None)
+    if interrompida:
+        st.warning(f"⏹️ Execução cancelada; a consulta foi interrompida no servidor:\n\n`{interrompida[:200]}`")
+    
+    instrucoes = script_sql.dividir_instrucoes(query) if query.strip() else []
+    
+    if plano and instrucoes:
+        st.subheader("🧭 Plano de execução")
+        if len(instrucoes) > 1:
+            st.info(f"Script com {len(instrucoes)} instruções: mostrando o plano da última.")
+        plano_execucao.exibir_plano(banco_selecionado, instrucoes[-1], plano_analyze, timeout)
+    
     if executar and query.strip():
+        # SELECT paginado: o estado da grade persiste entre reruns da navegação
+        paginacao.limpar_paginacao("editor")
+        if paginar and len(instrucoes) == 1 and eh_select(instrucoes[0]):
+            st.session_state.paginacao_editor = {
+                'banco': banco_selecionado,
+                'fonte': paginacao.fonte_consulta(instrucoes[0])
+            }
+        else:
+            st.session_state.paginacao_editor = None
+    
+    if st.session_state.get('paginacao_editor'):
+        st.subheader("3. 📊 Resultados")
+        pag = st.session_state.paginacao_editor
+        paginacao.exibir_paginado("editor", pag['banco'], pag['fonte'])
+        if st.button("✖️ Fechar resultados paginados", key="btn_fechar_paginacao"):
+            st.session_state.paginacao_editor = None
+            paginacao.limpar_paginacao("editor")
+            st.rerun()
+    
+    elif executar and query.strip() and segundo_plano:
+        tarefa = tarefas.submeter_da_sessao(
+            "editor", query, banco_selecionado,
+            tamanho_chunk=tamanho_chunk,
+            max_linhas=max_linhas,
+            timeout=timeout,
+            usar_cache=usar_cache
+        )
+        st.toast(f"🧵 Tarefa {tarefa.id} enviada para execução em segundo plano")
+    
+    elif executar and len(instrucoes) > 1:
+        st.subheader("3. 📊 Resultados do script")
+        st.caption(f"📜 {len(instrucoes)} instruções" + (" em transação única" if transacao else ""))
+        
+        botao_cancelar = st.empty()
+        botao_cancelar.button("⏹️ Cancelar execução", key="btn_cancelar_script")
+        
+        try:
+            with obter_conexao(banco_selecionado) as conexao:
+                etapas = script_sql.executar_script(
+                    conexao, instrucoes, banco_selecionado,
+                    transacao=transacao,
+                    timeout=timeout,
+                    tamanho_chunk=tamanho_chunk,
+                    max_linhas=max_linhas
+                )
+            st.subheader("⏱️ Tempo por instrução")
+            script_sql.exibir_tempos(etapas)
+        except Error as e:
+            st.error(f"❌ Erro na execução: {e}")
+        finally:
+            botao_cancelar.empty()
+            descartar_previews(banco_selecionado)
+            catalogo_schema.invalidar_por_sql(banco_selecionado, query)
+    
+    elif executar and instrucoes:
         st.subheader("3. 📊 Resultados")
+        instrucao = instrucoes[0]
         
-        conexao = conectar_mysql(banco_selecionado)
-        if not conexao:
+        pool = obter_pool()
+        try:
+            conexao = pool.adquirir(banco_selecionado)
+        except Error as e:
+            st.error(f"Erro: {e}")
             st.stop()
         
-        cursor = conexao.cursor()
+        # Cursor não-bufferizado: as linhas chegam sob demanda via fetchmany
+        cursor = conexao.cursor(buffered=False)
+        
+        # Clicar em Cancelar faz o Streamlit parar o script; a consulta recebe KILL QUERY
+        botao_cancelar = st.empty()
+        botao_cancelar.button("⏹️ Cancelar execução", key="btn_cancelar_execucao")
+        controle = None
         
         try:
-            with st.spinner("Executando query..."):
-                cursor.execute(query)
+            with st.spinner("Executando query..."), \
+                    ExecucaoControlada(conexao, instrucao, banco_selecionado, timeout, origem="editor") as controle:
+                # SELECT repetido com as mesmas tabelas inalteradas vem do cache
+                df_cache, marcadores = None, None
+                if usar_cache:
+                    df_cache, guardado_em, marcadores = cache_resultados.buscar(conexao, banco_selecionado, instrucao)
+                
+                if df_cache is None:
+                    controle.executar(cursor)
+                else:
+                    # Sem ida ao servidor: não entra no histórico de desempenho
+                    controle.do_cache = True
                 
-                if query.strip().upper().startswith(('SELECT', 'SHOW', 'DESCRIBE', 'EXPLAIN')):
-                    resultados = cursor.fetchall()
+                # Quem decide entre ler linhas e confirmar é o próprio resultado
+                if df_cache is not None or cursor.description:
+                    if df_cache is not None:
+                        df = df_cache
+                        st.dataframe(df, use_container_width=True)
+                        st.caption(f"⚡ Resultado do cache (guardado às "
+                                   f"{time.strftime('%H:%M:%S', time.localtime(guardado_em))}; "
+                                   f"tabelas sem alterações desde então)")
+                    else:
+                        # Mostra o primeiro bloco assim que chega e acrescenta o resto
+                        df, leitor = exibir_streaming(
+                            conexao, cursor,
+                            tamanho_chunk=tamanho_chunk,
+                            max_linhas=max_linhas
+                        )
+                        controle.linhas, controle.bytes = leitor.linhas, leitor.bytes
+                        if not leitor.truncado:
+                            cache_resultados.guardar(banco_selecionado, instrucao, df, marcadores)
                     
-                    if cursor.description:
-                        colunas = [desc[0] for desc in cursor.description]
-                        
-                        if resultados:
-                            df = pd.DataFrame(resultados, columns=colunas)
-                            st.success(f"✅ {len(df)} linha(s) retornada(s)")
-                            
-                            # Mostrar dataframe
-                            st.dataframe(df, use_container_width=True)
-                            
-                            # Estatísticas
-                            with st.expander("📈 Estatísticas"):
-                                st.write(f"**Colunas:** {len(df.columns)}")
-                                st.write(f"**Linhas:** {len(df)}")
-                                st.write("**Tipos de dados:**")
-                                tipos = {col: str(dtype) for col, dtype in df.dtypes.items()}
-                                st.json(tipos)
-                            
-                            # Download
-                            col_d1, col_d2, col_d3 = st.columns(3)
-                            
-                            with col_d1:
-                                # CSV
-                                csv_buffer = df.to_csv(index=False).encode('utf-8')
-                                st.download_button(
-                                    "⬇️ Baixar CSV",
-                                    csv_buffer,
-                                    f"resultados_{banco_selecionado}.csv",
-                                    "text/csv",
-                                    use_container_width=True
-                                )
-                            
-                            with col_d2:
-                                # JSON
-                                json_str = df.to_json(orient='records', indent=2)
-                                st.download_button(
-                                    "⬇️ Baixar JSON",
-                                    json_str,
-                                    f"resultados_{banco_selecionado}.json",
-                                    "application/json",
-                                    use_container_width=True
-                                )
-                            
-                            with col_d3:
-                                # EXCEL
-                                excel_buffer = BytesIO()
-                                with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-                                    df.to_excel(writer, index=False, sheet_name='Resultados')
-                                
-                                excel_data = excel_buffer.getvalue()
-                                st.download_button(
-                                    "⬇️ Baixar Excel",
-                                    excel_data,
-                                    f"resultados_{banco_selecionado}.xlsx",
-                                    "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                                    use_container_width=True
-                                )
-                        else:
-                            st.info("✅ Query executada, mas sem resultados retornados.")
+                    if not df.empty:
+                        exibir_resultado(df, banco_selecionado)
+                        # Exportação relê do servidor em blocos: inclui linhas além do limite exibido
+                        exportacao.registrar_resultado(
+                            "editor",
+                            exportacao.fonte_sql(banco_selecionado, instrucao,
+                                                 None if df_cache is None and leitor.truncado else len(df), df),
+                            f"resultados_{banco_selecionado}",
+                            exportacao.id_resultado(banco_selecionado, instrucao, marcadores)
+                        )
                     else:
-                        st.info("✅ Query executada com sucesso (sem descrição de colunas).")
+                        exportacao.limpar_resultado("editor")
+                        st.info("✅ Query executada, mas sem resultados retornados.")
                 
                 else:
-                    linhas = cursor.rowcount
+                    linhas = controle.linhas = cursor.rowcount
                     conexao.commit()
+                    descartar_previews(banco_selecionado)
                     st.success(f"✅ Query executada com sucesso!")
                     st.info(f"**Linhas afetadas:** {linhas}")
                     
                     # Mostrar informações sobre operações DML
-                    if query.strip().upper().startswith('INSERT'):
+                    comando = normalizar_sql(instrucao).split(" ", 1)[0].upper()
+                    if comando == 'INSERT':
                         st.balloons()
                         st.success("Dados inseridos com sucesso!")
-                    elif query.strip().upper().startswith('UPDATE'):
+                    elif comando == 'UPDATE':
                         st.info(f"Registros atualizados: {linhas}")
-                    elif query.strip().upper().startswith('DELETE'):
+                    elif comando == 'DELETE':
                         st.warning(f"Registros excluídos: {linhas}")
         
         except Error as e:
-            st.error(f"❌ Erro na execução:")
-            st.code(str(e), language='text')
-            conexao.rollback()
+            mensagem = controle.mensagem_erro(e) if controle else None
+            if mensagem:
+                st.error(mensagem)
+            else:
+                st.error(f"❌ Erro na execução:")
+                st.code(str(e), language='text')
+            try:
+                conexao.rollback()
+            except Error:
+                pass
         
         finally:
-            cursor.close()
-            conexao.close()
+            botao_cancelar.empty()
+            try:
+                cursor.close()
+            except Error:
+                # Resultado interrompido no meio: o pool descarta a conexão
+                pass
+            pool.devolver(conexao, banco_selecionado)
+            # DDL pelo editor muda o esquema: descarta o catálogo em cache
+            catalogo_schema.invalidar_por_sql(banco_selecionado, query)
     
-    # Seção 4: Histórico (simplificado)
-    with st.expander("📋 Histórico de Queries (últimas 5)"):
-        if "historico_queries" not in st.session_state:
-            st.session_state.historico_queries = []
+    if tarefas.ids_da_sessao("editor"):
+        st.subheader("🧵 Execuções em segundo plano")
         
-        if executar and query.strip():
-            # Adicionar ao histórico
-            st.session_state.historico_queries.insert(0, {
-                "query": query[:100] + ("..." if len(query) > 100 else ""),
-                "banco": banco_selecionado,
-                "timestamp": pd.Timestamp.now().strftime("%H:%M:%S")
-            })
-            
-            # Manter apenas as últimas 5
-            if len(st.session_state.historico_queries) > 5:
-                st.session_state.historico_queries.pop()
+        def exibir_resultado_tarefa(df, tarefa):
+            st.dataframe(df, use_container_width=True)
+            if not df.empty:
+                exibir_resultado(df, tarefa.banco)
+                # Scripts exportam o último resultado já em memória
+                instrucoes_tarefa = script_sql.dividir_instrucoes(tarefa.sql)
+                fonte = exportacao.fonte_sql(tarefa.banco, instrucoes_tarefa[0], amostra=df) \
+                    if len(instrucoes_tarefa) == 1 else exportacao.fonte_dataframe(df)
+                exportacao.registrar_resultado("editor", fonte, f"resultados_{tarefa.banco}", tarefa.id)
         
-        # Mostrar histórico
-        if st.session_state.historico_queries:
-            for i, item in enumerate(st.session_state.historico_queries):
-                st.text(f"{i+1}. [{item['timestamp']}] {item['banco']}: {item['query']}")
-        else:
-            st.info("Nenhuma query no histórico ainda.")
+        tarefas.exibir_tarefas("editor", exibir_resultado_tarefa)
+    
+    if st.session_state.get("exportacao_editor"):
+        st.markdown("**📤 Exportar último resultado** — gerado em blocos direto do servidor, só quando pedido")
+        exportacao.exibir_exportacao("editor")
+    
+    with st.expander("⏱️ Consultas em execução"):
+        exibir_em_andamento()
+    
+    with st.expander("🐢 Consultas mais lentas / mais frequentes"):
+        historico.exibir_relatorio()
+    
+    # Seção 4: Histórico persistente (SQLite), com busca textual
+    with st.expander("📋 Histórico de Queries"):
+        historico.exibir_busca(recuperar_no_editor)
     
     # Botão voltar para home
     st.markdown("---")
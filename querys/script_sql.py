@@ -0,0 +1,207 @@
+# script_sql.py - Divisão e execução de scripts com várias instruções SQL
+import time
+
+import streamlit as st
+import pandas as pd
+from mysql.connector import Error
+
+from execucao import ExecucaoControlada, exibir_streaming, TAMANHO_CHUNK, MAX_LINHAS, TIMEOUT_PADRAO
+from cache_resultados import normalizar_sql
+
+
+# ============ DIVISÃO DE INSTRUÇÕES ============
+def dividir_instrucoes(script):
+    """Divide o script em instruções pelo delimitador, fora de literais e comentários
+
+    Entende aspas simples/duplas (com escapes), crases, comentários `--`, `#` e
+    `/* */` e a diretiva de cliente `DELIMITER` (usada em procedures e triggers).
+    Instruções vazias ou só com comentários são ignoradas.
+    """
+    instrucoes = []
+    delimitador = ";"
+    atual = []
+    i = 0
+    n = len(script)
+    inicio_linha = True
+
+    def fechar():
+        texto = "".join(atual).strip()
+        if normalizar_sql(texto):
+            instrucoes.append(texto)
+        atual.clear()
+
+    while i < n:
+        c = script[i]
+
+        # DELIMITER só vale no início de linha e fora de uma instrução em andamento
+        if inicio_linha and not "".join(atual).strip():
+            linha = script[i:].split("\n", 1)[0]
+            partes = linha.strip().split()
+            if len(partes) == 2 and partes[0].upper() == "DELIMITER":
+                delimitador = partes[1]
+                atual.clear()
+                i += len(linha) + 1
+                continue
+        inicio_linha = c == "\n"
+
+        if c in ("'", '"', "`"):
+            fim = i + 1
+            while fim < n:
+                if script[fim] == "\\" and c != "`":
+                    fim += 2
+                    continue
+                if script[fim] == c:
+                    # Aspas duplicadas ('') são escape, não fim do literal
+                    if fim + 1 < n and script[fim + 1] == c:
+                        fim += 2
+                        continue
+                    break
+                fim += 1
+            atual.append(script[i:fim + 1])
+            i = fim + 1
+            continue
+
+        if c == "#" or (script.startswith("--", i) and (i + 2 >= n or script[i + 2].isspace())):
+            fim = script.find("\n", i)
+            fim = n if fim == -1 else fim
+            atual.append(script[i:fim])
+            i = fim
+            continue
+
+        if script.startswith("/*", i):
+            fim = script.find("*/", i + 2)
+            fim = n if fim == -1 else fim + 2
+            atual.append(script[i:fim])
+            i = fim
+            continue
+
+        if script.startswith(delimitador, i):
+            fechar()
+            i += len(delimitador)
+            continue
+
+        atual.append(c)
+        i += 1
+
+    fechar()
+    return instrucoes
+
+
+def resumo_instrucao(instrucao, tamanho=80):
+    """Primeira parte da instrução numa linha, sem comentários"""
+    texto = normalizar_sql(instrucao)
+    return texto if len(texto) <= tamanho else texto[:tamanho] + "..."
+
+
+# ============ COMMIT IMPLÍCITO ============
+# Comandos que confirmam a transação em andamento no MySQL (DDL e afins)
+COMANDOS_COMMIT_IMPLICITO = {
+    "CREATE", "ALTER", "DROP", "TRUNCATE", "RENAME", "GRANT", "REVOKE",
+    "LOCK", "UNLOCK", "ANALYZE", "OPTIMIZE", "REPAIR", "FLUSH", "INSTALL", "UNINSTALL",
+}
+
+
+def commit_implicito(instrucao):
+    """Indica se a instrução faz commit implícito (CREATE/DROP TEMPORARY não fazem)"""
+    palavras = normalizar_sql(instrucao).upper().split(None, 2)
+    if not palavras or palavras[0] not in COMANDOS_COMMIT_IMPLICITO:
+        return False
+    return not (palavras[0] in ("CREATE", "DROP") and palavras[1:2] == ["TEMPORARY"])
+
+
+def confirmadas_antes(instrucoes, numero, iniciada=True):
+    """Quantas instruções do início já estavam confirmadas quando o script parou na `numero`
+
+    O commit implícito acontece antes da DDL rodar e de novo ao terminar: uma
+    DDL anterior confirma tudo até ela, e a própria DDL, se chegou a ser
+    iniciada (mesmo falhando), confirma o que veio antes.
+    """
+    confirmadas = 0
+    for n, instrucao in enumerate(instrucoes[:numero], 1):
+        if commit_implicito(instrucao):
+            if n < numero:
+                confirmadas = n
+            elif iniciada:
+                confirmadas = n - 1
+    return confirmadas
+
+
+# ============ EXECUÇÃO ============
+def executar_script(conexao, instrucoes, banco=None, transacao=True, timeout=TIMEOUT_PADRAO,
+                    tamanho_chunk=TAMANHO_CHUNK, max_linhas=MAX_LINHAS):
+    """Executa as instruções em sequência na mesma conexão, mostrando cada resultado
+
+    Com `transacao` tudo é confirmado no final e desfeito no primeiro erro, exceto
+    o que uma DDL já confirmou com commit implícito; sem ela cada instrução é
+    confirmada ao terminar. Para no primeiro erro. Retorna a lista de etapas com
+    tempo de cada instrução.
+    """
+    etapas = []
+    cursor = conexao.cursor(buffered=False)
+    try:
+        if transacao:
+            ddl = [n for n, instrucao in enumerate(instrucoes, 1) if commit_implicito(instrucao)]
+            if ddl:
+                st.warning(f"⚠️ {', '.join(f'#{n}' for n in ddl)}: DDL faz commit implícito no MySQL. "
+                           "O que vier antes dela fica confirmado mesmo que uma instrução posterior falhe.")
+            conexao.start_transaction()
+
+        for numero, instrucao in enumerate(instrucoes, 1):
+            st.markdown(f"**#{numero}** `{resumo_instrucao(instrucao)}`")
+            etapa = {'nº': numero, 'instrução': resumo_instrucao(instrucao), 'linhas': None,
+                     'tempo (s)': None, 'status': "✅"}
+            etapas.append(etapa)
+            inicio = time.perf_counter()
+            controle = None
+            try:
+                with ExecucaoControlada(conexao, instrucao, banco, timeout, origem="editor") as controle:
+                    controle.executar(cursor)
+                    if cursor.description:
+                        df, leitor = exibir_streaming(conexao, cursor, tamanho_chunk, max_linhas)
+                        etapa['linhas'] = controle.linhas = len(df)
+                        controle.bytes = leitor.bytes
+                    else:
+                        etapa['linhas'] = controle.linhas = cursor.rowcount
+                        st.caption(f"{cursor.rowcount} linha(s) afetada(s)")
+                if not transacao:
+                    conexao.commit()
+            except Error as e:
+                etapa['status'] = "❌"
+                st.error((controle.mensagem_erro(e) if controle else None) or f"❌ Erro na instrução #{numero}: {e}")
+                try:
+                    conexao.rollback()
+                except Error:
+                    pass
+                if transacao:
+                    confirmadas = confirmadas_antes(instrucoes, numero)
+                    if confirmadas:
+                        st.warning(f"↩️ Transação desfeita só a partir da instrução #{confirmadas + 1}: "
+                                   f"as instruções até a #{confirmadas} já tinham sido confirmadas "
+                                   "pelo commit implícito de DDL.")
+                    else:
+                        st.warning("↩️ Transação desfeita: nenhuma alteração do script foi mantida.")
+                return etapas
+            finally:
+                etapa['tempo (s)'] = round(time.perf_counter() - inicio, 3)
+
+        if transacao:
+            conexao.commit()
+        return etapas
+
+    finally:
+        try:
+            cursor.close()
+        except Error:
+            pass
+
+
+def exibir_tempos(etapas):
+    """Tabela com o tempo de cada instrução, destacando a mais lenta"""
+    if not etapas:
+        return
+    df = pd.DataFrame(etapas)
+    total = df['tempo (s)'].sum()
+    lenta = df.loc[df['tempo (s)'].idxmax()]
+    st.dataframe(df, use_container_width=True, hide_index=True)
+    st.info(f"⏱️ Total: **{total:.3f}s** | Mais lenta: **#{lenta['nº']}** "
+            f"({lenta['tempo (s)']:.3f}s, {lenta['tempo (s)'] / total * 100 if total else 0:.0f}% do total)")
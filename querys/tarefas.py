@@ -0,0 +1,355 @@
+# tarefas.py - Execução de consultas em segundo plano (tarefas com id e acompanhamento)
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+import pandas as pd
+from mysql.connector import Error
+
+from conexao_pool import obter_pool
+from execucao import LeitorStreaming, cancelar_consulta, TAMANHO_CHUNK, MAX_LINHAS, MAX_BYTES, TIMEOUT_PADRAO
+import cache_resultados
+import catalogo_schema
+import historico
+from script_sql import dividir_instrucoes, resumo_instrucao, confirmadas_antes
+
+# ============ CONFIGURAÇÃO ============
+MAX_TAREFAS_SIMULTANEAS = 4      # consultas rodando ao mesmo tempo no processo
+MAX_TAREFAS_GUARDADAS = 50       # tarefas finalizadas mantidas (as mais antigas saem)
+INTERVALO_ATUALIZACAO = 2        # segundos entre atualizações do painel
+
+AGUARDANDO = 'aguardando'
+EXECUTANDO = 'executando'
+CONCLUIDA = 'concluida'
+ERRO = 'erro'
+CANCELADA = 'cancelada'
+
+ICONES = {
+    AGUARDANDO: "🕓",
+    EXECUTANDO: "⏳",
+    CONCLUIDA: "✅",
+    ERRO: "❌",
+    CANCELADA: "⏹️"
+}
+
+_executor = ThreadPoolExecutor(max_workers=MAX_TAREFAS_SIMULTANEAS, thread_name_prefix="tarefa_consulta")
+_tarefas = OrderedDict()   # id -> Tarefa
+_lock = threading.Lock()
+
+
+def _confirmado(instrucoes, numero):
+    """O que do script ficou confirmado ao parar antes da instrução `numero`"""
+    confirmadas = confirmadas_antes(instrucoes, numero, iniciada=False)
+    if confirmadas:
+        return f"as instruções até a {confirmadas} já tinham sido confirmadas por commit implícito de DDL"
+    return "nada foi confirmado"
+
+
+# ============ TAREFA ============
+class Tarefa:
+    """Uma consulta executada numa thread do pool, consultável entre reruns pelo id"""
+
+    def __init__(self, sql, banco, tamanho_chunk=TAMANHO_CHUNK, max_linhas=MAX_LINHAS,
+                 timeout=TIMEOUT_PADRAO, usar_cache=True):
+        self.id = uuid.uuid4().hex[:8]
+        self.sql = sql
+        self.banco = banco
+        self.tamanho_chunk = tamanho_chunk
+        self.max_linhas = max_linhas
+        self.timeout = timeout or None
+        self.usar_cache = usar_cache
+
+        self.status = AGUARDANDO
+        self.criada_em = time.time()
+        self.inicio = None
+        self.fim = None
+        self.linhas = 0
+        self.bytes = 0
+        self.linhas_afetadas = None
+        self.etapas = []          # tempo de cada instrução de um script
+        self.df = None
+        self.truncado = False
+        self.do_cache = False
+        self.erro = None
+        self.tempo_esgotado = False
+        self.id_conexao = None
+        self.futuro = None
+        self._cancelar = False
+
+    @property
+    def finalizada(self):
+        return self.status in (CONCLUIDA, ERRO, CANCELADA)
+
+    def decorrido(self):
+        """Segundos de execução (até agora, se ainda estiver rodando)"""
+        if self.inicio is None:
+            return 0.0
+        return (self.fim or time.time()) - self.inicio
+
+    def cancelar(self):
+        """Tira a tarefa da fila ou interrompe a consulta no servidor"""
+        self._cancelar = True
+        if self.futuro is not None and self.futuro.cancel():
+            self.status = CANCELADA
+            self.fim = time.time()
+        elif self.status == EXECUTANDO and self.id_conexao:
+            try:
+                cancelar_consulta(self.id_conexao)
+            except Error:
+                pass
+
+    def _esgotar(self):
+        self.tempo_esgotado = True
+        try:
+            cancelar_consulta(self.id_conexao)
+        except Error:
+            pass
+
+    def _executar(self):
+        if self._cancelar:
+            self.status = CANCELADA
+            return
+        self.status = EXECUTANDO
+        self.inicio = time.time()
+
+        pool = obter_pool()
+        try:
+            conexao = pool.adquirir(self.banco)
+        except Error as e:
+            self._finalizar(ERRO, str(e))
+            return
+
+        self.id_conexao = conexao.connection_id
+        cursor = None
+        vigia = None
+        try:
+            instrucoes = dividir_instrucoes(self.sql)
+            marcadores = None
+            if self.usar_cache and len(instrucoes) == 1:
+                df, _, marcadores = cache_resultados.buscar(conexao, self.banco, self.sql)
+                if df is not None:
+                    self.df = df
+                    self.linhas = len(df)
+                    self.do_cache = True
+                    self._finalizar(CONCLUIDA)
+                    return
+
+            if self.timeout:
+                vigia = threading.Timer(self.timeout, self._esgotar)
+                vigia.daemon = True
+                vigia.start()
+
+            # Script inteiro numa transação; o resultado guardado é o do último SELECT
+            cursor = conexao.cursor(buffered=False)
+            for numero, instrucao in enumerate(instrucoes, 1):
+                if self._cancelar:
+                    # Cancelada entre instruções: o KILL QUERY caiu numa conexão ociosa
+                    conexao.rollback()
+                    self._finalizar(CANCELADA, f"Interrompida antes da instrução {numero} de "
+                                               f"{len(instrucoes)}; {_confirmado(instrucoes, numero)}.")
+                    return
+                if self.tempo_esgotado:
+                    # O tempo acabou entre instruções: o KILL não tinha o que interromper
+                    conexao.rollback()
+                    self._finalizar(ERRO, f"Tempo limite de {self.timeout:.0f}s excedido antes da instrução "
+                                          f"{numero} de {len(instrucoes)}; {_confirmado(instrucoes, numero)}.")
+                    return
+                inicio = time.perf_counter()
+                with historico.medir("tarefa", self.banco, instrucao) as registro:
+                    cursor.execute(instrucao)
+                    if cursor.description:
+                        leitor = LeitorStreaming(conexao, cursor, self.tamanho_chunk, self.max_linhas, MAX_BYTES)
+                        partes = []
+                        self.linhas = 0
+                        for chunk in leitor:
+                            partes.append(chunk)
+                            self.linhas = leitor.linhas
+                            self.bytes = leitor.bytes
+                        self.truncado = leitor.truncado
+                        self.df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=leitor.colunas)
+                        linhas = leitor.linhas
+                        registro['bytes'] = leitor.bytes
+                        if len(instrucoes) == 1 and not leitor.truncado:
+                            cache_resultados.guardar(self.banco, instrucao, self.df, marcadores)
+                    else:
+                        linhas = cursor.rowcount
+                        self.linhas_afetadas = (self.linhas_afetadas or 0) + max(linhas, 0)
+                    registro['linhas'] = linhas
+                self.etapas.append({
+                    'instrução': resumo_instrucao(instrucao),
+                    'linhas': linhas,
+                    'tempo (s)': round(time.perf_counter() - inicio, 3)
+                })
+            conexao.commit()
+            self._finalizar(CONCLUIDA)
+
+        except Error as e:
+            if self._cancelar:
+                self._finalizar(CANCELADA)
+            elif self.tempo_esgotado:
+                self._finalizar(ERRO, f"Tempo limite de {self.timeout:.0f}s excedido; a consulta foi interrompida.")
+            else:
+                self._finalizar(ERRO, str(e))
+            try:
+                conexao.rollback()
+            except Error:
+                pass
+
+        except Exception as e:
+            self._finalizar(ERRO, str(e))
+
+        finally:
+            if vigia:
+                vigia.cancel()
+            if cursor is not None:
+                try:
+                    cursor.close()
+                except Error:
+                    pass
+            pool.devolver(conexao, self.banco)
+            catalogo_schema.invalidar_por_sql(self.banco, self.sql)
+
+    def _finalizar(self, status, erro=None):
+        self.erro = erro
+        self.fim = time.time()
+        self.status = status
+
+
+# ============ REGISTRO ============
+def submeter(sql, banco, **opcoes):
+    """Coloca a consulta na fila e retorna a Tarefa (use tarefa.id para acompanhar)"""
+    tarefa = Tarefa(sql, banco, **opcoes)
+    with _lock:
+        _tarefas[tarefa.id] = tarefa
+        _descartar_antigas()
+    tarefa.futuro = _executor.submit(tarefa._executar)
+    return tarefa
+
+
+def _descartar_antigas():
+    """Mantém no máximo MAX_TAREFAS_GUARDADAS finalizadas (chamar com _lock)"""
+    finalizadas = [id_tarefa for id_tarefa, t in _tarefas.items() if t.finalizada]
+    for id_tarefa in finalizadas[:max(0, len(finalizadas) - MAX_TAREFAS_GUARDADAS)]:
+        del _tarefas[id_tarefa]
+
+
+def obter_tarefa(id_tarefa):
+    with _lock:
+        return _tarefas.get(id_tarefa)
+
+
+def remover_tarefa(id_tarefa):
+    with _lock:
+        tarefa = _tarefas.pop(id_tarefa, None)
+    if tarefa and not tarefa.finalizada:
+        tarefa.cancelar()
+
+
+# ============ INTERFACE STREAMLIT ============
+def ids_da_sessao(chave_estado):
+    """Ids das tarefas submetidas por esta sessão (mais recentes primeiro)"""
+    nome = f"tarefas_{chave_estado}"
+    if nome not in st.session_state:
+        st.session_state[nome] = []
+    return st.session_state[nome]
+
+
+def submeter_da_sessao(chave_estado, sql, banco, **opcoes):
+    """Submete a consulta e registra o id na sessão"""
+    tarefa = submeter(sql, banco, **opcoes)
+    ids_da_sessao(chave_estado).insert(0, tarefa.id)
+    st.session_state[f"tarefa_selecionada_{chave_estado}"] = tarefa.id
+    return tarefa
+
+
+def _fragmento():
+    return getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None)
+
+
+def _ao_vivo(funcao, ativo):
+    """Reexecuta só o painel periodicamente quando o Streamlit suporta fragmentos"""
+    fragmento = _fragmento()
+    if fragmento is None:
+        return funcao
+    return fragmento(run_every=INTERVALO_ATUALIZACAO if ativo else None)(funcao)
+
+
+def _resumo(tarefa):
+    if tarefa.status == CONCLUIDA and tarefa.linhas_afetadas is not None:
+        return f"{tarefa.linhas_afetadas:,} linha(s) afetada(s)"
+    if tarefa.status == ERRO:
+        return "erro"
+    return f"{tarefa.linhas:,} linha(s)" + (" • cache" if tarefa.do_cache else "")
+
+
+def exibir_tarefas(chave_estado, exibir_resultado=None):
+    """Painel com as tarefas da sessão e o resultado da tarefa selecionada
+
+    exibir_resultado(df, tarefa) desenha um resultado concluído; sem ele a
+    tabela é exibida diretamente.
+    """
+    nome_selecionada = f"tarefa_selecionada_{chave_estado}"
+    ids = ids_da_sessao(chave_estado)
+    # Tarefas descartadas do registro somem da lista
+    ids[:] = [id_tarefa for id_tarefa in ids if obter_tarefa(id_tarefa) is not None]
+    if not ids:
+        return
+
+    ativo = any(not obter_tarefa(id_tarefa).finalizada for id_tarefa in ids)
+
+    def painel():
+        if ativo and all(obter_tarefa(id_tarefa) is None or obter_tarefa(id_tarefa).finalizada
+                         for id_tarefa in ids):
+            # Tudo terminou: rerun completo para parar a atualização e mostrar o resultado
+            st.rerun()
+        for id_tarefa in ids:
+            tarefa = obter_tarefa(id_tarefa)
+            if tarefa is None:
+                continue
+            col1, col2, col3 = st.columns([6, 1, 1])
+            with col1:
+                st.write(f"{ICONES[tarefa.status]} `{tarefa.id}` • {tarefa.decorrido():.1f}s • "
+                         f"{_resumo(tarefa)} — {tarefa.sql[:80]}")
+            with col2:
+                if tarefa.finalizada:
+                    if st.button("📊", key=f"ver_{chave_estado}_{tarefa.id}", help="Ver resultado"):
+                        st.session_state[nome_selecionada] = tarefa.id
+                        st.rerun()
+                elif st.button("⏹️", key=f"cancelar_{chave_estado}_{tarefa.id}", help="Cancelar"):
+                    tarefa.cancelar()
+                    st.rerun()
+            with col3:
+                if st.button("🗑️", key=f"remover_{chave_estado}_{tarefa.id}", help="Remover"):
+                    remover_tarefa(tarefa.id)
+                    ids.remove(tarefa.id)
+                    st.rerun()
+        if _fragmento() is None and ativo:
+            if st.button("🔄 Atualizar status", key=f"atualizar_{chave_estado}"):
+                st.rerun()
+
+    _ao_vivo(painel, ativo)()
+
+    # Resultado da tarefa selecionada
+    tarefa = obter_tarefa(st.session_state.get(nome_selecionada))
+    if tarefa is None or not tarefa.finalizada:
+        return
+    st.markdown(f"**Resultado da tarefa `{tarefa.id}`** ({tarefa.decorrido():.1f}s)")
+    if tarefa.status == ERRO:
+        st.error(f"❌ {tarefa.erro}")
+    elif tarefa.status == CANCELADA:
+        st.warning(f"⏹️ Tarefa cancelada. {tarefa.erro or ''}")
+    elif tarefa.df is None:
+        st.success(f"✅ Query executada com sucesso! Linhas afetadas: {tarefa.linhas_afetadas}")
+    else:
+        if tarefa.truncado:
+            st.warning(f"⚠️ Resultado truncado em {tarefa.linhas:,} linhas. Refine a consulta ou use LIMIT.")
+        if exibir_resultado:
+            exibir_resultado(tarefa.df, tarefa)
+        else:
+            st.dataframe(tarefa.df, use_container_width=True)
+    if len(tarefa.etapas) > 1:
+        with st.expander("⏱️ Tempo por instrução"):
+            st.dataframe(pd.DataFrame(tarefa.etapas), use_container_width=True, hide_index=True)
@@ -0,0 +1,5 @@
+# conftest.py - Os módulos do app são importados pelo nome, como o `streamlit run` faz
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
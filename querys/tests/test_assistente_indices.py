@@ -0,0 +1,67 @@
+from contextlib import contextmanager
+
+import pytest
+from mysql.connector import Error
+
+import assistente_indices
+import catalogo_schema
+
+SUGESTAO = {'tabela': "pedidos", 'nome': "idx_pedidos_cliente",
+            'ddl': "CREATE INDEX `idx_pedidos_cliente` ON `pedidos` (`cliente`)"}
+
+
+@pytest.fixture
+def executadas(monkeypatch):
+    executadas = []
+
+    class Cursor:
+        def execute(self, sql):
+            executadas.append(sql)
+
+        def close(self):
+            pass
+
+    class Conexao:
+        def cursor(self):
+            return Cursor()
+
+    @contextmanager
+    def obter_conexao(banco):
+        yield Conexao()
+
+    monkeypatch.setattr(assistente_indices, "obter_conexao", obter_conexao)
+    monkeypatch.setattr(catalogo_schema, "invalidar", lambda banco: None)
+    return executadas
+
+
+def test_teste_usa_indice_invisivel_e_remove(executadas, monkeypatch):
+    monkeypatch.setattr(assistente_indices, "metricas_plano", lambda conexao, sql: {'linhas': len(executadas)})
+    antes, depois = assistente_indices.comparar_com_indice("loja", "SELECT 1", SUGESTAO)
+    assert executadas == [
+        SUGESTAO['ddl'] + " INVISIBLE ALGORITHM=INPLACE LOCK=NONE",
+        "SET SESSION optimizer_switch = 'use_invisible_indexes=on'",
+        "DROP INDEX `idx_pedidos_cliente` ON `pedidos`",
+        "SET SESSION optimizer_switch = 'use_invisible_indexes=default'",
+    ]
+    assert antes == {'linhas': 0} and depois == {'linhas': 2}
+
+
+def test_indice_de_teste_removido_mesmo_com_erro(executadas, monkeypatch):
+    chamadas = []
+
+    def metricas(conexao, sql):
+        chamadas.append(sql)
+        if len(chamadas) > 1:
+            raise Error("EXPLAIN falhou")
+        return {}
+
+    monkeypatch.setattr(assistente_indices, "metricas_plano", metricas)
+    with pytest.raises(Error):
+        assistente_indices.comparar_com_indice("loja", "SELECT 1", SUGESTAO)
+    assert "DROP INDEX `idx_pedidos_cliente` ON `pedidos`" in executadas
+
+
+def test_criar_mantem_indice_visivel(executadas, monkeypatch):
+    monkeypatch.setattr(assistente_indices, "metricas_plano", lambda conexao, sql: {})
+    assistente_indices.comparar_com_indice("loja", "SELECT 1", SUGESTAO, manter=True)
+    assert executadas == [SUGESTAO['ddl']]
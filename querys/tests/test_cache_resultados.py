@@ -0,0 +1,96 @@
+import pandas as pd
+
+from cache_resultados import (
+    CacheResultados, cacheavel, forma_sql, normalizar_sql, tabelas_envolvidas
+)
+
+
+# ============ NORMALIZAÇÃO ============
+def test_normalizar_remove_comentarios_e_espacos():
+    sql = "SELECT *  -- tudo\nFROM  clientes /* bloco */ WHERE id = 1 # fim\n;"
+    assert normalizar_sql(sql) == "SELECT * FROM clientes WHERE id = 1"
+
+
+def test_normalizar_preserva_literais():
+    sql = "SELECT '-- não é comentário',  '/* nem isto */'  FROM t"
+    assert normalizar_sql(sql) == "SELECT '-- não é comentário', '/* nem isto */' FROM t"
+
+
+def test_normalizar_preserva_dicas_do_otimizador():
+    assert normalizar_sql("SELECT /*!40001 SQL_NO_CACHE */ 1") == "SELECT /*!40001 SQL_NO_CACHE */ 1"
+
+
+def test_forma_agrupa_consultas_que_so_mudam_valores():
+    a = forma_sql("SELECT * FROM t WHERE id IN (1, 2, 3) AND nome = 'ana'")
+    b = forma_sql("select * from t where id in (7) and nome = %s")
+    assert a == b
+
+
+def test_cacheavel():
+    assert cacheavel("SELECT * FROM t")
+    assert cacheavel("WITH x AS (SELECT 1) SELECT * FROM x")
+    assert not cacheavel("SELECT NOW()")
+    assert not cacheavel("SELECT * FROM t FOR UPDATE")
+    assert not cacheavel("UPDATE t SET a = 1")
+    # Palavras dentro de literais não contam
+    assert cacheavel("SELECT * FROM t WHERE nome = 'now()'")
+
+
+# ============ TABELAS ENVOLVIDAS ============
+def test_from_e_join():
+    sql = "SELECT * FROM pedidos p JOIN clientes c ON c.id = p.cliente_id"
+    assert tabelas_envolvidas(sql, "loja") == [("loja", "clientes"), ("loja", "pedidos")]
+
+
+def test_lista_separada_por_virgula():
+    sql = "SELECT * FROM clientes c, pedidos p, `itens pedido` i WHERE c.id = p.cliente_id"
+    assert tabelas_envolvidas(sql, "loja") == [
+        ("loja", "clientes"), ("loja", "itens pedido"), ("loja", "pedidos")
+    ]
+
+
+def test_virgula_fora_do_from_nao_e_tabela():
+    sql = "SELECT a, b FROM t WHERE x IN (1, 2) ORDER BY a, b"
+    assert tabelas_envolvidas(sql, "db") == [("db", "t")]
+
+
+def test_nome_qualificado_pelo_banco():
+    assert tabelas_envolvidas("SELECT * FROM outro.t, `o``x`.`y`", "db") == [("o`x", "y"), ("outro", "t")]
+
+
+def test_subconsultas_sao_percorridas():
+    sql = ("SELECT * FROM (SELECT a FROM t1, t2) d "
+           "WHERE EXISTS (SELECT 1 FROM t3 WHERE t3.a = d.a), t4")
+    assert tabelas_envolvidas(sql, "db") == [("db", "t1"), ("db", "t2"), ("db", "t3")]
+
+
+def test_funcao_de_tabela_nao_resolvida():
+    sql = "SELECT * FROM t, JSON_TABLE(t.doc, '$[*]' COLUMNS (x INT PATH '$')) AS j"
+    assert tabelas_envolvidas(sql, "db") is None
+
+
+def test_comentario_nao_esconde_tabela():
+    sql = "SELECT * FROM a -- , falso\n, b"
+    assert tabelas_envolvidas(sql, "db") == [("db", "a"), ("db", "b")]
+
+
+# ============ CACHE LRU ============
+def test_cache_invalida_quando_marcadores_mudam():
+    cache = CacheResultados()
+    df = pd.DataFrame({'a': [1, 2]})
+    cache.guardar("k", df, {("db", "t"): "1"})
+    assert cache.obter("k", {("db", "t"): "1"})[0] is df
+    assert cache.obter("k", {("db", "t"): "2"}) is None
+    assert cache.obter("k", {("db", "t"): "1"}) is None
+
+
+def test_cache_respeita_limite_de_memoria():
+    df = pd.DataFrame({'a': range(1000)})
+    tamanho = int(df.memory_usage(deep=True).sum())
+    cache = CacheResultados(max_bytes=tamanho * 2, max_bytes_entrada=tamanho)
+    for chave in ("a", "b", "c"):
+        cache.guardar(chave, df, {})
+    assert cache.obter("a", {}) is None
+    assert cache.obter("c", {}) is not None
+    cache.guardar("grande", pd.DataFrame({'a': range(5000)}), {})
+    assert cache.obter("grande", {}) is None
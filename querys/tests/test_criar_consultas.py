@@ -0,0 +1,31 @@
+import datetime
+
+import catalogo_schema
+from criar_consultas import contar_marcadores, obter_colunas_tabela, sql_com_valores
+
+
+def test_marcadores_dentro_de_literais_nao_contam():
+    assert contar_marcadores("SELECT * FROM t WHERE nome LIKE '%silva%'") == 0
+    assert contar_marcadores("SELECT * FROM t WHERE a = %s AND b = '%s' AND `c%s` IN (%s, %s)") == 3
+
+
+def test_valores_substituem_so_os_marcadores():
+    sql = "SELECT * FROM t WHERE nome LIKE '%silva%' AND id = %s AND criado > %s AND obs = %s"
+    assert sql_com_valores(sql, [7, datetime.date(2024, 1, 2), None]) == (
+        "SELECT * FROM t WHERE nome LIKE '%silva%' AND id = 7 AND criado > '2024-01-02' AND obs = NULL"
+    )
+
+
+def test_literais_sao_escapados():
+    assert sql_com_valores("SELECT %s", ["O'Neil %s"]) == "SELECT 'O\\'Neil %s'"
+    assert sql_com_valores("SELECT '%s'", None) == "SELECT '%s'"
+
+
+def test_colunas_vem_do_catalogo_pelo_nome_do_banco(monkeypatch):
+    # Sem conexão presa: o catálogo empresta a sua do pool quando precisa
+    pedidos = []
+    monkeypatch.setattr(catalogo_schema, "obter_estrutura",
+                        lambda banco, tabela: pedidos.append((banco, tabela)) or [("id", "int"), ("nome", "varchar(50)")])
+    info = obter_colunas_tabela("loja", "clientes")
+    assert pedidos == [("loja", "clientes")]
+    assert info['colunas_numero'] == ["id"] and info['colunas_texto'] == ["nome"]
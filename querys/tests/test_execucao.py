@@ -0,0 +1,44 @@
+import streamlit as st
+
+import execucao
+
+
+def test_consultas_em_andamento_sao_da_sessao(monkeypatch):
+    sessao = execucao._sessao_atual()
+    monkeypatch.setattr(execucao, "_em_andamento", {
+        11: {'sessao': sessao, 'sql': "SELECT 1", 'banco': "db", 'inicio': 0},
+        12: {'sessao': "outra", 'sql': "SELECT 2", 'banco': "db", 'inicio': 0},
+    })
+    cancelados = []
+    monkeypatch.setattr(execucao, "cancelar_consulta", cancelados.append)
+
+    assert [info['id_conexao'] for info in execucao.listar_em_andamento()] == [11]
+    assert not execucao.cancelar_da_sessao(12)
+    assert not execucao.cancelar_da_sessao(99)
+    assert execucao.cancelar_da_sessao(11)
+    assert cancelados == [11]
+    assert st.session_state['id_sessao_execucao'] == sessao
+
+
+def test_cancelamento_usa_conexao_propria(monkeypatch):
+    executados = []
+
+    class Cursor:
+        def execute(self, sql):
+            executados.append(sql)
+
+        def close(self):
+            pass
+
+    class Conexao:
+        fechada = False
+
+        def cursor(self):
+            return Cursor()
+
+        def close(self):
+            Conexao.fechada = True
+
+    monkeypatch.setattr(execucao, "criar_conexao", Conexao)
+    execucao.cancelar_consulta("42")
+    assert executados == ["KILL QUERY 42"] and Conexao.fechada
@@ -0,0 +1,285 @@
+import csv
+import datetime
+import decimal
+import gzip
+import io
+import json
+import os
+from collections import OrderedDict
+
+import pandas as pd
+import pytest
+from openpyxl import load_workbook
+
+import exportacao
+from exportacao import exportar, fonte_dataframe, fonte_sql
+
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'id': [1, 2, 3],
+        'nome': ["Ana", "José, \"Zé\"", None],
+        'valor': [decimal.Decimal("12345678901234567.89"), decimal.Decimal("0.10"), None],
+        'criado': [datetime.datetime(2024, 1, 2, 3, 4, 5), None, datetime.datetime(2024, 12, 31)],
+    })
+
+
+@pytest.fixture
+def diretorio(tmp_path, monkeypatch):
+    """Exportações num diretório temporário e sem arquivos lembrados de outros testes"""
+    monkeypatch.setattr(exportacao, "DIRETORIO_EXPORTACOES", str(tmp_path))
+    monkeypatch.setattr(exportacao, "_arquivos", OrderedDict())
+    return tmp_path
+
+
+def gerar(formato, fonte, compressao='nenhuma'):
+    saida = io.BytesIO()
+    with exportacao.abrir_saida(saida, compressao) as destino:
+        linhas = exportacao.FORMATOS[formato]['gerar'](fonte, destino)
+    return linhas, saida.getvalue()
+
+
+# ============ FONTES ============
+def test_fonte_sql_so_reexecuta_select(df):
+    fonte = fonte_sql("loja", "SELECT * FROM t -- comentário\n;", linhas=3, amostra=df)
+    assert fonte['sql'] == "SELECT * FROM t" and fonte['linhas'] == 3
+
+    fonte = fonte_sql("loja", "CALL gerar_relatorio()", amostra=df)
+    assert 'sql' not in fonte and fonte['df'] is df
+    with pytest.raises(ValueError):
+        fonte_sql("loja", "SHOW PROCESSLIST")
+
+
+def test_lotes_do_dataframe(df):
+    with exportacao.abrir_lotes(fonte_dataframe(df), tamanho_lote=2) as (colunas, descricao, lotes):
+        assert colunas == ['id', 'nome', 'valor', 'criado'] and descricao is None
+        assert [len(lote) for lote in lotes] == [2, 1]
+
+
+# ============ CSV ============
+def test_csv(df):
+    linhas, dados = gerar('csv', fonte_dataframe(df))
+    assert linhas == 3
+    registros = list(csv.reader(io.StringIO(dados.decode('utf-8'))))
+    assert registros[0] == ['id', 'nome', 'valor', 'criado']
+    assert registros[1] == ['1', 'Ana', '12345678901234567.89', '2024-01-02 03:04:05']
+    # Vírgulas e aspas escapadas; NULL/NaN/NaT viram vazio
+    assert registros[2][1] == 'José, "Zé"'
+    assert registros[3][1:3] == ['', '']
+
+
+def test_csv_set_no_formato_do_mysql():
+    _, dados = gerar('csv', fonte_dataframe(pd.DataFrame({'tags': [{"b", "a"}, set()]})))
+    assert dados.decode('utf-8').splitlines() == ["tags", "\"a,b\"", '""']
+
+
+def test_exportar_grava_arquivo_e_remove_se_falhar(df, diretorio):
+    progresso = []
+    caminho, linhas = exportar(fonte_dataframe(df), 'csv', progresso.append)
+    assert linhas == 3 and progresso == [3]
+    assert os.path.dirname(caminho) == str(diretorio) and caminho.endswith(".csv")
+
+    def interromper(total):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        exportar(fonte_dataframe(df), 'csv', interromper)
+    assert os.listdir(diretorio) == [os.path.basename(caminho)]
+
+
+def test_download_le_o_arquivo_so_quando_pedido(diretorio, monkeypatch):
+    caminho = diretorio / "a.csv"
+    caminho.write_bytes(b"id\n1\n")
+    monkeypatch.setattr(exportacao, "_DOWNLOAD_SOB_DEMANDA", True)
+    conteudo = exportacao.conteudo_download(str(caminho))
+    caminho.write_bytes(b"id\n2\n")
+    assert conteudo() == b"id\n2\n"
+    # Streamlit sem `data` chamável: lê na hora
+    monkeypatch.setattr(exportacao, "_DOWNLOAD_SOB_DEMANDA", False)
+    assert exportacao.conteudo_download(str(caminho)) == b"id\n2\n"
+
+
+# ============ EXCEL ============
+def test_xlsx(df):
+    df = df.assign(nome=["Ana", "controle\x01", None])
+    linhas, dados = gerar('xlsx', fonte_dataframe(df))
+    assert linhas == 3
+    planilha = load_workbook(io.BytesIO(dados), read_only=True)["Resultados"]
+    valores = list(planilha.values)
+    assert valores[0] == ('id', 'nome', 'valor', 'criado')
+    assert valores[1][:2] == (1, "Ana")
+    # Caracteres de controle removidos; NULL vira célula vazia
+    assert valores[2][1] == "controle" and valores[3][1] is None
+
+
+def test_xlsx_grava_set_como_texto():
+    _, dados = gerar('xlsx', fonte_dataframe(pd.DataFrame({'tags': [{"b", "a"}, frozenset()]})))
+    valores = list(load_workbook(io.BytesIO(dados), read_only=True)["Resultados"].values)
+    assert valores[1:] == [("a,b",), (None,)]
+
+
+def test_xlsx_divide_em_planilhas(df, monkeypatch):
+    monkeypatch.setattr(exportacao, "MAX_LINHAS_PLANILHA", 3)
+    _, dados = gerar('xlsx', fonte_dataframe(df))
+    livro = load_workbook(io.BytesIO(dados), read_only=True)
+    assert livro.sheetnames == ["Resultados", "Resultados_2"]
+    assert [len(list(livro[nome].values)) for nome in livro.sheetnames] == [3, 2]
+
+
+def test_xlsx_vazio_tem_cabecalho(df):
+    _, dados = gerar('xlsx', fonte_dataframe(df.head(0)))
+    assert list(load_workbook(io.BytesIO(dados), read_only=True)["Resultados"].values) == [
+        ('id', 'nome', 'valor', 'criado')
+    ]
+
+
+# ============ PARQUET E ARROW ============
+def coluna(nome, tipo, flags=0, charset=33):
+    """Item de cursor.description como o do mysql-connector"""
+    return (nome, tipo, None, None, None, None, True, flags, charset)
+
+
+def test_tipo_arrow_pela_descricao():
+    pa = pytest.importorskip("pyarrow")
+    from mysql.connector.constants import FieldFlag, FieldType
+    assert exportacao.tipo_arrow(coluna('a', FieldType.LONG), []) == pa.int64()
+    assert exportacao.tipo_arrow(coluna('a', FieldType.LONGLONG, FieldFlag.UNSIGNED), []) == pa.uint64()
+    assert exportacao.tipo_arrow(coluna('a', FieldType.NEWDECIMAL),
+                                 [None, decimal.Decimal("1.250")]) == pa.decimal128(38, 3)
+    assert exportacao.tipo_arrow(coluna('a', FieldType.DATETIME), []) == pa.timestamp('us')
+    assert exportacao.tipo_arrow(coluna('a', FieldType.VAR_STRING), []) == pa.string()
+    assert exportacao.tipo_arrow(coluna('a', FieldType.BLOB, charset=63), []) == pa.binary()
+
+
+@pytest.mark.parametrize("formato", ["parquet", "arrow"])
+def test_colunares_preservam_linhas(df, formato):
+    pa = pytest.importorskip("pyarrow")
+    linhas, dados = gerar(formato, fonte_dataframe(df[['id', 'nome', 'criado']]))
+    assert linhas == 3
+    if formato == "parquet":
+        import pyarrow.parquet as pq
+        tabela = pq.read_table(pa.BufferReader(dados))
+    else:
+        tabela = pa.ipc.open_file(pa.BufferReader(dados)).read_all()
+    assert tabela.column('id').to_pylist() == [1, 2, 3]
+    assert tabela.column('nome').to_pylist() == ["Ana", "José, \"Zé\"", None]
+
+
+# ============ JSON ============
+def test_ndjson_um_objeto_por_linha(df):
+    linhas, dados = gerar('ndjson', fonte_dataframe(df))
+    registros = [json.loads(linha) for linha in dados.decode('utf-8').splitlines()]
+    assert linhas == 3 and len(registros) == 3
+    # DECIMAL como texto: sem perda de precisão
+    assert registros[0] == {'id': 1, 'nome': "Ana", 'valor': "12345678901234567.89",
+                            'criado': "2024-01-02T03:04:05"}
+    assert registros[2]['nome'] is None and registros[2]['valor'] is None
+
+
+def test_nulos_do_pandas_viram_null():
+    df = pd.DataFrame({'i': pd.array([1, None], dtype="Int64"), 's': pd.array(["a", None], dtype="string"),
+                       'd': [pd.Timestamp("2024-01-01"), pd.NaT]})
+    _, dados = gerar('ndjson', fonte_dataframe(df))
+    assert [json.loads(linha) for linha in dados.decode('utf-8').splitlines()] == [
+        {'i': 1, 's': "a", 'd': "2024-01-01T00:00:00"}, {'i': None, 's': None, 'd': None}
+    ]
+    _, dados = gerar('csv', fonte_dataframe(df))
+    assert dados.decode('utf-8').splitlines()[-1] == ",,"
+
+
+def test_valor_json():
+    assert exportacao._valor_json(decimal.Decimal("0.10")) == "0.10"
+    assert exportacao._valor_json(datetime.date(2024, 5, 6)) == "2024-05-06"
+    assert exportacao._valor_json(datetime.timedelta(hours=1, minutes=2)) == "1:02:00"
+    assert exportacao._valor_json(b"bin\xff") == "bin\ufffd"
+    assert exportacao._valor_json({"b", "a"}) == ["a", "b"]
+    with pytest.raises(TypeError):
+        exportacao._valor_json(object())
+
+
+def test_json_formatado_e_array_valido(df):
+    linhas, dados = gerar('json', fonte_dataframe(df))
+    assert linhas == 3
+    assert [r['id'] for r in json.loads(dados)] == [1, 2, 3]
+    _, vazio = gerar('json', fonte_dataframe(df.head(0)))
+    assert json.loads(vazio) == []
+
+
+# ============ ARQUIVOS GERADOS SOB DEMANDA ============
+def test_formato_gerado_uma_vez_por_resultado(df, diretorio):
+    fonte = fonte_dataframe(df)
+    caminho, linhas = exportacao.obter_exportacao("r1", fonte, 'csv')
+    assert exportacao.obter_exportacao("r1", fonte_dataframe(df.head(1)), 'csv') == (caminho, linhas)
+    assert exportacao.arquivo_pronto("r1", 'ndjson') is None
+
+    os.remove(caminho)
+    assert exportacao.arquivo_pronto("r1", 'csv') is None
+    assert exportacao.obter_exportacao("r1", fonte, 'csv')[0] != caminho
+
+
+def test_descartar_e_limite_de_arquivos(df, diretorio, monkeypatch):
+    monkeypatch.setattr(exportacao, "MAX_ARQUIVOS_GUARDADOS", 2)
+    fonte = fonte_dataframe(df)
+    primeiro, _ = exportacao.obter_exportacao("r1", fonte, 'csv')
+    exportacao.obter_exportacao("r1", fonte, 'ndjson')
+    exportacao.obter_exportacao("r2", fonte, 'csv')
+    # O mais antigo sai da lista e o arquivo é apagado
+    assert exportacao.arquivo_pronto("r1", 'csv') is None and not os.path.exists(primeiro)
+
+    exportacao.descartar_arquivos("r1")
+    assert exportacao.arquivo_pronto("r1", 'ndjson') is None
+    assert exportacao.arquivo_pronto("r2", 'csv') is not None
+    assert len(os.listdir(diretorio)) == 1
+
+
+def test_id_resultado():
+    marcadores = {("db", "t"): "2024-01-01 00:00:00"}
+    assert exportacao.id_resultado("db", "SELECT * FROM t", None) is None
+    assert exportacao.id_resultado("db", "SELECT * FROM t", marcadores) == \
+        exportacao.id_resultado("db", "SELECT *  FROM t;", dict(marcadores))
+    assert exportacao.id_resultado("db", "SELECT * FROM t", marcadores) != \
+        exportacao.id_resultado("db", "SELECT * FROM t", {("db", "t"): "2024-01-02 00:00:00"})
+
+
+
+# ============ COMPRESSÃO E ESTIMATIVAS ============
+@pytest.mark.parametrize("formato", ["csv", "xlsx", "ndjson"])
+def test_gzip_em_fluxo(df, formato):
+    _, comprimido = gerar(formato, fonte_dataframe(df), 'gzip')
+    _, puro = gerar(formato, fonte_dataframe(df))
+    if formato == "xlsx":
+        # Zip sem seek usa descritores de dados: bytes diferentes, mesmo conteúdo
+        valores = list(load_workbook(io.BytesIO(gzip.decompress(comprimido)), read_only=True)["Resultados"].values)
+        assert valores == list(load_workbook(io.BytesIO(puro), read_only=True)["Resultados"].values)
+    else:
+        assert gzip.decompress(comprimido) == puro
+
+
+def test_zstd_em_fluxo(df):
+    zstandard = pytest.importorskip("zstandard")
+    _, comprimido = gerar('csv', fonte_dataframe(df), 'zstd')
+    _, puro = gerar('csv', fonte_dataframe(df))
+    assert zstandard.ZstdDecompressor().stream_reader(io.BytesIO(comprimido)).read() == puro
+
+
+def test_nome_arquivo():
+    assert exportacao.nome_arquivo("consulta", 'ndjson', 'gzip') == "consulta.jsonl.gz"
+    assert exportacao.nome_arquivo("consulta", 'xlsx') == "consulta.xlsx"
+
+
+def test_estimar_tamanho_extrapola_a_amostra():
+    df = pd.DataFrame({'id': range(100), 'nome': ["x" * 20] * 100})
+    fonte = fonte_dataframe(df.head(10))
+    fonte['linhas'] = 100
+    _, dados = gerar('csv', fonte_dataframe(df))
+    estimativa = exportacao.estimar_tamanho(fonte, 'csv')
+    assert abs(estimativa - len(dados)) / len(dados) < 0.1
+    assert exportacao.estimar_tamanho(fonte, 'csv', 'gzip') < estimativa
+    assert exportacao.estimar_tamanho(fonte_dataframe(df.head(0)), 'csv') is None
+
+
+def test_formatar_bytes():
+    assert exportacao.formatar_bytes(512) == "512 B"
+    assert exportacao.formatar_bytes(1536) == "1.5 KB"
+    assert exportacao.formatar_bytes(3 * 1024 ** 4) == "3,072.0 GB"
@@ -0,0 +1,104 @@
+import sqlite3
+
+import pytest
+from mysql.connector import Error
+
+import historico
+
+
+@pytest.fixture
+def arquivo(tmp_path, monkeypatch):
+    """Histórico num arquivo temporário, com a conexão do processo reaberta"""
+    caminho = str(tmp_path / "historico.sqlite3")
+    monkeypatch.setattr(historico, "ARQUIVO_HISTORICO", caminho)
+    monkeypatch.setattr(historico, "_conexao", None)
+    yield caminho
+    if historico._conexao is not None:
+        historico._conexao.close()
+
+
+def test_migracoes_levam_a_ultima_versao(arquivo):
+    conexao = historico._abrir()
+    assert conexao.execute("PRAGMA user_version").fetchone()[0] == len(historico._MIGRACOES)
+    # Reabrir não reaplica nada
+    historico._migrar(conexao)
+    assert conexao.execute("PRAGMA user_version").fetchone()[0] == len(historico._MIGRACOES)
+
+
+def test_migracao_preserva_e_indexa_registros_antigos(arquivo):
+    antigo = sqlite3.connect(arquivo, isolation_level=None)
+    antigo.executescript(f"BEGIN; {historico._MIGRACOES[0]}; PRAGMA user_version = 1; COMMIT;")
+    antigo.executemany(
+        "INSERT INTO execucoes (instante, origem, banco, impressao, sql, tempo, erro) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(1.0, "editor", "loja", "x", "SELECT * FROM clientes", 0.1, None),
+         (2.0, "editor", "loja", "y", "SELECT * FROM pedidos", 0.2, "interrompida"),
+         (3.0, "editor", "loja", "z", "SELECT * FROM itens", 0.3, "1146: Table doesn't exist")]
+    )
+    antigo.close()
+
+    df = historico.buscar(limite=10)
+    assert list(df['status']) == [historico.ERRO, historico.INTERROMPIDA, historico.OK]
+    assert list(historico.buscar("pedi")['sql']) == ["SELECT * FROM pedidos"]
+
+
+def test_registrar_e_buscar_por_texto(arquivo):
+    historico.registrar("editor", "loja", "SELECT * FROM clientes WHERE id = 1", 0.5, linhas=1, bytes_=10)
+    historico.registrar("builder", "loja", "SELECT * FROM pedidos_itens", 0.2)
+    historico.registrar("editor", "rh", "SELECT * FROM clientes JOIN pedidos", 0.1, erro=historico.INTERROMPIDA)
+
+    assert set(historico.buscar("cli")['sql']) == {
+        "SELECT * FROM clientes WHERE id = 1", "SELECT * FROM clientes JOIN pedidos"
+    }
+    # Todos os termos, como prefixos; '_' faz parte da palavra
+    assert list(historico.buscar("cli ped")['banco']) == ["rh"]
+    assert list(historico.buscar("pedidos_it")['origem']) == ["builder"]
+    assert list(historico.buscar(status=historico.INTERROMPIDA)['banco']) == ["rh"]
+    assert len(historico.buscar(banco="loja")) == 2
+    # Texto sem termos não filtra
+    assert len(historico.buscar("  ()  ")) == 3
+    assert historico.valores_distintos("banco") == ["loja", "rh"]
+
+
+def test_consulta_fts_escapa_termos():
+    assert historico.consulta_fts('cli "ped" OR') == '"cli"* "ped"* "OR"*'
+
+
+def test_limpeza_mantem_a_busca_consistente(arquivo, monkeypatch):
+    monkeypatch.setattr(historico, "MAX_REGISTROS", 2)
+    monkeypatch.setattr(historico, "INTERVALO_LIMPEZA", 1)
+    for tabela in ("antiga", "media", "nova"):
+        historico.registrar("editor", "db", f"SELECT * FROM {tabela}", 0.1)
+    assert historico.buscar("antiga").empty
+    assert list(historico.buscar()['sql']) == ["SELECT * FROM nova", "SELECT * FROM media"]
+    # Impressões sem execuções saem junto
+    formas = [linha[0] for linha in historico._abrir().execute("SELECT forma FROM impressoes ORDER BY forma")]
+    assert formas == ["select * from media", "select * from nova"]
+
+
+def test_medir_grava_erro_e_interrupcao(arquivo):
+    with historico.medir("editor", "db", "SELECT 1") as registro:
+        registro['linhas'] = 1
+    with pytest.raises(Error):
+        with historico.medir("editor", "db", "SELECT 2"):
+            raise Error("falhou")
+    with pytest.raises(KeyboardInterrupt):
+        with historico.medir("editor", "db", "SELECT 3"):
+            raise KeyboardInterrupt
+
+    df = historico.buscar()
+    assert list(df['status']) == [historico.INTERROMPIDA, historico.ERRO, historico.OK]
+    assert df['linhas'].iloc[-1] == 1
+
+
+def test_relatorio_agrupa_por_impressao_digital(arquivo):
+    historico.registrar("editor", "db", "SELECT * FROM t WHERE id = 1", 1.0)
+    historico.registrar("editor", "db", "select * from t where id = 2", 3.0)
+    historico.registrar("editor", "db", "SELECT * FROM u", 0.5)
+    assert historico.impressao_digital("SELECT * FROM t WHERE id = 1") == \
+        historico.impressao_digital("SELECT * FROM t WHERE id = %s")
+
+    df = historico.relatorio("tempo_total")
+    assert list(df['execucoes']) == [2, 1]
+    assert df['tempo_medio'].iloc[0] == pytest.approx(2.0)
+    with pytest.raises(ValueError):
+        historico.relatorio("qualquer")
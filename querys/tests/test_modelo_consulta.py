@@ -0,0 +1,87 @@
+from assistente_indices import colunas_por_papel
+from modelo_consulta import (
+    Condicao, Grupo, arvore_criterios, compilar, compilar_where, de_config, montar, valor_parametro
+)
+
+
+def criterio(campo, operador, valor=None, logica='AND'):
+    return {'campo': campo, 'operador': operador, 'valor': valor, 'logica': logica}
+
+
+def test_valor_parametro():
+    assert valor_parametro("42") == 42
+    assert valor_parametro("-3.5") == -3.5
+    assert valor_parametro("NULL") is None
+    assert valor_parametro("1.2.3") == "1.2.3"
+    assert valor_parametro(7) == 7
+    # Parecem números mas int()/float() rejeitam: ficam como texto
+    for texto in ("--5", "²", "-", "1.", ".5", "١٢"):
+        assert valor_parametro(texto) == texto
+
+
+def test_consulta_simples():
+    assert compilar(montar(["clientes"], [])) == ("SELECT * FROM clientes", [])
+
+
+def test_valores_viram_parametros():
+    consulta = montar(["clientes"], ["clientes.nome"], criterios=[
+        criterio("clientes.id", ">", "10"),
+        criterio("clientes.nome", "LIKE", "silva"),
+        criterio("clientes.uf", "IN", "SP, RJ"),
+        criterio("clientes.email", "IS NULL"),
+    ], ordenacao=[{'campo': "clientes.nome", 'direcao': 'DESC'}], limite="100")
+    sql, params = compilar(consulta)
+    assert sql == ("SELECT clientes.nome FROM clientes WHERE clientes.id > %s AND clientes.nome LIKE %s "
+                   "AND clientes.uf IN (%s, %s) AND clientes.email IS NULL "
+                   "ORDER BY clientes.nome DESC LIMIT 100")
+    assert params == [10, "%silva%", "SP", "RJ"]
+
+
+def test_and_precede_or():
+    filtro = arvore_criterios([
+        criterio("a", "=", "1"),
+        criterio("b", "=", "2"),
+        criterio("c", "=", "3", logica='OR'),
+    ])
+    assert filtro == Grupo('OR', (
+        Grupo('AND', (Condicao("a", "=", 1), Condicao("b", "=", 2))),
+        Condicao("c", "=", 3),
+    ))
+    assert compilar_where(filtro) == ("WHERE (a = %s AND b = %s) OR c = %s", (1, 2, 3))
+
+
+def test_juncoes_e_agregacoes():
+    consulta = montar(
+        ["pedidos", "clientes"], ["clientes.nome", "pedidos.total"],
+        joins=[{'tipo': 'LEFT JOIN', 'tabela1': 'pedidos', 'coluna1': 'cliente_id',
+                'tabela2': 'clientes', 'coluna2': 'id'}],
+        agregacoes=[{'funcao': 'SUM', 'campo': 'pedidos.total'}],
+    )
+    sql, params = compilar(consulta)
+    assert sql == ("SELECT clientes.nome, pedidos.total, SUM(pedidos.total) AS SUM_total "
+                   "FROM pedidos LEFT JOIN clientes ON pedidos.cliente_id = clientes.id "
+                   "GROUP BY clientes.nome")
+    assert params == []
+
+
+def test_compilacao_memoizada_devolve_lista_nova():
+    config = {'tabelas_selecionadas': ["t"], 'campos_selecionados': [],
+              'criterios': [criterio("t.a", "=", "1")]}
+    consulta = de_config(config)
+    assert consulta == de_config(dict(config))
+    _, params = compilar(consulta)
+    params.append("alterado")
+    assert compilar(consulta) == ("SELECT * FROM t WHERE t.a = %s", [1])
+
+
+def test_assistente_detecta_or_em_qualquer_criterio():
+    config = {'tabelas_selecionadas': ["t"], 'criterios': [
+        criterio("t.a", "=", "1", logica='OR'),   # lógica do primeiro critério não liga nada
+        criterio("t.b", "=", "2"),
+    ]}
+    assert colunas_por_papel(config)[2] is False
+
+    config['criterios'].append(criterio("t.c", ">", "3", logica='OR'))
+    papeis, alertas, com_ou = colunas_por_papel(config)
+    assert com_ou
+    assert papeis["t"]['igualdade'] == ["a", "b"] and papeis["t"]['intervalo'] == ["c"]
@@ -0,0 +1,91 @@
+from contextlib import contextmanager
+
+import historico
+import paginacao
+from paginacao import fonte_consulta, fonte_tabela, sql_pagina
+
+
+def test_fonte_consulta_remove_comentarios_e_ponto_e_virgula():
+    fonte = fonte_consulta("SELECT * FROM clientes -- todos\nORDER BY nome;")
+    assert fonte == {'sql': "SELECT * FROM clientes ORDER BY nome"}
+
+
+def test_offset_anexado_ao_sql_do_usuario():
+    fonte = fonte_consulta("SELECT * FROM clientes ORDER BY nome -- comentário")
+    sql, params, inverter = sql_pagina(fonte, 50, offset=100)
+    assert sql == "SELECT * FROM clientes ORDER BY nome LIMIT 50 OFFSET 100"
+    assert params == [] and not inverter
+
+
+def test_sql_com_limit_proprio_vira_subconsulta():
+    fonte = fonte_consulta("SELECT * FROM clientes LIMIT 10")
+    sql, _, _ = sql_pagina(fonte, 5, offset=5)
+    assert sql == "SELECT * FROM (SELECT * FROM clientes LIMIT 10) AS consulta_paginada LIMIT 5 OFFSET 5"
+
+
+def test_tabela_sem_chave_usa_offset():
+    sql, _, _ = sql_pagina(fonte_tabela("pe`dido"), 20, offset=40)
+    assert sql == "SELECT * FROM `pe``dido` LIMIT 20 OFFSET 40"
+
+
+def test_keyset_proxima_pagina():
+    sql, params, inverter = sql_pagina(fonte_tabela("pedidos"), 50, ["cliente", "id"], apos=(3, 17))
+    assert sql == ("SELECT * FROM `pedidos` WHERE (`cliente`, `id`) > (%s, %s) "
+                   "ORDER BY `cliente` ASC, `id` ASC LIMIT 50")
+    assert params == [3, 17] and not inverter
+
+
+def test_keyset_pagina_anterior_le_ao_contrario():
+    sql, params, inverter = sql_pagina(fonte_tabela("pedidos"), 50, ["id"], antes=(101,))
+    assert sql == "SELECT * FROM `pedidos` WHERE (`id`) < (%s) ORDER BY `id` DESC LIMIT 50"
+    assert params == [101] and inverter
+
+
+def test_keyset_descendente():
+    sql, _, _ = sql_pagina(fonte_tabela("pedidos"), 50, ["id"], descendente=True, apos=(9,))
+    assert "WHERE (`id`) < (%s) ORDER BY `id` DESC" in sql
+    sql, _, inverter = sql_pagina(fonte_tabela("pedidos"), 50, ["id"], descendente=True, antes=(9,))
+    assert "WHERE (`id`) > (%s) ORDER BY `id` ASC" in sql and inverter
+
+
+def test_keyset_inicio_inclui_a_chave():
+    sql, params, _ = sql_pagina(fonte_tabela("pedidos"), 50, ["id"], inicio=(250,))
+    assert "WHERE (`id`) >= (%s)" in sql
+    assert params == [250]
+
+
+def test_limit_final_detectado():
+    assert paginacao._RE_LIMIT_FINAL.search("SELECT 1 LIMIT 10, 20")
+    assert paginacao._RE_LIMIT_FINAL.search("SELECT 1 LIMIT 10 OFFSET 20")
+    assert not paginacao._RE_LIMIT_FINAL.search("SELECT * FROM (SELECT 1 LIMIT 1) t")
+
+
+def test_pre_busca_nao_entra_no_historico(monkeypatch):
+    class Cursor:
+        description = [("id",)]
+
+        def execute(self, sql, params=None):
+            pass
+
+        def fetchall(self):
+            return [(1,), (2,)]
+
+        def close(self):
+            pass
+
+    class Conexao:
+        def cursor(self):
+            return Cursor()
+
+    @contextmanager
+    def obter_conexao(banco):
+        yield Conexao()
+
+    registradas = []
+    monkeypatch.setattr(paginacao, "obter_conexao", obter_conexao)
+    monkeypatch.setattr(historico, "registrar", lambda *args, **kwargs: registradas.append(args))
+
+    pagina = paginacao._requisicao_pagina("db", fonte_tabela("t"), 2, ["id"], False, ('apos', (0,)), 2, False)
+    assert pagina['ultima'] == (2,) and registradas == []
+    paginacao._requisicao_pagina("db", fonte_tabela("t"), 2, ["id"], False, ('apos', (0,)), 2)
+    assert len(registradas) == 1 and registradas[0][0] == "paginacao"
@@ -0,0 +1,67 @@
+from script_sql import commit_implicito, confirmadas_antes, dividir_instrucoes, resumo_instrucao
+
+
+def test_divide_pelo_ponto_e_virgula():
+    assert dividir_instrucoes("SELECT 1; SELECT 2;\nSELECT 3") == ["SELECT 1", "SELECT 2", "SELECT 3"]
+
+
+def test_ignora_delimitador_em_literais_e_identificadores():
+    script = "INSERT INTO t VALUES ('a;b', \"c;d\"); SELECT `x;y` FROM t"
+    assert dividir_instrucoes(script) == [
+        "INSERT INTO t VALUES ('a;b', \"c;d\")",
+        "SELECT `x;y` FROM t",
+    ]
+
+
+def test_aspas_escapadas_nao_fecham_o_literal():
+    script = "SELECT 'it''s; ok'; SELECT 'barra \\'; ainda'; SELECT 3"
+    assert dividir_instrucoes(script) == ["SELECT 'it''s; ok'", "SELECT 'barra \\'; ainda'", "SELECT 3"]
+
+
+def test_ignora_delimitador_em_comentarios():
+    script = "SELECT 1 -- fim; não\n; # outro; comentário\nSELECT /* ; */ 2;"
+    assert dividir_instrucoes(script) == ["SELECT 1 -- fim; não", "# outro; comentário\nSELECT /* ; */ 2"]
+
+
+def test_traco_duplo_sem_espaco_nao_e_comentario():
+    assert dividir_instrucoes("SELECT 5--1; SELECT 2") == ["SELECT 5--1", "SELECT 2"]
+
+
+def test_instrucoes_vazias_ou_so_comentario_sao_ignoradas():
+    assert dividir_instrucoes(";;\n-- nada\n;  /* vazio */ ;SELECT 1") == ["SELECT 1"]
+
+
+def test_diretiva_delimiter():
+    script = (
+        "DELIMITER $$\n"
+        "CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END$$\n"
+        "DELIMITER ;\n"
+        "CALL p();"
+    )
+    assert dividir_instrucoes(script) == [
+        "CREATE PROCEDURE p() BEGIN SELECT 1; SELECT 2; END",
+        "CALL p()",
+    ]
+
+
+def test_resumo_instrucao():
+    assert resumo_instrucao("SELECT  *\n-- comentário\nFROM t;") == "SELECT * FROM t"
+    assert resumo_instrucao("SELECT " + "x" * 100, tamanho=10) == "SELECT xxx..."
+
+
+def test_commit_implicito():
+    assert commit_implicito("-- cria\nCREATE TABLE t (id INT)")
+    assert commit_implicito("alter table t add c int") and commit_implicito("TRUNCATE t")
+    assert not commit_implicito("CREATE TEMPORARY TABLE t (id INT)")
+    assert not commit_implicito("INSERT INTO t VALUES (1)") and not commit_implicito("SELECT 'DROP'")
+
+
+def test_confirmadas_antes_de_falhar():
+    script = ["INSERT INTO t VALUES (1)", "ALTER TABLE t ADD c INT", "UPDATE t SET c = 1", "DROP TABLE u"]
+    assert confirmadas_antes(script[:1], 1) == 0
+    # ALTER (#2) confirmou #1 e a si mesmo; o UPDATE (#3) é desfeito
+    assert confirmadas_antes(script, 3) == 2
+    # DROP (#4) falhando: o commit implícito antes dele já confirmou o UPDATE
+    assert confirmadas_antes(script, 4) == 3
+    # Interrompido antes do DROP começar: só o que o ALTER confirmou
+    assert confirmadas_antes(script, 4, iniciada=False) == 2
@@ -0,0 +1,94 @@
+import pytest
+
+import catalogo_schema
+import historico
+import tarefas
+
+
+class Cursor:
+    description = None
+    rowcount = 1
+
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def execute(self, sql):
+        self.conexao.executadas.append(sql)
+        self.conexao.ao_executar()
+
+    def close(self):
+        pass
+
+
+class Conexao:
+    connection_id = 7
+
+    def __init__(self):
+        self.executadas = []
+        self.confirmada = self.desfeita = False
+        self.ao_executar = lambda: None
+
+    def cursor(self, buffered=True):
+        return Cursor(self)
+
+    def commit(self):
+        self.confirmada = True
+
+    def rollback(self):
+        self.desfeita = True
+
+
+class Pool:
+    def __init__(self, conexao):
+        self.conexao = conexao
+
+    def adquirir(self, banco):
+        return self.conexao
+
+    def devolver(self, conexao, banco, descartar=False):
+        pass
+
+
+@pytest.fixture
+def conexao(monkeypatch):
+    conexao = Conexao()
+    monkeypatch.setattr(tarefas, "obter_pool", lambda: Pool(conexao))
+    monkeypatch.setattr(historico, "registrar", lambda *args, **kwargs: None)
+    monkeypatch.setattr(catalogo_schema, "invalidar_por_sql", lambda banco, sql: None)
+    return conexao
+
+
+SCRIPT = "UPDATE t SET a = 1; UPDATE t SET b = 2; UPDATE t SET c = 3"
+
+
+def test_script_completo(conexao):
+    tarefa = tarefas.Tarefa(SCRIPT, "db", usar_cache=False)
+    tarefa._executar()
+    assert tarefa.status == tarefas.CONCLUIDA and tarefa.linhas_afetadas == 3
+    assert len(conexao.executadas) == 3 and conexao.confirmada
+
+
+def test_cancelada_entre_instrucoes(conexao):
+    tarefa = tarefas.Tarefa(SCRIPT, "db", usar_cache=False)
+    conexao.ao_executar = lambda: setattr(tarefa, "_cancelar", True)
+    tarefa._executar()
+    assert tarefa.status == tarefas.CANCELADA
+    assert conexao.executadas == ["UPDATE t SET a = 1"]
+    assert conexao.desfeita and not conexao.confirmada
+
+
+def test_tempo_esgotado_entre_instrucoes(conexao):
+    tarefa = tarefas.Tarefa(SCRIPT, "db", usar_cache=False)
+    conexao.ao_executar = lambda: setattr(tarefa, "tempo_esgotado", True)
+    tarefa._executar()
+    assert tarefa.status == tarefas.ERRO and "Tempo limite" in tarefa.erro
+    assert conexao.executadas == ["UPDATE t SET a = 1"]
+    assert conexao.desfeita and not conexao.confirmada
+
+
+def test_cancelada_depois_de_ddl_informa_o_que_ficou(conexao):
+    tarefa = tarefas.Tarefa("ALTER TABLE t ADD c INT; UPDATE t SET c = 1; UPDATE t SET c = 2", "db", usar_cache=False)
+    conexao.ao_executar = lambda: setattr(tarefa, "_cancelar", len(conexao.executadas) == 2)
+    tarefa._executar()
+    assert tarefa.status == tarefas.CANCELADA
+    assert "instruções até a 1 já tinham sido confirmadas" in tarefa.erro